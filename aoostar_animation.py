@@ -0,0 +1,154 @@
+import os
+import queue
+import threading
+import time
+from PIL import Image
+
+from frame_cache import IMAGE_EXTENSIONS
+
+# What browsers show frames without a duration for
+DEFAULT_FRAME_DURATION = 0.1
+
+class AnimationSource:
+    """
+    Frames of an animated GIF, APNG or WebP, or of a directory of images in name order,
+    with how long each one is shown. fps overrides the file's own frame durations.
+    """
+    def __init__(self, path, fps=None):
+        self.fps = fps
+        self._image = None
+        self._paths = []
+        if os.path.isdir(path):
+            self._paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.count = len(self._paths)
+        else:
+            self._image = Image.open(path)
+            self.count = getattr(self._image, 'n_frames', 1)
+        if not self.count:
+            raise ValueError(f"No frames in {path}")
+
+    def frame(self, index):
+        """Returns frame index, as an RGB image, and its duration in seconds."""
+        if self._image is None:
+            with Image.open(self._paths[index]) as image:
+                frame = image.convert('RGB')
+            duration = None
+        else:
+            self._image.seek(index)
+            frame = self._image.convert('RGB')
+            duration = self._image.info.get('duration')
+            duration = duration / 1000 if duration else None
+
+        if self.fps:
+            duration = 1 / self.fps
+        return frame, duration or DEFAULT_FRAME_DURATION
+
+    def close(self):
+        if self._image is not None:
+            self._image.close()
+
+class AnimationPlayer:
+    """
+    Plays an AnimationSource through send_frame(packed frame).
+
+    A background thread decodes and encode()s frames up to decode_ahead frames ahead of
+    the one being sent. Encoded frames are kept, in play order, until they add up to
+    cache_bytes, so the frames that fit are never decoded again when the animation loops.
+    Frames are paced against the animation's own clock: one whose time is already over
+    by when the link is free again is dropped, rather than playing everything late.
+    """
+    def __init__(self, source:AnimationSource, encode, send_frame, cache_bytes=64 * 1024 * 1024, decode_ahead=4):
+        self.source = source
+        self.encode = encode
+        self.send_frame = send_frame
+        self.cache_bytes = cache_bytes
+
+        self.cache = {}
+        self.cached_bytes = 0
+        self.encoded = 0
+        self.cache_hits = 0
+        self.sent = 0
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=decode_ahead)
+        self._stop = threading.Event()
+        self._error = None
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _decode_loop(self, loops):
+        try:
+            loop = 0
+            while loops == 0 or loop < loops:
+                for index in range(self.source.count):
+                    cached = self.cache.get(index)
+                    if cached is not None:
+                        data, duration = cached
+                        self.cache_hits += 1
+                    else:
+                        image, duration = self.source.frame(index)
+                        data = self.encode(image)
+                        self.encoded += 1
+                        if self.cached_bytes + len(data) <= self.cache_bytes:
+                            self.cache[index] = (data, duration)
+                            self.cached_bytes += len(data)
+
+                    if not self._put((index, data, duration)):
+                        return
+                loop += 1
+        except Exception as e:
+            # Raised again by play, which would otherwise wait for the next frame forever
+            self._error = e
+        finally:
+            self._put(None)
+
+    def play(self, loops=0):
+        """
+        Plays the animation loops times, or until interrupted when loops is 0. Raises what
+        decoding a frame raised, after the frames before it were played.
+        """
+        decoder = threading.Thread(target=self._decode_loop, args=(loops,), name="aoostar-decode", daemon=True)
+        decoder.start()
+        try:
+            due = time.monotonic()
+            dropping = False
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = self._queue.get()
+                    if not dropping:
+                        # Decoding is what's behind, not the link: the schedule starts over from now
+                        due = max(due, time.monotonic())
+                if item is None:
+                    if self._error is not None:
+                        raise self._error
+                    break
+
+                index, data, duration = item
+                now = time.monotonic()
+                dropping = now >= due + duration
+                if dropping:
+                    self.dropped += 1
+                else:
+                    if due > now:
+                        time.sleep(due - now)
+                    self.send_frame(data)
+                    self.sent += 1
+                due += duration
+        except KeyboardInterrupt:
+            print("Stopping...")
+        finally:
+            self._stop.set()
+            decoder.join()
+
+        print(f"{self.sent} frames sent, {self.dropped} dropped, {self.encoded} encoded, {self.cache_hits} from cache "
+              f"({len(self.cache)} frames, {self.cached_bytes // 1024} KiB cached).")
@@ -0,0 +1,149 @@
+"""
+asyncio client for the screen, for programs that drive it from an event loop.
+
+    screen = await AsyncScreen.open("serial")
+    await screen.lcd_on()
+    async for event in screen.stream_image(image):
+        print(event)
+
+Serial I/O runs on a thread of the screen's own, so the loop is never blocked by a
+frame going out, and frames are sent one at a time. Any serial-like object works,
+such as aoostar_emulator.open_emulated_serial()'s socket stand-in.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+import aoostar_screen
+from aoostar_screen import FrameCancelled, SendProgress, TOTAL_BYTES
+from screen_transport import open_transport
+
+class AsyncScreen:
+    """
+    A screen connection, ser, with coroutines for every command.
+
+    A frame in progress stops at the next chunk boundary when cancel() is called, or
+    when the task awaiting it is cancelled, and is ended with the image end command,
+    so the screen is ready for the next frame, which goes out in full.
+    """
+    def __init__(self, ser, window=1):
+        self.ser = ser
+        self.window = window
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aoostar-async")
+        self._lock = asyncio.Lock()
+        self._cancel = None
+        # Images are packed here rather than in aoostar_screen's shared buffer, so
+        # several screens can send at once
+        self._frame = bytearray(TOTAL_BYTES)
+
+    @classmethod
+    async def open(cls, transport="serial", target=None, window=1):
+        """Opens one of screen_transport.TRANSPORTS like open_transport, without blocking the loop."""
+        ser = await asyncio.get_running_loop().run_in_executor(None, open_transport, transport, target)
+        return cls(ser, window)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _call(self, function, *args, progress=None, cancellable=False):
+        """
+        Runs function(*args) on the screen's thread, after whatever was already running.
+        Cancellable functions also get a cancel event and progress, called on the loop.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            kwargs = {}
+            if cancellable:
+                cancel = self._cancel = threading.Event()
+                kwargs["cancel"] = cancel
+                if progress is not None:
+                    kwargs["progress"] = functools.partial(loop.call_soon_threadsafe, progress)
+
+            future = loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+            try:
+                # Shielded: the thread can't be stopped, only told to stop, and has to be waited for
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if cancellable:
+                    cancel.set()
+                try:
+                    await future
+                except (FrameCancelled, IOError):
+                    pass
+                raise
+            finally:
+                self._cancel = None
+
+    def cancel(self):
+        """Stops the frame being sent, if any. Returns whether there was one."""
+        cancel = self._cancel
+        if cancel is None:
+            return False
+        cancel.set()
+        return True
+
+    async def lcd_on(self):
+        await self._call(aoostar_screen.lcd_on, self.ser)
+
+    async def lcd_off(self):
+        await self._call(aoostar_screen.lcd_off, self.ser)
+
+    def _send_image(self, image, delta, dirty, cancel=None, progress=None):
+        if isinstance(image, Image.Image):
+            image = aoostar_screen._image_to_rgb565(image, self._frame)
+        return aoostar_screen.send_image(self.ser, image, delta, self.window, dirty, cancel, progress)
+
+    async def send_image(self, image, delta=False, dirty=None, progress=None):
+        """
+        Sends an image like aoostar_screen.send_image, progress getting its SendProgress
+        events. Returns the number of chunks sent, raises FrameCancelled if cancelled.
+        """
+        return await self._call(self._send_image, image, delta, dirty, progress=progress, cancellable=True)
+
+    async def send_panel(self, panel_id=1, sensor_data=None, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal",
+                         delta=True, sensor_source=None, progress=None):
+        """Renders and sends a panel like aoostar_screen.send_aoostar_panel_graphics."""
+        return await self._call(aoostar_screen.send_aoostar_panel_graphics, self.ser, panel_id, sensor_data,
+                                aoostar_data_path, delta, self.window, sensor_source, progress=progress, cancellable=True)
+
+    async def _stream(self, send, *args):
+        events = asyncio.Queue()
+        task = asyncio.ensure_future(send(*args, progress=events.put_nowait))
+        # Progress is delivered on the loop in order, so this comes after the last event
+        task.add_done_callback(lambda task: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            try:
+                task.result()
+            except FrameCancelled:
+                # Already reported by its "cancelled" event
+                pass
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, FrameCancelled, IOError):
+                    pass
+
+    def stream_image(self, image, delta=False, dirty=None):
+        """Sends an image, yielding its SendProgress events as it goes. Stopping early cancels the frame."""
+        return self._stream(self.send_image, image, delta, dirty)
+
+    def stream_panel(self, panel_id=1, sensor_data=None, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal",
+                     delta=True, sensor_source=None):
+        """Renders and sends a panel, yielding its SendProgress events as it goes."""
+        return self._stream(self.send_panel, panel_id, sensor_data, aoostar_data_path, delta, sensor_source)
+
+    async def close(self):
+        """Cancels the frame being sent, if any, then closes the connection."""
+        self.cancel()
+        async with self._lock:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.ser.close)
+        self._executor.shutdown()
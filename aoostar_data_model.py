@@ -1,101 +1,215 @@
+from array import array
+
+# Numeric values, in their order in AoostarDataModel.values
+NUMERIC_FIELDS = (
+    "cpu_temperature",
+    "cpu_percent",
+    "memory_usage",
+    "memory_Temperature", #original data has a capital T
+    "gpu_core",
+    "gpu_temperature",
+    "net_upload_speed",
+    "net_download_speed",
+    "motherboard_temperature",
+)
+TEXT_FIELDS = (
+    "DATE_m_d_h_m_2",
+    "net_ip_address",
+    "net_upload_speed_unit",
+    "net_download_speed_unit",
+)
+
+# storage_ssd and storage_hdd follow the numeric fields in AoostarDataModel.values,
+# as (temperature, used) pairs for every drive slot
+STORAGE_KEYS = ("temperature", "used")
+SSD_SLOTS = 5
+HDD_SLOTS = 6
+_SSD_OFFSET = len(NUMERIC_FIELDS)
+_HDD_OFFSET = _SSD_OFFSET + SSD_SLOTS * len(STORAGE_KEYS)
+_VALUE_COUNT = _HDD_OFFSET + HDD_SLOTS * len(STORAGE_KEYS)
+
+_ZEROS = array('d', bytes(8 * _VALUE_COUNT))
+
+class _DriveView:
+    """One drive slot, read and written like the {"temperature": ..., "used": ...} dict it replaces."""
+    __slots__ = ("_values", "_offset")
+
+    def __init__(self, values, offset):
+        self._values = values
+        self._offset = offset
+
+    def __getitem__(self, key):
+        return self._values[self._offset + STORAGE_KEYS.index(key)]
+
+    def __setitem__(self, key, value):
+        self._values[self._offset + STORAGE_KEYS.index(key)] = value
+
+    def keys(self):
+        return STORAGE_KEYS
+
+    def to_dict(self):
+        return {key: self[key] for key in STORAGE_KEYS}
+
+class _StorageView:
+    """storage_ssd / storage_hdd, as a fixed size list of _DriveView"""
+    __slots__ = ("_drives",)
+
+    def __init__(self, values, offset, count):
+        self._drives = tuple(_DriveView(values, offset + i * len(STORAGE_KEYS)) for i in range(count))
+
+    def __getitem__(self, index):
+        return self._drives[index]
+
+    def __len__(self):
+        return len(self._drives)
+
+    def __iter__(self):
+        return iter(self._drives)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+def _split_aoostar_compound_key(key):
+    delimiters = ['[', ']', '\'', '"']
+    for delimiter in delimiters:
+        key = key.replace(delimiter, ' ')
+    return key.split()
+
+def _value_index(label:str) -> int:
+    """Position of a numeric label in AoostarDataModel.values. Raises KeyError or IndexError."""
+    if label in NUMERIC_FIELDS:
+        return NUMERIC_FIELDS.index(label)
+
+    if label.startswith("storage_ssd"):
+        offset, slots = _SSD_OFFSET, SSD_SLOTS
+    elif label.startswith("storage_hdd"):
+        offset, slots = _HDD_OFFSET, HDD_SLOTS
+    else:
+        raise KeyError(label)
+
+    split_key = _split_aoostar_compound_key(label)
+    slot = int(split_key[1])
+    if not 0 <= slot < slots:
+        raise IndexError(f"{label}: only {slots} drive slots")
+    if split_key[2] not in STORAGE_KEYS:
+        raise KeyError(label)
+    return offset + slot * len(STORAGE_KEYS) + STORAGE_KEYS.index(split_key[2])
+
+def compile_accessor(label:str):
+    """
+    Returns (getter, setter) functions for the raw value behind a label, resolved once.
+    Raises KeyError for unknown labels and IndexError for drive slots out of range.
+    """
+    if label in TEXT_FIELDS:
+        return (lambda model: getattr(model, label)), (lambda model, value: setattr(model, label, value))
+
+    index = _value_index(label)
+
+    def get_value(model):
+        return model.values[index]
+
+    def set_value(model, value):
+        model.values[index] = value
+
+    return get_value, set_value
+
+def _speed_getter(label):
+    get_speed = compile_accessor(label)[0]
+    get_unit = compile_accessor(label + "_unit")[0]
+    return lambda model: str(round(get_speed(model),1)) + " " + get_unit(model)
+
+_getters = {}
+
+def compile_label(label:str):
+    """Returns a function giving a panel label's value, as AoostarDataModel.get would."""
+    getter = _getters.get(label)
+    if getter is None:
+        if label in ("net_upload_speed", "net_download_speed"):
+            getter = _speed_getter(label)
+        else:
+            try:
+                getter = compile_accessor(label)[0]
+            except (KeyError, ValueError):
+                getter = lambda model: None
+        _getters[label] = getter
+    return getter
+
+_label_lists = {}
+
+def compile_labels(labels) -> tuple:
+    """compile_label for every label, cached per tuple of labels such as a panel's"""
+    labels = tuple(labels)
+    getters = _label_lists.get(labels)
+    if getters is None:
+        getters = _label_lists[labels] = tuple(compile_label(label) for label in labels)
+    return getters
+
 class AoostarDataModel:
+    """
+    Every value a panel can show. Numbers live in one array('d'), values, so the model
+    can be reset and updated in place from poll to poll.
+    """
+    __slots__ = ("values", "storage_ssd", "storage_hdd") + TEXT_FIELDS
+
     def __init__(self):
+        self.values = array('d', _ZEROS)
+        self.storage_ssd = _StorageView(self.values, _SSD_OFFSET, SSD_SLOTS)
+        self.storage_hdd = _StorageView(self.values, _HDD_OFFSET, HDD_SLOTS)
+        self.reset()
+
+    def reset(self):
+        """Sets every value back to its default."""
+        self.values[:] = _ZEROS
         self.DATE_m_d_h_m_2 : str = ""
-        self.cpu_temperature : float = 0.0
-        self.cpu_percent : float = 0.0
-        self.memory_usage : float = 0.0
-        self.memory_Temperature = 0 #original data has a capital T
         self.net_ip_address : str = ""
-        self.gpu_core : float = 0.0
-        self.gpu_temperature : float = 0.0
-        self.net_upload_speed : float = 0.0
         self.net_upload_speed_unit : str = ""
-        self.net_download_speed : float = 0.0
         self.net_download_speed_unit : str = ""
-        self.motherboard_temperature : float = 0.0
-        self.storage_ssd = [
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          }
-        ]
-        self.storage_hdd = [
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          },
-          {
-            "temperature": 0.0,
-            "used": 0.0
-          }
-        ]
 
     @staticmethod
     def _split_aoostar_compound_key(key):
-        delimiters = ['[', ']', '\'', '"']
-        for delimiter in delimiters:
-            key = key.replace(delimiter, ' ')
-        return key.split()
+        return _split_aoostar_compound_key(key)
 
     def get(self,key:str):
-        match key:
-            case "DATE_m_d_h_m_2":
-                return self.DATE_m_d_h_m_2
-            case "cpu_temperature":
-                return self.cpu_temperature
-            case "cpu_percent":
-                return self.cpu_percent
-            case "memory_usage":
-                return self.memory_usage
-            case "memory_Temperature":
-                return self.memory_Temperature
-            case "net_ip_address":
-                return self.net_ip_address
-            case "gpu_core":
-                return self.gpu_core
-            case "gpu_temperature":
-                return self.gpu_temperature
-            case "net_upload_speed":
-                return str(round(self.net_upload_speed,1)) + " " + self.net_upload_speed_unit
-            case "net_download_speed":
-                return str(round(self.net_download_speed,1)) + " " + self.net_download_speed_unit
-            case "motherboard_temperature":
-                return self.motherboard_temperature
-            case str(partial_key) if partial_key.startswith("storage_ssd"):
-                split_key = self._split_aoostar_compound_key(key)
-                return self.storage_ssd[int(split_key[1])][split_key[2]]
-            case str(partial_key) if partial_key.startswith("storage_hdd"):
-                split_key = self._split_aoostar_compound_key(key)
-                return self.storage_hdd[int(split_key[1])][split_key[2]]
+        return compile_label(key)(self)
+
+    def get_many(self,labels):
+        """Values of all the labels, in order"""
+        return [getter(self) for getter in compile_labels(labels)]
+
+    def set(self,key:str,value):
+        compile_accessor(key)[1](self, value)
+
+    @classmethod
+    def from_dict(cls, data:dict):
+        """A model with the values of a to_dict() dump, such as aoostar_compatible_data.json"""
+        model = cls()
+        for key, value in data.items():
+            if key in ("storage_ssd", "storage_hdd"):
+                for drive, values in zip(getattr(model, key), value):
+                    for storage_key in STORAGE_KEYS:
+                        drive[storage_key] = values.get(storage_key, 0.0)
+            elif key in NUMERIC_FIELDS or key in TEXT_FIELDS:
+                setattr(model, key, value)
+        return model
+
+    def to_dict(self) -> dict:
+        data = {"DATE_m_d_h_m_2": self.DATE_m_d_h_m_2, "net_ip_address": self.net_ip_address}
+        for name in NUMERIC_FIELDS:
+            data[name] = getattr(self, name)
+        data["net_upload_speed_unit"] = self.net_upload_speed_unit
+        data["net_download_speed_unit"] = self.net_download_speed_unit
+        data["storage_ssd"] = [drive.to_dict() for drive in self.storage_ssd]
+        data["storage_hdd"] = [drive.to_dict() for drive in self.storage_hdd]
+        return data
+
+def _numeric_property(index):
+    def get_value(self):
+        return self.values[index]
+
+    def set_value(self, value):
+        self.values[index] = value
+
+    return property(get_value, set_value)
+
+for _index, _name in enumerate(NUMERIC_FIELDS):
+    setattr(AoostarDataModel, _name, _numeric_property(_index))
@@ -0,0 +1,263 @@
+"""
+Software stand-in for the screen, speaking its serial protocol over a socket pair or a pty,
+to measure and test transmission without the hardware.
+
+    python aoostar_emulator.py [--baud BAUD] [--nack-rate RATE]
+
+serves it on a pty whose path is printed, for aoostar_screen.py or anything else to open.
+"""
+import os
+import sys
+import time
+import random
+import socket
+import struct
+import argparse
+import threading
+
+from screen_transport import SocketSerial
+
+# The device side of the protocol is implemented on its own rather than with
+# aoostar_screen's constants, so it checks the sender instead of agreeing with it.
+PREAMBLE = b'\xAA\x55\xAA\x55'
+HEADER_SIZE = 8
+
+CMD_IMG_START = 0x05
+CMD_IMG_END = 0x06
+CMD_CHUNK = 0x08
+CMD_LCD_OFF = 0x0A
+CMD_LCD_ON = 0x0B
+
+START_SIZE = 16
+OFFSET_SIZE = 4
+
+WIDTH = 960
+HEIGHT = 376
+TOTAL_BYTES = WIDTH * HEIGHT * 2
+CHUNK_SIZE = 47
+
+ACK = b'A'
+NACK = b'N'
+
+# 8N1: a start and a stop bit around every byte
+BITS_PER_BYTE = 10
+
+class EmulatedScreen:
+    """
+    The screen's protocol state machine: feed() it the bytes the host wrote and it
+    returns the device's replies, one ACK or NACK per packet.
+
+    Chunks are written into frame, the screen's framebuffer, which keeps its contents
+    between images like the device does, so delta updates rebuild the right picture.
+    Chunks are NACKed, and not applied, with probability nack_rate, or when their
+    number since the emulator started is in nack_chunks. frame can be any writable
+    buffer of TOTAL_BYTES, such as a memory mapped file.
+
+    The image start command sets the chunk size, any size up to max_chunk_size being
+    accepted, but a chunk that doesn't fit in the image is an error. Over a link faster
+    than max_baudrate, the screen only reads noise.
+    """
+    def __init__(self, nack_rate=0.0, nack_chunks=(), seed=None, frame=None, max_chunk_size=255, max_baudrate=None):
+        self.nack_rate = nack_rate
+        self.nack_chunks = set(nack_chunks)
+        self.max_chunk_size = max_chunk_size
+        self.max_baudrate = max_baudrate
+        self._random = random.Random(seed)
+
+        self.frame = bytearray(TOTAL_BYTES) if frame is None else frame
+        self.lcd_on = True
+        self.receiving = False
+        self.image_size = TOTAL_BYTES
+        self.chunk_size = CHUNK_SIZE
+
+        self.bytes_received = 0
+        self.chunks_received = 0
+        self.frames_completed = 0
+        self.nacks_sent = 0
+        self.errors = []
+
+        self._buffer = bytearray()
+
+    def _error(self, message):
+        self.errors.append(message)
+        self.nacks_sent += 1
+        return NACK
+
+    def _packet_size(self, command):
+        if command == CMD_IMG_START:
+            return START_SIZE
+        if command == CMD_CHUNK:
+            return HEADER_SIZE + OFFSET_SIZE + self.chunk_size
+        return HEADER_SIZE
+
+    def _handle(self, packet):
+        command = packet[4]
+        if command == CMD_LCD_ON:
+            self.lcd_on = True
+        elif command == CMD_LCD_OFF:
+            self.lcd_on = False
+        elif command == CMD_IMG_START:
+            # Bytes 11 and 12..15 look like the chunk size and the image size
+            chunk_size = packet[11]
+            image_size = struct.unpack_from('<I', packet, 12)[0]
+            if image_size != TOTAL_BYTES or not chunk_size or chunk_size > self.max_chunk_size:
+                return self._error(f"Unsupported image start {packet.hex()}")
+            self.chunk_size = chunk_size
+            self.image_size = image_size
+            self.receiving = True
+        elif command == CMD_CHUNK:
+            chunk_number = self.chunks_received
+            self.chunks_received += 1
+            if not self.receiving:
+                return self._error(f"Chunk {chunk_number} outside of an image")
+            offset = struct.unpack_from('<I', packet, HEADER_SIZE)[0]
+            if offset % self.chunk_size or offset + self.chunk_size > self.image_size:
+                return self._error(f"Chunk {chunk_number} at bad offset {offset}")
+            if chunk_number in self.nack_chunks or (self.nack_rate and self._random.random() < self.nack_rate):
+                self.nacks_sent += 1
+                return NACK
+            self.frame[offset : offset + self.chunk_size] = packet[HEADER_SIZE + OFFSET_SIZE:]
+        elif command == CMD_IMG_END:
+            if not self.receiving:
+                return self._error("Image end without a start")
+            self.receiving = False
+            self.frames_completed += 1
+        else:
+            return self._error(f"Unknown command 0x{command:02X}")
+        return ACK
+
+    def feed(self, data) -> bytes:
+        """Takes bytes from the host, returns the replies to the packets they completed."""
+        self.bytes_received += len(data)
+        self._buffer += data
+        replies = bytearray()
+
+        while len(self._buffer) >= HEADER_SIZE:
+            if self._buffer[:4] != PREAMBLE:
+                # Skip to the next preamble, NACKing the garbage once
+                next_preamble = self._buffer.find(PREAMBLE, 1)
+                skipped = len(self._buffer) if next_preamble < 0 else next_preamble
+                replies += self._error(f"Missing preamble, skipped {skipped} bytes")
+                del self._buffer[:skipped]
+                continue
+
+            size = self._packet_size(self._buffer[4])
+            if len(self._buffer) < size:
+                break
+            packet = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            replies += self._handle(packet)
+
+        return bytes(replies)
+
+class _Link:
+    """Delays data by how long it takes to cross a link at baudrate, plus latency per reply."""
+    def __init__(self, baudrate=None, latency=0.0):
+        self.baudrate = baudrate
+        self.latency = latency
+        self._free_at = 0.0
+
+    def transfer(self, size):
+        if not self.baudrate and not self.latency:
+            return
+        now = time.monotonic()
+        self._free_at = max(self._free_at, now)
+        if self.baudrate:
+            self._free_at += size * BITS_PER_BYTE / self.baudrate
+        delay = self._free_at + self.latency - now
+        if delay > 0:
+            time.sleep(delay)
+
+def _serve(screen, receive, send, link):
+    while True:
+        try:
+            data = receive(65536)
+        except OSError:
+            return
+        if not data:
+            return
+        link.transfer(len(data))
+        if screen.max_baudrate and link.baudrate and link.baudrate > screen.max_baudrate:
+            # Too fast for the screen's UART
+            data = bytes(len(data))
+        replies = screen.feed(data)
+        if replies:
+            try:
+                send(replies)
+            except OSError:
+                return
+
+class EmulatedSerial(SocketSerial):
+    """The host end of an emulated screen's link, whose baudrate can be changed like a serial port's."""
+    def __init__(self, sock, screen, link, timeout=2.0):
+        super().__init__(sock, timeout)
+        self.screen = screen
+        self.link = link
+
+    @property
+    def baudrate(self):
+        return self.link.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baudrate):
+        self.link.baudrate = baudrate
+
+def open_emulated_serial(screen:EmulatedScreen=None, baudrate=None, latency=0.0, timeout=2.0) -> EmulatedSerial:
+    """
+    Starts an emulated screen on a background thread and returns a serial-like object
+    connected to it through a socket pair. baudrate and latency slow the link down like
+    the real 1.5 Mbaud one, none by default.
+    """
+    screen = screen or EmulatedScreen()
+    link = _Link(baudrate, latency)
+    host, device = socket.socketpair()
+    thread = threading.Thread(target=_serve, args=(screen, device.recv, device.sendall, link),
+                              name="aoostar-emulator", daemon=True)
+    thread.start()
+    return EmulatedSerial(host, screen, link, timeout)
+
+def open_emulated_pty(screen:EmulatedScreen=None, baudrate=None, latency=0.0):
+    """
+    Starts an emulated screen on a pseudo terminal, POSIX only. Returns the path to open
+    as the screen's serial port, and the EmulatedScreen.
+    """
+    import tty
+
+    screen = screen or EmulatedScreen()
+    controller, device = os.openpty()
+    tty.setraw(device)
+    path = os.ttyname(device)
+
+    def send(data):
+        while data:
+            data = data[os.write(controller, data):]
+
+    thread = threading.Thread(target=_serve, args=(screen, lambda size: os.read(controller, size), send, _Link(baudrate, latency)),
+                              name="aoostar-emulator", daemon=True)
+    thread.start()
+    return path, screen
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Emulated Aoostar screen on a pty")
+    parser.add_argument("--baud", type=int, default=1500000,
+                        help="Link speed to simulate, 0 for none (default: 1500000)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Extra seconds before every reply (default: 0)")
+    parser.add_argument("--nack-rate", dest="nack_rate", type=float, default=0.0,
+                        help="Chance of NACKing each chunk (default: 0)")
+    parser.add_argument("--max-chunk-size", dest="max_chunk_size", type=int, default=255,
+                        help="Largest chunk size accepted (default: 255)")
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        print("The emulator needs a pty, which Windows doesn't have.")
+        exit(1)
+
+    path, screen = open_emulated_pty(EmulatedScreen(args.nack_rate, max_chunk_size=args.max_chunk_size), args.baud, args.latency)
+    print(f"Emulated screen at {path}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"{screen.frames_completed} frames, {screen.chunks_received} chunks, {screen.nacks_sent} NACKs, {screen.bytes_received} bytes")
+    except KeyboardInterrupt:
+        pass
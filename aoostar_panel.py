@@ -0,0 +1,454 @@
+import os
+import json
+import time
+import itertools
+import threading
+from collections import OrderedDict, namedtuple
+from PIL import Image, ImageDraw, ImageFont
+
+import frame_stats
+from glyph_atlas import GlyphAtlas, textbbox
+from aoostar_data_model import AoostarDataModel
+from rgb565 import pack_rgb565, blit_rgb565
+from sensor_history import sensor_history
+
+PANEL_WIDTH = 960
+PANEL_HEIGHT = 376
+
+# Areas of a frame that changed since the frame tagged base, as (left, top, right, bottom)
+# boxes. tag identifies the new frame, so regions are only used against the frame they
+# were computed from.
+DirtyRegions = namedtuple('DirtyRegions', ['boxes', 'base', 'tag'])
+
+_frame_tags = itertools.count(1)
+# Tells apart the compiles of a panel, so a frame isn't taken for one drawn before its assets changed
+_panel_versions = itertools.count(1)
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def _clip(box):
+    return (max(box[0], 0), max(box[1], 0), min(box[2], PANEL_WIDTH), min(box[3], PANEL_HEIGHT))
+
+def _merge_boxes(boxes):
+    """Merges overlapping boxes until none overlap."""
+    merged = []
+    for box in boxes:
+        while True:
+            for i, other in enumerate(merged):
+                if _intersects(box, other):
+                    box = _union(box, merged.pop(i))
+                    break
+            else:
+                break
+        merged.append(box)
+    return merged
+
+class AssetCache:
+    """
+    Bounded LRU cache for anything decoded from a file.
+
+    Entries are keyed by the file path and its modification time, so an edited
+    file is decoded again on its next use while unchanged ones are shared.
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, path, loader, *extra_key):
+        key = (path, _mtime(path)) + extra_key
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        value = loader(path, *extra_key)
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def discard(self, path, *extra_key):
+        """Drops path's entries for extra_key, whatever their modification time."""
+        for key in [key for key in self._entries if key[0] == path and key[2:] == extra_key]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+# Shared by every panel in the process
+asset_cache = AssetCache()
+
+def _decode_font(path, size):
+    try:
+        return ImageFont.truetype(path, size)
+    except IOError:
+        print(f"Error loading {path}")
+        return ImageFont.load_default() # Use default font if not available
+
+def _decode_image(path):
+    try:
+        with Image.open(path) as img:
+            return img.convert('RGBA')
+    except FileNotFoundError:
+        print(f"Error loading {path}")
+        return None
+
+def _decode_config(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def load_font(path, size):
+    return asset_cache.get(path, _decode_font, size)
+
+def _build_glyph_atlas(path, size, color):
+    font = load_font(path, size)
+    return GlyphAtlas(font, color) if isinstance(font, ImageFont.FreeTypeFont) else None
+
+def load_glyph_atlas(path, size, color):
+    """Returns the font's GlyphAtlas for color, or None if it isn't a FreeType font."""
+    return asset_cache.get(path, _build_glyph_atlas, size, color)
+
+def load_image(path):
+    """Returns the decoded RGBA image, or None if it doesn't exist. Must not be modified."""
+    return asset_cache.get(path, _decode_image)
+
+def load_config(aoostar_data_path):
+    """Returns the parsed Monitor3.json. Must not be modified."""
+    return asset_cache.get(aoostar_data_path + "/Monitor3.json", _decode_config)
+
+class _Widget:
+    """One 'sensor' entry of a panel, with everything but its value resolved."""
+    # Files the widget was built from
+    asset_paths = ()
+
+    def __init__(self, sensor):
+        self.label = sensor['label']
+        self.default_value = sensor['value']
+        self.decimal_digits = sensor['decimalDigits']
+        self.unit = str(sensor['unit'])
+        self.position = (sensor['x'], sensor['y'])
+        # Seconds a displayed value is kept before it may change again, for jittery sensors
+        self.min_interval = float(sensor.get('minInterval', 0))
+
+    def value(self, value):
+        """Displayed value for a raw sensor value"""
+        if self.decimal_digits == 0:
+            value = round(float(value))
+        elif self.decimal_digits > 0:
+            value = round(float(value), int(self.decimal_digits))
+        return value
+
+    def signature(self, value):
+        """What the widget looks like for a displayed value: equal signatures draw the same pixels"""
+        return value
+
+    def box(self, value):
+        """Area of the panel covered by the widget for this value"""
+        return (0, 0, 0, 0)
+
+    def draw(self, image, draw, value, origin=(0, 0)):
+        pass
+
+class _TextWidget(_Widget):
+    """mode 1: the value as text"""
+    def __init__(self, sensor, aoostar_data_path):
+        super().__init__(sensor)
+        font_path = aoostar_data_path + "/fonts/" + sensor['fontFamily'] + ".ttf"
+        self.asset_paths = (font_path,)
+        self.font = load_font(font_path, sensor['fontSize'])
+        self.color = "white"
+        # Values are drawn from pre-rasterized glyphs, FreeType only lays out the rest
+        self.atlas = load_glyph_atlas(font_path, sensor['fontSize'], self.color)
+
+        self.anchor = "lm"
+        if sensor['textAlign'] == "center":
+            self.anchor = "mm"
+        elif sensor['textAlign'] == "right":
+            self.anchor = "rm"
+
+    def signature(self, value):
+        return str(value) + self.unit
+
+    def box(self, value):
+        if self.atlas is not None:
+            left, top, right, bottom = self.atlas.textbbox(self.position, str(value) + self.unit, anchor=self.anchor)
+        else:
+            left, top, right, bottom = textbbox(self.position, str(value) + self.unit, self.font, self.anchor)
+        # Antialiasing may bleed one pixel past the measured box
+        return (int(left) - 1, int(top) - 1, int(right) + 2, int(bottom) + 2)
+
+    def draw(self, image, draw, value, origin=(0, 0)):
+        position = (self.position[0] - origin[0], self.position[1] - origin[1])
+        if self.atlas is not None:
+            self.atlas.text(draw, position, str(value) + self.unit, anchor=self.anchor)
+        else:
+            draw.text(position, str(value) + self.unit, fill=self.color, anchor=self.anchor, font=self.font)
+
+class _BarWidget(_Widget):
+    """mode 3: the value as a progress bar, cropped from an overlay image"""
+    def __init__(self, sensor, aoostar_data_path):
+        super().__init__(sensor)
+        overlay_path = aoostar_data_path + "/sys_img/" + sensor['pic']
+        self.asset_paths = (overlay_path,)
+        self.overlay = load_image(overlay_path)
+        if self.overlay is None:
+            self.overlay = Image.new("RGBA", (10, 10), color = 'black')
+        self.max_value = float(sensor['maxValue'])
+
+    def _crop_width(self, value):
+        return int( self.overlay.width * float(value) / self.max_value )
+
+    def signature(self, value):
+        return self._crop_width(value)
+
+    def box(self, value):
+        x, y = self.position
+        return (x, y, x + self._crop_width(value), y + self.overlay.height)
+
+    def draw(self, image, draw, value, origin=(0, 0)):
+        overlay = self.overlay.crop((
+            0,
+            0,
+            self._crop_width(value),
+            self.overlay.height
+            ))
+        position = (self.position[0] - origin[0], self.position[1] - origin[1])
+        image.paste(overlay, position, mask=overlay)
+
+def _argb_color(color):
+    """Monitor3.json colors are signed 32 bit ARGB, -1 being opaque white"""
+    color &= 0xFFFFFFFF
+    return ((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF, color >> 24)
+
+class _GraphWidget(_Widget):
+    """
+    mode 4: the label's history as a line graph, or an area graph with "graphType": "area",
+    scaled from minValue to maxValue in the width x height box, newest sample on the right.
+
+    The graph is kept in its own image that scrolls left by one column per new sample,
+    so a frame only draws the samples that came in since the previous one.
+    """
+    def __init__(self, sensor, aoostar_data_path):
+        super().__init__(sensor)
+        self.size = (max(int(sensor['width']), 1), max(int(sensor['height']), 1))
+        self.min_value = float(sensor.get('minValue', 0))
+        self.max_value = float(sensor.get('maxValue', 100))
+        self.color = _argb_color(sensor.get('fontColor', -1))
+        self.area = sensor.get('graphType', "line") == "area"
+
+        self.history = sensor_history.track(self.label)
+        self._graph = Image.new("RGBA", self.size)
+        self._drawn = 0 # history.count when the graph was last updated
+
+    def value(self, value):
+        # The graph changes whenever a sample comes in, whatever its value
+        return self.history.count
+
+    def box(self, value):
+        x, y = self.position
+        return (x, y, x + self.size[0], y + self.size[1])
+
+    def _y(self, value):
+        height = self.size[1]
+        span = self.max_value - self.min_value
+        fraction = (value - self.min_value) / span if span > 0 else 0.0
+        fraction = min(max(fraction, 0.0), 1.0)
+        return (height - 1) - round(fraction * (height - 1))
+
+    def _update_graph(self):
+        new_samples = self.history.count - self._drawn
+        if new_samples <= 0:
+            return
+        width, height = self.size
+
+        if self._drawn == 0 or new_samples >= width:
+            self._graph.paste((0, 0, 0, 0), (0, 0, width, height))
+            samples = self.history.last(width)
+        else:
+            self._graph.paste(self._graph.crop((new_samples, 0, width, height)), (0, 0))
+            self._graph.paste((0, 0, 0, 0), (width - new_samples, 0, width, height))
+            # The previous sample too, for the line to carry on from it
+            samples = self.history.last(new_samples + 1)
+
+        draw = ImageDraw.Draw(self._graph)
+        x = width - len(samples)
+        previous = None
+        for sample in samples:
+            point = (x, self._y(sample))
+            if self.area:
+                draw.line([point, (x, height - 1)], fill=self.color)
+            elif previous is None:
+                draw.point(point, fill=self.color)
+            else:
+                draw.line([previous, point], fill=self.color)
+            previous = point
+            x += 1
+
+        self._drawn = self.history.count
+
+    def draw(self, image, draw, value, origin=(0, 0)):
+        self._update_graph()
+        position = (self.position[0] - origin[0], self.position[1] - origin[1])
+        image.paste(self._graph, position, mask=self._graph)
+
+_WIDGET_MODES = {
+    1: _TextWidget,
+    3: _BarWidget,
+    4: _GraphWidget,
+}
+
+class CompiledPanel:
+    """
+    A 'diy' entry of Monitor3.json with its background, fonts and overlays decoded
+    once, so each frame only has to draw the new sensor values.
+    """
+    def __init__(self, panel:dict, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal"):
+        background_path = aoostar_data_path + "/sys_img/" + panel['img']
+        self.background = load_image(background_path)
+        if self.background is None:
+            self.background = Image.new("RGBA", (PANEL_WIDTH, PANEL_HEIGHT), color = 'black')
+        elif self.background.size != (PANEL_WIDTH, PANEL_HEIGHT):
+            # Widget positions are in screen pixels, so the background is fitted to the screen first
+            self.background = self.background.resize((PANEL_WIDTH, PANEL_HEIGHT), Image.Resampling.LANCZOS)
+
+        self.widgets = []
+        for sensor in panel['sensor']:
+            widget_class = _WIDGET_MODES.get(sensor['mode'])
+            if widget_class:
+                self.widgets.append(widget_class(sensor, aoostar_data_path))
+        self.labels = tuple(widget.label for widget in self.widgets)
+        self.asset_paths = tuple(dict.fromkeys((background_path,) + tuple(path for widget in self.widgets for path in widget.asset_paths)))
+        self.asset_mtimes = [_mtime(path) for path in self.asset_paths]
+        self.default_values = [widget.default_value for widget in self.widgets]
+        self.version = next(_panel_versions)
+
+        # Layered rendering state, see render_rgb565. Panels are shared by everything
+        # rendering them, lock is held around a render and the use of its frame.
+        self.lock = threading.Lock()
+        self._frame = None
+        self._frame_tag = None
+        self._values = []
+        self._signatures = []
+        self._changed_at = []
+        self._boxes = []
+
+    def values(self, sensor_data:AoostarDataModel=None):
+        """Displayed value of every widget, fetched from the model in one get_many call"""
+        raw_values = sensor_data.get_many(self.labels) if sensor_data else self.default_values
+        return [widget.value(value) for widget, value in zip(self.widgets, raw_values)]
+
+    def _displayed(self, sensor_data, now):
+        """
+        Values and signatures render_rgb565 would draw: a widget keeps its previous value
+        when its signature didn't change, or changed sooner than its min_interval allows.
+        """
+        values = self.values(sensor_data)
+        signatures = [widget.signature(value) for widget, value in zip(self.widgets, values)]
+        if self._frame is None:
+            return values, signatures
+
+        for i, widget in enumerate(self.widgets):
+            if signatures[i] == self._signatures[i] or now - self._changed_at[i] < widget.min_interval:
+                values[i] = self._values[i]
+                signatures[i] = self._signatures[i]
+        return values, signatures
+
+    def signature(self, sensor_data:AoostarDataModel=None):
+        """
+        Cheap stand-in for the frame render_rgb565 would produce with this data, made of
+        the panel's version and the formatted text and bar widths: equal signatures mean
+        equal frames, even across a recompile.
+        """
+        return (self.version,) + tuple(self._displayed(sensor_data, time.monotonic())[1])
+
+    def _draw(self, values):
+        image = self.background.copy()
+        draw = ImageDraw.Draw(image)
+
+        for widget, value in zip(self.widgets, values):
+            widget.draw(image, draw, value)
+
+        return image
+
+    def render(self, sensor_data:AoostarDataModel=None):
+        """Draws the panel with the given sensor data, or Monitor3.json's placeholder values."""
+        return self._draw(self.values(sensor_data))
+
+    def render_rgb565(self, sensor_data:AoostarDataModel=None):
+        """
+        Renders the panel straight into a packed 960x376 RGB565 frame, redrawing only the
+        widgets whose signature changed since the previous call, and no sooner than their
+        min_interval after their last change.
+
+        Returns the frame, which is reused and updated in place by the next call, and the
+        DirtyRegions that changed. The first call renders and reports the whole frame.
+        """
+        now = time.monotonic()
+        values, signatures = self._displayed(sensor_data, now)
+
+        base = self._frame_tag
+        self._frame_tag = next(_frame_tags)
+
+        if self._frame is None:
+            image = self._draw(values)
+            with frame_stats.recorder.time("encode"):
+                self._frame = pack_rgb565(image, self._frame)
+            self._values, self._signatures = values, signatures
+            self._changed_at = [now] * len(values)
+            self._boxes = [_clip(widget.box(value)) for widget, value in zip(self.widgets, values)]
+            return self._frame, DirtyRegions([(0, 0, PANEL_WIDTH, PANEL_HEIGHT)], base, self._frame_tag)
+
+        boxes = list(self._boxes)
+        dirty = []
+        for i, value in enumerate(values):
+            if signatures[i] != self._signatures[i]:
+                self._changed_at[i] = now
+                boxes[i] = _clip(self.widgets[i].box(value))
+                dirty.append(_union(self._boxes[i], boxes[i]))
+        dirty = [box for box in _merge_boxes(dirty) if box[0] < box[2] and box[1] < box[3]]
+
+        for region in dirty:
+            image = self.background.crop(region)
+            draw = ImageDraw.Draw(image)
+
+            # Everything overlapping the region is redrawn, in panel order
+            for widget, value, box in zip(self.widgets, values, boxes):
+                if _intersects(box, region):
+                    widget.draw(image, draw, value, origin=region[:2])
+
+            with frame_stats.recorder.time("encode"):
+                blit_rgb565(self._frame, PANEL_WIDTH, pack_rgb565(image), region)
+
+        self._values, self._signatures, self._boxes = values, signatures, boxes
+        return self._frame, DirtyRegions(dirty, base, self._frame_tag)
+
+def _compile_panel(monitor_path, aoostar_data_path, aoostar_screen_id):
+    config = _decode_config(monitor_path)
+    return CompiledPanel(config['diy'][aoostar_screen_id - 1], aoostar_data_path)
+
+_panel_cache = AssetCache(max_entries=16)
+
+def get_compiled_panel(aoostar_screen_id=1, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal"):
+    """
+    Returns the compiled panel, compiling it again only when Monitor3.json or one of the
+    images and fonts it uses changes.
+    """
+    monitor_path = aoostar_data_path + "/Monitor3.json"
+    panel = _panel_cache.get(monitor_path, _compile_panel, aoostar_data_path, aoostar_screen_id)
+    if [_mtime(path) for path in panel.asset_paths] != panel.asset_mtimes:
+        _panel_cache.discard(monitor_path, aoostar_data_path, aoostar_screen_id)
+        panel = _panel_cache.get(monitor_path, _compile_panel, aoostar_data_path, aoostar_screen_id)
+    return panel
+
+def clear_caches():
+    asset_cache.clear()
+    _panel_cache.clear()
@@ -0,0 +1,127 @@
+import threading
+import time
+
+class LatestFrameSlot:
+    """
+    Hand-off queue holding at most one frame. Putting a frame while the previous one
+    hasn't been taken yet replaces it, so a slow consumer always gets the newest frame.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._frame = None
+        self._full = False
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, frame):
+        """Hands frame over. Returns the frame it replaced, if the previous one wasn't taken."""
+        with self._condition:
+            replaced = None
+            if self._full:
+                replaced = self._frame
+                self.dropped += 1
+            self._frame = frame
+            self._full = True
+            self._condition.notify()
+            return replaced
+
+    def get(self, timeout=None):
+        """Waits for the next frame. Returns None on timeout or once the slot is closed."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._full or self._closed, timeout):
+                return None
+            if not self._full:
+                return None
+            frame = self._frame
+            self._frame = None
+            self._full = False
+            return frame
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+class FramePipeline:
+    """
+    Renders frame N+1 on one thread while frame N is sent on another.
+
+    render_frame() is called every interval seconds and whatever it returns is handed to
+    send_frame(frame) through a LatestFrameSlot: when sending can't keep up, stale frames
+    are dropped instead of queuing up. Each frame is sent whole, so it must not be
+    modified by later renders. drop_frame(frame), when given, is called with every frame
+    that won't be sent, to release what it holds.
+    """
+    def __init__(self, render_frame, send_frame, interval=1.0, drop_frame=None):
+        self.render_frame = render_frame
+        self.send_frame = send_frame
+        self.interval = interval
+        self.drop_frame = drop_frame
+
+        self.slot = LatestFrameSlot()
+        self.rendered = 0
+        self.sent = 0
+
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _render_loop(self):
+        next_frame = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                frame = self.render_frame()
+            except Exception as e:
+                print(f"Render failed: {e}")
+            else:
+                if frame is not None:
+                    self._drop(self.slot.put(frame))
+                    self.rendered += 1
+
+            next_frame += self.interval
+            # Don't try to catch up on missed intervals after a slow render
+            next_frame = max(next_frame, time.monotonic())
+            self._stop.wait(next_frame - time.monotonic())
+
+    def _drop(self, frame):
+        if frame is not None and self.drop_frame is not None:
+            self.drop_frame(frame)
+
+    def _send_loop(self):
+        while not self._stop.is_set():
+            frame = self.slot.get()
+            if frame is None:
+                continue
+            try:
+                self.send_frame(frame)
+            except Exception as e:
+                print(f"Send failed: {e}")
+            else:
+                self.sent += 1
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._render_loop, name="aoostar-render", daemon=True),
+            threading.Thread(target=self._send_loop, name="aoostar-send", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.slot.close()
+        for thread in self._threads:
+            thread.join()
+        # The frame left in the slot, if the sender stopped before taking it
+        self._drop(self.slot.get(timeout=0))
+
+    def run(self):
+        """Runs until interrupted."""
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("Stopping...")
+        finally:
+            self.stop()
+        print(f"{self.rendered} frames rendered, {self.sent} sent, {self.slot.dropped} dropped.")
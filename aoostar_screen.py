@@ -1,62 +1,77 @@
+import json
 import struct
+import time
 import argparse
+import threading
+import weakref
+from collections import deque, namedtuple
 import serial
-import serial.tools.list_ports
-import json
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 
-from aoostar_data_model import AoostarDataModel
-from hwinfo_data import getHWiNFOData, convertHWiNFODataToAoostarCompatible
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-TARGET_VID = 0x0416 
-TARGET_PID = 0x90A1
+import frame_stats
+from aoostar_animation import AnimationSource, AnimationPlayer
+from aoostar_data_model import AoostarDataModel
+from aoostar_panel import get_compiled_panel, load_config
+from aoostar_pipeline import FramePipeline, LatestFrameSlot
+from frame_cache import FrameCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from rgb565 import pack_rgb565
+from sensor_source import SensorSource, SENSOR_SOURCES, open_sensor_source
+from sensor_history import sensor_history
+from hwinfo_data import load_mapping_rules
+from panel_export import EXPORT_FORMATS, export_panels, print_export_summary
+from screen_scheduler import ScreenScheduler, IpcTransport, PRIORITIES, DEFAULT_SOCKET_PATH, serve_ipc
+from screen_transport import TRANSPORTS, TARGET_VID, TARGET_PID, find_serial_port, find_screens, select_screens, open_serial_port, open_transport, parse_address, relay
+from screen_transport import LinkSettings, DEFAULT_LINK, DEFAULT_PROFILE_PATH, valid_chunk_size, link_key, load_link_profiles, save_link_profile
+from screen_protocol import (PREAMBLE, CMD_LCD_ON, CMD_LCD_OFF, CMD_IMG_START, CHUNK_SIZE_OFFSET, CMD_CHUNK_HEADER, CMD_IMG_END,
+                             WIDTH, HEIGHT, TOTAL_BYTES, CHUNK_SIZE, CHUNK_COUNT)
 
-# --- Protocol Constants ---
-# Header Preamble: AA 55 AA 55
-PREAMBLE = b'\xAA\x55\xAA\x55'
+# Chunk sizes and baud rates probe_link tries: every multiple of 47 that fits the image
+# start command's byte, and 240, the largest size dividing the frame.
+PROBE_CHUNK_SIZES = (47, 94, 141, 188, 235, 240)
+PROBE_BAUDRATES = (1500000, 2000000, 3000000, 4000000)
+PROBE_FRAMES = 3
+# Frames in a row that may fail with negotiated settings before going back to DEFAULT_LINK
+LINK_FALLBACK_FAILURES = 3
+# Enough to complete any packet the screen may still be waiting the rest of
+RESYNC_BYTES = 512
 
-# LCD ON: Header + 0x0B + 0x00*3
-# Bytes: AA 55 AA 55 0B 00 00 00
-CMD_LCD_ON = PREAMBLE + b'\x0B\x00\x00\x00'
+# Reused by send_image so a refresh loop doesn't allocate a new frame every time
+_frame_buffer = bytearray(TOTAL_BYTES)
 
-# LCD OFF: Header + 0x0A + 0x00*3
-# Bytes: AA 55 AA 55 0A 00 00 00
-CMD_LCD_OFF = PREAMBLE + b'\x0A\x00\x00\x00'
+# Last frame fully sent to each port, and its DirtyRegions tag if it had one, compared
+# against by delta transmission.
+# Dropped on lcd_on or on any failed send, so the next frame goes out in full.
+_last_frames = weakref.WeakKeyDictionary()
 
-# IMG START: 
-# Matches the sequence in 'img_cmd_start' image exactly:
-# AA 55 AA 55 05 00 00 00 04 00 0F 2F 00 04 0B 00
-# Note: The last 4 bytes (00 04 0B 00) correspond to the total size 721,920 (0xB0400) in Little Endian.
-CMD_IMG_START = PREAMBLE + b'\x05\x00\x00\x00\x04\x00\x0F\x2F\x00\x04\x0B\x00'
+# (panel id, signature) of the last panel sent to each port, with the tag of its frame
+_last_panel_signatures = weakref.WeakKeyDictionary()
 
-# CHUNK HEADER: Header + 0x08 + 0x00*3
-# Bytes: AA 55 AA 55 08 00 00 00
-CMD_CHUNK_HEADER = PREAMBLE + b'\x08\x00\x00\x00'
+# Progress of a frame being sent, given to send_image's progress callback: stage is
+# "start", "chunks" every PROGRESS_CHUNKS chunks or so, then "done" or "cancelled".
+SendProgress = namedtuple('SendProgress', ['stage', 'chunks_sent', 'chunks_total'])
+PROGRESS_CHUNKS = 512
 
-# IMG END: Header + 0x06 + 0x00*3
-# Bytes: AA 55 AA 55 06 00 00 00
-CMD_IMG_END = PREAMBLE + b'\x06\x00\x00\x00'
+class _LinkState:
+    """The LinkSettings in use on a port, and where they were loaded from, to forget them if they don't hold up."""
+    def __init__(self, settings=DEFAULT_LINK, profile_path=None, key=None):
+        self.settings = settings
+        self.profile_path = profile_path
+        self.key = key
+        self.failures = 0
 
-# --- Display Config ---
-WIDTH = 960
-HEIGHT = 376
-TOTAL_BYTES = WIDTH * HEIGHT * 2  # 721,920 bytes
-CHUNK_SIZE = 47
-CHUNK_COUNT = TOTAL_BYTES // CHUNK_SIZE #15,360 bytes
+# _LinkState of every port whose settings aren't DEFAULT_LINK
+_links = weakref.WeakKeyDictionary()
 
-def find_serial_port():
-    """
-    Finds the serial port name for the device's USB Vendor ID and Product ID.
-
-    Returns:
-        str or None: The name of the serial port (e.g., 'COM3' or '/dev/ttyUSB0'), 
-                     or None if not found.
-    """
-    ports = serial.tools.list_ports.comports()
-    for port in ports:
-        if port.vid == TARGET_VID and port.pid == TARGET_PID:
-            return port.device
-    return None
+class FrameCancelled(Exception):
+    """A frame stopped halfway through by its cancel event, after ending it on the screen."""
+    def __init__(self, message, chunks_sent=0):
+        super().__init__(message)
+        self.chunks_sent = chunks_sent
 
 def check_ack(ser, context=""):
     """Reads one byte and ensures it is 'A'."""
@@ -64,7 +79,15 @@ def check_ack(ser, context=""):
     if resp != b'A':
         raise IOError(f"NACK or Timeout in {context}. Received: {resp}")
 
+def check_acks(ser, chunk_indices, chunk_size=CHUNK_SIZE):
+    """Reads one ACK per chunk in flight, in one go, and attributes any NACK to its chunk."""
+    resp = ser.read(len(chunk_indices))
+    for n, i in enumerate(chunk_indices):
+        if resp[n : n + 1] != b'A':
+            raise IOError(f"NACK or Timeout in chunk_{i} (offset {i * chunk_size}). Received: {resp[n : n + 1]}")
+
 def lcd_on(ser):
+    _last_frames.pop(ser, None)
     ser.write(CMD_LCD_ON)
     check_ack(ser, "lcd_on")
 
@@ -72,9 +95,11 @@ def lcd_off(ser):
     ser.write(CMD_LCD_OFF)
     check_ack(ser, "lcd_off")
 
-def _image_to_rgb565(img):
+def _image_to_rgb565(img, out=None):
     """
     Converts any image to the specific 960x376 RGB565 byte array.
+
+    The frame is packed into out when given, otherwise into a new bytearray.
     """
     
     # Force RGB
@@ -83,69 +108,455 @@ def _image_to_rgb565(img):
     
     # Resize to exact display dimensions
     # Using LANCZOS for high-quality downsampling
-    img = img.resize((WIDTH, HEIGHT), Image.Resampling.LANCZOS)
+    if img.size != (WIDTH, HEIGHT):
+        img = img.resize((WIDTH, HEIGHT), Image.Resampling.LANCZOS)
     
-    pixels = list(img.get_flattened_data())
-    data = bytearray()
-    
-    for r, g, b in pixels:
-        # Convert to RGB565: R(5bits) G(6bits) B(5bits)
-        r5 = (r >> 3) & 0x1F
-        g6 = (g >> 2) & 0x3F
-        b5 = (b >> 3) & 0x1F
-        rgb = (r5 << 11) | (g6 << 5) | b5
-        
-        # Append as Little Endian (lower byte first)
-        data.extend(struct.pack('<H', rgb))
-        
-    return data
-
-def send_image(ser, image):
+    return pack_rgb565(img, out)
+
+# What _encode_image_file's frames depend on besides the file, part of their cache key
+IMAGE_FILE_SETTINGS = f"{WIDTH}x{HEIGHT} LANCZOS RGB565LE"
+
+def _encode_image_file(image_path):
+    with Image.open(image_path) as img:
+        return _image_to_rgb565(img)
+
+def _chunk_count(chunk_size=CHUNK_SIZE):
+    return TOTAL_BYTES // chunk_size
+
+def _img_start(chunk_size=CHUNK_SIZE):
+    """The image start command for chunks of chunk_size bytes"""
+    if chunk_size == CHUNK_SIZE:
+        return CMD_IMG_START
+    return CMD_IMG_START[:CHUNK_SIZE_OFFSET] + bytes((chunk_size,)) + CMD_IMG_START[CHUNK_SIZE_OFFSET + 1:]
+
+def _region_chunks(boxes, chunk_size=CHUNK_SIZE):
+    """Returns the indices of the chunks holding any pixel of the given (left, top, right, bottom) boxes."""
+    chunk_indices = set()
+    for left, top, right, bottom in boxes:
+        for y in range(top, bottom):
+            first = (y * WIDTH + left) * 2 // chunk_size
+            last = ((y * WIDTH + right) * 2 - 1) // chunk_size
+            chunk_indices.update(range(first, last + 1))
+    return sorted(chunk_indices)
+
+def _changed_chunks(img_data, last_frame, candidates=None, chunk_size=CHUNK_SIZE):
+    """Returns the indices of the chunks that differ between two frames, only checking candidates if given."""
+    if candidates is None and numpy is not None:
+        new = numpy.frombuffer(img_data, dtype=numpy.uint8).reshape(-1, chunk_size)
+        old = numpy.frombuffer(last_frame, dtype=numpy.uint8).reshape(-1, chunk_size)
+        return numpy.flatnonzero((new != old).any(axis=1)).tolist()
+
+    new = memoryview(img_data)
+    old = memoryview(last_frame)
+    changed = []
+    for i in (range(_chunk_count(chunk_size)) if candidates is None else candidates):
+        offset = i * chunk_size
+        if new[offset : offset + chunk_size] != old[offset : offset + chunk_size]:
+            changed.append(i)
+    return changed
+
+def _send_chunks(ser, img_data, chunk_indices, window=1, cancel=None, progress=None, chunk_size=CHUNK_SIZE):
+    """
+    Writes the chunk packets, keeping up to window chunks waiting for their ACK: as ACKs
+    come back, as many chunks are written to take their place. A window of 1 waits for
+    every ACK before writing the next chunk.
+
+    Once cancel, a threading.Event, is set, no more chunks are written and FrameCancelled
+    is raised when those in flight are ACKed. progress(SendProgress) is called as chunks
+    are ACKed.
+    """
+    if window < 1:
+        raise ValueError(f"The window must be at least 1 chunk, not {window}")
+    stats = frame_stats.recorder
+    packets = bytearray()
+    in_flight = deque()
+    position = sent = reported = 0
+    total = len(chunk_indices)
+
+    while position < total or in_flight:
+        cancelled = cancel is not None and cancel.is_set()
+        if cancelled and not in_flight:
+            raise FrameCancelled(f"Frame cancelled after {sent} of {total} chunks", sent)
+
+        if not cancelled:
+            while position < total and len(in_flight) < window:
+                i = chunk_indices[position]
+                position += 1
+                offset = i * chunk_size
+
+                # [CMD_CHUNK_HEADER] + [OFFSET (u32 LE)] + [CHUNK DATA]
+                packets += CMD_CHUNK_HEADER
+                packets += struct.pack('<I', offset)
+                packets += img_data[offset : offset + chunk_size]
+                in_flight.append(i)
+            if packets:
+                with stats.time("transmit"):
+                    ser.write(packets)
+                packets.clear()
+
+        # The oldest chunk's ACK, and any others already back, or all of them once nothing more is written
+        if position >= total or cancelled:
+            count = len(in_flight)
+        else:
+            count = min(len(in_flight), max(1, getattr(ser, 'in_waiting', 0) or 0))
+        acked = [in_flight.popleft() for _ in range(count)]
+        try:
+            with stats.time("ack_wait"):
+                check_acks(ser, acked, chunk_size)
+        except IOError:
+            # Read the replies to the chunks still in flight, so the next frame's ACKs line up
+            if in_flight and len(ser.read(len(in_flight))) < len(in_flight):
+                _resync(ser)
+            raise
+        sent += count
+
+        if progress is not None and sent - reported >= PROGRESS_CHUNKS:
+            progress(SendProgress("chunks", sent, total))
+            reported = sent
+
+def send_image(ser, image, delta=False, window=1, dirty=None, cancel=None, progress=None):
     """
     Sends an image using the specific 47-chunk protocol.
+
+    image is either a PIL Image or an already packed 960x376 RGB565 frame.
+
+    With delta, only the chunks that changed since the last frame sent to this port
+    are transmitted. The first frame, and any frame after a NACK or lcd_on, is sent in full,
+    as is every frame to a shared transport such as IpcTransport.
+    dirty is an optional aoostar_panel.DirtyRegions for image: when the last frame sent
+    is the one the regions are based on, only the chunks under them are compared.
+
+    window is how many chunks may be written before their ACKs are read back.
+
+    cancel is an optional threading.Event: setting it stops the frame at the next chunk
+    boundary, ends it on the screen and raises FrameCancelled. progress is called with
+    the SendProgress of the frame.
+
+    Returns the number of chunks sent.
     """
-    img_data = _image_to_rgb565(image)
+    stats = frame_stats.recorder
+    if isinstance(image, Image.Image):
+        with stats.time("encode"):
+            img_data = _image_to_rgb565(image, _frame_buffer)
+    else:
+        img_data = image
     
     if len(img_data) != TOTAL_BYTES:
         raise ValueError(f"Image data size mismatch. Expected {TOTAL_BYTES}, got {len(img_data)}")
 
-    print("Sending Start Command...")
-    ser.write(CMD_IMG_START)
-    check_ack(ser, "img_cmd_start")
+    if getattr(ser, 'shared', False):
+        # What is on screen also depends on other senders, only the transport knows
+        delta = False
 
-    print(f"Sending {len(img_data)} bytes in {CHUNK_COUNT} chunks (Chunk Size: {CHUNK_SIZE})...")
-    
-    for i in range(CHUNK_COUNT):
-        offset = i * CHUNK_SIZE
-        chunk = img_data[offset : offset + CHUNK_SIZE]
-        
-        # [CMD_CHUNK_HEADER] + [OFFSET (u32 LE)] + [CHUNK DATA]
-        offset_bytes = struct.pack('<I', offset)
-        packet = CMD_CHUNK_HEADER + offset_bytes + chunk
-        
-        ser.write(packet)
-        check_ack(ser, f"chunk_{i}")
-        
-        #print(f"\rProgress: {i+1}/{CHUNK_COUNT}", end='')
-
-    #print("\nAll chunks sent.")
-    print("All chunks sent.")
-
-    print("Sending End Command...")
-    ser.write(CMD_IMG_END)
-    check_ack(ser, "img_cmd_end")
-    print("Done.")
-
-def send_image_file(ser, image_path):
+    write_frame = getattr(ser, 'write_frame', None)
+    link = _links.get(ser)
+    # A framebuffer transport takes the default chunks, nothing is negotiated with it
+    chunk_size = link.settings.chunk_size if link is not None and write_frame is None else CHUNK_SIZE
+
+    # Whatever happens below, the screen contents are unknown until the frame completes
+    last_frame, last_tag = _last_frames.pop(ser, (None, None))
+    frame_tag = dirty.tag if dirty else None
+
+    if delta and last_frame is not None:
+        if dirty and last_tag is not None and dirty.base == last_tag:
+            chunk_indices = _changed_chunks(img_data, last_frame, _region_chunks(dirty.boxes, chunk_size), chunk_size)
+        else:
+            chunk_indices = _changed_chunks(img_data, last_frame, chunk_size=chunk_size)
+        if not chunk_indices:
+            print("Frame unchanged, nothing to send.")
+            _last_frames[ser] = (last_frame, frame_tag)
+            if progress is not None:
+                progress(SendProgress("done", 0, 0))
+            return 0
+    else:
+        chunk_indices = range(_chunk_count(chunk_size))
+
+    if progress is not None:
+        progress(SendProgress("start", 0, len(chunk_indices)))
+    if write_frame is not None:
+        # The transport is the framebuffer itself, nothing to packetize
+        with stats.time("transmit"):
+            write_frame(img_data, chunk_indices)
+        stats.count("bytes_sent", len(chunk_indices) * CHUNK_SIZE)
+        stats.count("chunks_sent", len(chunk_indices))
+    else:
+        try:
+            _send_frame_packets(ser, img_data, chunk_indices, window, cancel, progress, chunk_size)
+        except IOError:
+            _link_failed(ser)
+            raise
+        if link is not None:
+            link.failures = 0
+    if progress is not None:
+        progress(SendProgress("done", len(chunk_indices), len(chunk_indices)))
+
+    if last_frame is None:
+        last_frame = bytearray(img_data)
+    else:
+        last_frame[:] = img_data
+    _last_frames[ser] = (last_frame, frame_tag)
+
+    return len(chunk_indices)
+
+def _send_frame_packets(ser, img_data, chunk_indices, window=1, cancel=None, progress=None, chunk_size=CHUNK_SIZE):
     """
+    Sends the chunks of a frame between the image start and end commands. A cancelled
+    frame is still ended, so the screen is ready for the next one.
+    """
+    stats = frame_stats.recorder
+    sent_bytes = len(chunk_indices) * (len(CMD_CHUNK_HEADER) + 4 + chunk_size)
+    try:
+        print("Sending Start Command...")
+        with stats.time("transmit"):
+            ser.write(_img_start(chunk_size))
+        with stats.time("ack_wait"):
+            check_ack(ser, "img_cmd_start")
+
+        print(f"Sending {len(chunk_indices) * chunk_size} bytes in {len(chunk_indices)} chunks (Chunk Size: {chunk_size})...")
+
+        start_time = time.perf_counter()
+        try:
+            _send_chunks(ser, img_data, chunk_indices, window, cancel, progress, chunk_size)
+        except FrameCancelled as e:
+            print(f"{e}, sending End Command...")
+            with stats.time("transmit"):
+                ser.write(CMD_IMG_END)
+            with stats.time("ack_wait"):
+                check_ack(ser, "img_cmd_end")
+            if progress is not None:
+                progress(SendProgress("cancelled", e.chunks_sent, len(chunk_indices)))
+            raise
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+
+        print(f"All chunks sent in {elapsed:.3f}s ({sent_bytes / elapsed / 1024:.1f} KiB/s, window {window}).")
+
+        print("Sending End Command...")
+        with stats.time("transmit"):
+            ser.write(CMD_IMG_END)
+        with stats.time("ack_wait"):
+            check_ack(ser, "img_cmd_end")
+        print("Done.")
+    except (IOError, FrameCancelled):
+        # The frame is abandoned, and its chunks go again with the next one
+        stats.count("chunks_retried", len(chunk_indices))
+        raise
+
+    stats.count("bytes_sent", sent_bytes + len(CMD_IMG_START) + len(CMD_IMG_END))
+    stats.count("chunks_sent", len(chunk_indices))
+
+def _resync(ser):
+    """Completes any packet the screen is still waiting the rest of, and drops the replies."""
+    ser.write(bytes(RESYNC_BYTES))
+    timeout = ser.timeout
+    ser.timeout = 0.2
+    try:
+        while ser.read(4096):
+            pass
+    finally:
+        ser.timeout = timeout
+
+def set_link_settings(ser, settings:LinkSettings, profile_path=None, key=None):
+    """
+    Sends the next frames to ser with settings' chunk size, switching its port to settings'
+    baud rate if it has one. profile_path and key are where they were loaded from.
+    Raises ValueError if the chunk size doesn't divide a frame.
+    """
+    if not valid_chunk_size(settings.chunk_size):
+        raise ValueError(f"Chunk size {settings.chunk_size} doesn't divide a {TOTAL_BYTES} byte frame")
+    link = _links.get(ser)
+    current = link.settings if link is not None else DEFAULT_LINK
+    if settings.baudrate != current.baudrate and hasattr(ser, 'baudrate'):
+        ser.baudrate = settings.baudrate
+    if settings == DEFAULT_LINK:
+        _links.pop(ser, None)
+    else:
+        _links[ser] = _LinkState(settings, profile_path, key)
+
+def apply_link_profile(ser, profile_path=DEFAULT_PROFILE_PATH):
+    """Uses the link settings saved for ser by probe_link, if any."""
+    key = link_key(ser)
+    settings = load_link_profiles(profile_path).get(key) if key is not None else None
+    if settings is not None and settings != DEFAULT_LINK:
+        print(f"Using chunk size {settings.chunk_size} at {settings.baudrate} baud, as probed for {key}.")
+        set_link_settings(ser, settings, profile_path, key)
+
+def _link_failed(ser):
+    """Goes back to DEFAULT_LINK after LINK_FALLBACK_FAILURES frames in a row failed with other settings."""
+    link = _links.get(ser)
+    if link is None:
+        return
+    link.failures += 1
+    if link.failures < LINK_FALLBACK_FAILURES:
+        return
+
+    print(f"{link.failures} frames in a row failed with chunk size {link.settings.chunk_size} at {link.settings.baudrate} baud, "
+          f"going back to {DEFAULT_LINK.chunk_size} at {DEFAULT_LINK.baudrate} baud.")
+    set_link_settings(ser, DEFAULT_LINK)
+    try:
+        _resync(ser)
+    except IOError:
+        pass
+    if link.profile_path is not None:
+        try:
+            # Probed again before they are used again
+            save_link_profile(link.key, None, link.profile_path)
+        except OSError as e:
+            print(f"Could not update {link.profile_path}: {e}")
+
+def _probe_card(settings:LinkSettings, frame_number):
+    """A test card where any misplaced or missing chunk shows: gradients under a grid, and the settings"""
+    red = Image.linear_gradient('L').rotate(90).resize((WIDTH, HEIGHT))
+    green = Image.linear_gradient('L').resize((WIDTH, HEIGHT))
+    blue = ImageChops.add_modulo(red, green).point(lambda v: (v + frame_number * 64) % 256)
+    img = Image.merge('RGB', (red, green, blue))
+
+    draw = ImageDraw.Draw(img)
+    for x in range(0, WIDTH, 32):
+        draw.line((x, 0, x, HEIGHT), fill="white")
+    for y in range(0, HEIGHT, 32):
+        draw.line((0, y, WIDTH, y), fill="white")
+    try:
+        font = ImageFont.truetype("fonts/Mx437_IBM_PS-55_re.ttf", 32)
+    except IOError:
+        font = None
+    draw.text((WIDTH // 2, HEIGHT // 2), f"chunk size {settings.chunk_size}, {settings.baudrate} baud",
+              fill="white", anchor="mm", font=font, stroke_width=2, stroke_fill="black")
+    return img
+
+def probe_link(ser, chunk_sizes=PROBE_CHUNK_SIZES, baudrates=PROBE_BAUDRATES, window=1, frames=PROBE_FRAMES, verify=None):
+    """
+    Tries every chunk size at every baud rate, sending frames test cards in a row with each.
+    Settings pass if the screen ACKs them all and verify(frame), when given, finds the last
+    one intact on screen. Baud rates are only tried if ser has one.
+
+    Leaves ser with the fastest settings that passed, DEFAULT_LINK if none did, and returns
+    them with every (LinkSettings, bytes per second or None if they failed). Raises
+    ValueError if a chunk size doesn't divide a frame.
+    """
+    invalid = [chunk_size for chunk_size in chunk_sizes if not valid_chunk_size(chunk_size)]
+    if invalid:
+        raise ValueError(f"Chunk sizes {', '.join(map(str, invalid))} don't divide a {TOTAL_BYTES} byte frame")
+    if not getattr(ser, 'baudrate', None):
+        baudrates = [DEFAULT_LINK.baudrate]
+    results = []
+    for baudrate in baudrates:
+        for chunk_size in chunk_sizes:
+            settings = LinkSettings(chunk_size, baudrate)
+            set_link_settings(ser, settings)
+            chunk_indices = range(_chunk_count(chunk_size))
+            try:
+                elapsed = 0.0
+                for frame_number in range(frames):
+                    frame = _image_to_rgb565(_probe_card(settings, frame_number))
+                    start = time.perf_counter()
+                    _send_frame_packets(ser, frame, chunk_indices, window, chunk_size=chunk_size)
+                    elapsed += time.perf_counter() - start
+                if verify is not None and not verify(frame):
+                    raise IOError("The frame on screen isn't the one sent.")
+            except IOError as e:
+                print(f"Chunk size {chunk_size} at {baudrate} baud failed: {e}")
+                results.append((settings, None))
+                set_link_settings(ser, DEFAULT_LINK)
+                _resync(ser)
+                continue
+            results.append((settings, frames * TOTAL_BYTES / max(elapsed, 1e-9)))
+
+    passed = [(speed, settings) for settings, speed in results if speed is not None]
+    best = max(passed)[1] if passed else DEFAULT_LINK
+    set_link_settings(ser, best)
+    # Whatever the screen shows now, it isn't what delta transmission would compare against
+    _last_frames.pop(ser, None)
+    return best, results
+
+def print_probe_results(results):
+    print(f"{'CHUNK SIZE':>10} | {'BAUD':>9} | {'OVERHEAD':>8} | {'KiB/s':>9}")
+    print("-" * 45)
+    for settings, speed in results:
+        overhead = (len(CMD_CHUNK_HEADER) + 4) / (len(CMD_CHUNK_HEADER) + 4 + settings.chunk_size)
+        print(f"{settings.chunk_size:>10} | {settings.baudrate:>9} | {overhead:>8.1%} | "
+              + (f"{speed / 1024:>9.1f}" if speed is not None else f"{'failed':>9}"))
+
+def open_screen(transport="serial", target=None, link_profile=DEFAULT_PROFILE_PATH):
+    """open_transport, with the link settings saved for the screen in link_profile, if any."""
+    ser = open_transport(transport, target)
+    if link_profile and transport == "serial":
+        apply_link_profile(ser, link_profile)
+    return ser
+
+def send_image_file(ser, image_path, window=1, cache:FrameCache=None):
+    """
+    Sends an image file. With a cache, its frame is only encoded the first time, and
+    read back from the cache's memory mapped copy after that.
+    """
+    if cache is None:
+        print("Converting image...")
+        img = Image.open(image_path)
+        send_image(ser,img,window=window)
+        return
+
+    hits = cache.hits
+    with frame_stats.recorder.time("encode"):
+        frame = cache.get(image_path, _encode_image_file, IMAGE_FILE_SETTINGS)
+    print("Image read from cache." if cache.hits > hits else "Image converted and cached.")
+    try:
+        send_image(ser, frame, window=window)
+    finally:
+        if hasattr(frame, 'close'):
+            frame.close()
+
+def play_animation(ser, path, fps=None, loops=0, window=1, cache_mb=64):
+    """
+    Plays an animated GIF/APNG/WebP, or a directory of frames, at its own frame rate or fps,
+    loops times or until interrupted if 0. Only the chunks that change between frames are sent.
+
+    ser can be a list of ports, to play the animation on every one of them. Each one is
+    then sent to by a thread of its own through a LatestFrameSlot, so a slow or NACKing
+    screen drops its own stale frames without holding the others back.
     """
-    print("Converting image...")
+    sers = ser if isinstance(ser, (list, tuple)) else [ser]
+    slots = []
+    threads = []
 
-    img = Image.open(image_path)
-    send_image(ser,img)
+    def send_loop(ser, slot):
+        while (frame := slot.get()) is not None:
+            try:
+                send_image(ser, frame, True, window)
+            except IOError as e:
+                # The next frame is sent in full, which resyncs the screen
+                print(f"Frame failed: {e}")
+
+    if len(sers) == 1:
+        def send_frame(frame):
+            send_image(sers[0], frame, True, window)
+    else:
+        slots = [LatestFrameSlot() for _ in sers]
+        threads = [threading.Thread(target=send_loop, args=(ser, slot), name=f"aoostar-send-{n}", daemon=True)
+                   for n, (ser, slot) in enumerate(zip(sers, slots))]
+        for thread in threads:
+            thread.start()
+
+        def send_frame(frame):
+            # Frames aren't modified once encoded, every screen can be handed the same one
+            for slot in slots:
+                slot.put(frame)
+
+    source = AnimationSource(path, fps)
+    try:
+        player = AnimationPlayer(source, _image_to_rgb565, send_frame,
+                                 cache_bytes=int(cache_mb * 1024 * 1024))
+        player.play(loops)
+    finally:
+        # Whatever is still in a slot goes out before its thread ends
+        for slot in slots:
+            slot.close()
+        for thread in threads:
+            thread.join()
+        source.close()
 
+    for n, (ser, slot) in enumerate(zip(sers, slots)):
+        print(f"{getattr(ser, 'port', None) or f'Screen {n + 1}'}: {slot.dropped} frames dropped while it was busy.")
 
-def send_text(ser,text):
+def send_text(ser,text,window=1):
     #try:
     color = "white"
     color_bg = "black"
@@ -174,77 +585,427 @@ def send_text(ser,text):
     #position = (position[0] + draw.textlength("GPU Temp:", font=font) , position[1])
     #draw.text(position, "99C", fill="red", font=font)
 
-    send_image(ser,image)
+    send_image(ser,image,window=window)
+
+
+def load_aoostar_config(aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal"):
+    return load_config(aoostar_data_path)
+
+def render_aoostar_panel(aoostar_screen_id=1, real_sensor_data:AoostarDataModel=None, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal"):
+    """Returns the panel's packed RGB565 frame, updated in place by its next render, and its DirtyRegions."""
+    panel = get_compiled_panel(aoostar_screen_id, aoostar_data_path)
+    return panel.render_rgb565(real_sensor_data)
+
+def send_aoostar_panel_graphics(ser, aoostar_screen_id=1, real_sensor_data:AoostarDataModel=None, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal", delta=False, window=1, sensor_source:SensorSource=None, cancel=None, progress=None):
+    """
+    Renders and sends a panel. With delta, when the panel's signature shows it would look
+    the same as the last frame that made it to this port, neither is done. Safe to call
+    for several ports at once. cancel and progress are send_image's. Returns the number
+    of chunks sent.
+    """
+    stats = frame_stats.recorder
+    if sensor_source is not None:
+        with stats.time("sensor_read"):
+            real_sensor_data = sensor_source.read()
+        sensor_history.record(real_sensor_data)
+
+    with stats.time("render"):
+        panel = get_compiled_panel(aoostar_screen_id, aoostar_data_path)
+        signature = (aoostar_screen_id, panel.signature(real_sensor_data))
+        last_signature, last_tag = _last_panel_signatures.get(ser, (None, None))
+        if delta and signature == last_signature and _last_frames.get(ser, (None, None))[1] == last_tag:
+            print("Panel unchanged, nothing to render or send.")
+            stats.count("frames_skipped")
+            if progress is not None:
+                progress(SendProgress("done", 0, 0))
+            return 0
+        with panel.lock:
+            frame, dirty = panel.render_rgb565(real_sensor_data)
+            # The panel may be rendered for another screen while this one is sent
+            frame = bytes(frame)
+
+    sent = send_image(ser,frame,delta,window,dirty,cancel,progress)
+    _last_panel_signatures[ser] = (signature, dirty.tag)
+    return sent
+
+class PanelDaemon:
+    """
+    Keeps the screen updated with the Aoostar-X panels.
+
+    Monitor3.json is read once: panels from 'mianban' are rotated every setup.switchTime
+    seconds and redrawn every setup.refresh seconds, over a single connection to the
+    screen, through one of screen_transport.TRANSPORTS, that is reopened whenever it goes away.
+    panel_ids replaces 'mianban' when given. The screen's link settings are loaded from
+    link_profile, as probe_link saved them.
+    """
+    def __init__(self, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal", sensor_source:SensorSource=None, window=1, reconnect_delay=5.0, transport="serial", target=None, panel_ids=None, link_profile=DEFAULT_PROFILE_PATH):
+        self.aoostar_data_path = aoostar_data_path
+        self.sensor_source = sensor_source
+        self.window = window
+        self.reconnect_delay = reconnect_delay
+        self.transport = transport
+        self.target = target
+        self.link_profile = link_profile
+
+        config = load_aoostar_config(aoostar_data_path)
+        self.refresh = float(config['setup'].get('refresh', 1))
+        self.switch_time = float(config['setup'].get('switchTime', 10))
+        self.panel_ids = list(panel_ids or []) or [int(panel_id) for panel_id in config.get('mianban', [])] or [1]
+        # Compiled up front so graphs on every panel start recording history from the first poll
+        for panel_id in self.panel_ids:
+            get_compiled_panel(panel_id, aoostar_data_path)
+
+        self.ser = None
+        self.panel_index = 0
+        self.next_switch = time.monotonic() + self.switch_time
+
+        # (panel id, signature) of the last frame that made it to the screen
+        self.sent_signature = None
+        self.frames_sent = 0
+        self.frames_skipped = 0
 
+    def connect(self):
+        """Opens the screen if it isn't yet. Returns False, after waiting a bit, if it couldn't."""
+        if self.ser is not None:
+            return True
 
-def send_aoostar_panel_graphics(ser, aoostar_screen_id=1, real_sensor_data:AoostarDataModel=None, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal"):
+        try:
+            self.ser = open_screen(self.transport, self.target, self.link_profile)
+            lcd_on(self.ser)
+        except IOError as e:
+            print(f"{e} Retrying in {self.reconnect_delay}s...")
+            self.disconnect()
+            time.sleep(self.reconnect_delay)
+            return False
+        return True
 
-    with open(aoostar_data_path + "/Monitor3.json", 'r', encoding='utf-8') as file:
-            data = json.load(file)
+    def disconnect(self):
+        if self.ser is not None:
+            self.ser.close()
+            self.ser = None
+
+    def current_panel(self):
+        """Id of the panel to show, moving on to the next one every switch_time seconds"""
+        now = time.monotonic()
+        if now >= self.next_switch:
+            self.panel_index = (self.panel_index + 1) % len(self.panel_ids)
+            self.next_switch = now + self.switch_time
+        return self.panel_ids[self.panel_index]
+
+    def render_frame(self):
+        """
+        Renders the current panel, returning a packed frame of its own, its DirtyRegions,
+        its frame_stats record and its signature. Returns None, without rendering, when
+        the panel would look the same as the last frame sent.
+        """
+        stats = frame_stats.recorder
+        record = stats.start_frame()
+        panel_id = self.current_panel()
+
+        if self.sensor_source is not None:
+            with stats.time("sensor_read"):
+                data = self.sensor_source.read()
+            sensor_history.record(data)
+        else:
+            data = None
+
+        with stats.time("render"):
+            panel = get_compiled_panel(panel_id, self.aoostar_data_path)
+            signature = (panel_id, panel.signature(data))
+            if signature == self.sent_signature:
+                self.frames_skipped += 1
+                stats.count("frames_skipped")
+                stats.end_frame(record)
+                return None
+            frame, dirty = panel.render_rgb565(data)
+            # The panel keeps drawing into its frame, the copy is what gets sent
+            frame = bytes(frame)
+        return frame, dirty, record, signature
+
+    def send_frame(self, rendered, release=None):
+        """
+        Sends what render_frame returned, then ends its frame_stats record, or calls
+        release(record) instead when the record is shared with other screens.
+        """
+        frame, dirty, record, signature = rendered
+        stats = frame_stats.recorder
+        stats.resume_frame(record)
+        # Until this frame makes it, what the screen shows is unknown
+        self.sent_signature = None
+        try:
+            if self.connect():
+                send_image(self.ser, frame, True, self.window, dirty)
+                self.sent_signature = signature
+                self.frames_sent += 1
+        except (serial.SerialException, ConnectionError) as e:
+            print(f"Lost connection to the screen: {e}")
+            self.disconnect()
+            time.sleep(self.reconnect_delay)
+        except IOError as e:
+            # The next frame is sent in full, which resyncs the screen
+            print(f"Frame failed: {e}")
+        finally:
+            if release is not None:
+                release(record)
+            else:
+                stats.end_frame(record)
+
+    def drop_frame(self, rendered):
+        """Ends the frame_stats record of what render_frame returned, when it won't be sent."""
+        frame_stats.recorder.end_frame(rendered[2])
+
+    def print_summary(self):
+        frames = self.frames_sent + self.frames_skipped
+        print(f"{self.frames_sent} frames sent, {self.frames_skipped} skipped as unchanged"
+              f" ({self.frames_skipped / frames if frames else 0:.0%}).")
+
+    def run(self):
+        """Renders and sends one frame after the other until interrupted."""
+        try:
+            while True:
+                frame_start = time.monotonic()
+                rendered = self.render_frame()
+                if rendered is not None:
+                    self.send_frame(rendered)
+                time.sleep(max(0.0, self.refresh - (time.monotonic() - frame_start)))
+        except KeyboardInterrupt:
+            print("Stopping...")
+        finally:
+            self.disconnect()
+        self.print_summary()
+
+    def run_pipelined(self):
+        """Renders the next frame while the current one is being sent, until interrupted."""
+        try:
+            FramePipeline(self.render_frame, self.send_frame, self.refresh, self.drop_frame).run()
+        finally:
+            self.disconnect()
+        self.print_summary()
+
+class MultiScreenDaemon:
+    """
+    Keeps several screens updated at once, each one a PanelDaemon with its own connection
+    and panel rotation, sent to by a thread of its own through a LatestFrameSlot: a slow,
+    NACKing or unplugged screen drops its own stale frames without holding the others back.
+
+    Sensors are read once per refresh, and a panel showing on several screens is rendered
+    once for all of them. screens is a list of (target, panel ids or None).
+    """
+    def __init__(self, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal", sensor_source:SensorSource=None, screens=(), window=1, transport="serial", link_profile=DEFAULT_PROFILE_PATH):
+        self.aoostar_data_path = aoostar_data_path
+        self.sensor_source = sensor_source
+        self.screens = [PanelDaemon(aoostar_data_path, None, window, transport=transport, target=target, panel_ids=panel_ids,
+                                   link_profile=link_profile)
+                        for target, panel_ids in screens]
+        self.slots = [LatestFrameSlot() for _ in self.screens]
+        self.refresh = min(screen.refresh for screen in self.screens)
+
+        self._stop = threading.Event()
+        # frame_stats record: screens yet to send or drop it, plus one while it is rendered
+        self._record_users = {}
+        self._records_lock = threading.Lock()
+
+    def _hold_record(self, record):
+        with self._records_lock:
+            self._record_users[record] = self._record_users.get(record, 0) + 1
+
+    def _release_record(self, record):
+        """Ends record once the last screen it was rendered for is done with it."""
+        with self._records_lock:
+            self._record_users[record] -= 1
+            if self._record_users[record]:
+                return
+            del self._record_users[record]
+        frame_stats.recorder.end_frame(record)
+
+    def render_frames(self):
+        """
+        Renders what every screen should show now, and hands it to the screens it changed
+        for. Their sends are timed in the same frame_stats record as the render.
+        """
+        stats = frame_stats.recorder
+        record = stats.start_frame()
+        self._hold_record(record)
+
+        if self.sensor_source is not None:
+            with stats.time("sensor_read"):
+                data = self.sensor_source.read()
+            sensor_history.record(data)
+        else:
+            data = None
 
-    #for panel in data['mianban']: #mianban == panel
+        # panel id: [signature, (frame, dirty) once rendered]
+        rendered = {}
+        for screen, slot in zip(self.screens, self.slots):
+            panel_id = screen.current_panel()
+            panel = get_compiled_panel(panel_id, self.aoostar_data_path)
+            with stats.time("render"):
+                if panel_id not in rendered:
+                    rendered[panel_id] = [(panel_id, panel.signature(data)), None]
+                signature, frame_and_dirty = rendered[panel_id]
+                if signature == screen.sent_signature:
+                    screen.frames_skipped += 1
+                    continue
+                if frame_and_dirty is None:
+                    frame, dirty = panel.render_rgb565(data)
+                    # The panel keeps drawing into its frame, the copy is what gets sent
+                    frame_and_dirty = rendered[panel_id][1] = (bytes(frame), dirty)
+            self._hold_record(record)
+            replaced = slot.put(frame_and_dirty + (record, signature))
+            if replaced is not None:
+                # Dropped before its screen got to it
+                self._release_record(replaced[2])
 
+        self._release_record(record)
+
+    def _send_loop(self, screen, slot):
+        while not self._stop.is_set():
+            rendered = slot.get()
+            if rendered is None:
+                continue
+            screen.send_frame(rendered, self._release_record)
+
+    def run(self):
+        """Renders and sends frames until interrupted."""
+        threads = [threading.Thread(target=self._send_loop, args=(screen, slot), name=f"aoostar-send-{n}", daemon=True)
+                   for n, (screen, slot) in enumerate(zip(self.screens, self.slots))]
+        for thread in threads:
+            thread.start()
+        try:
+            next_frame = time.monotonic()
+            while True:
+                self.render_frames()
+                next_frame = max(next_frame + self.refresh, time.monotonic())
+                time.sleep(max(0.0, next_frame - time.monotonic()))
+        except KeyboardInterrupt:
+            print("Stopping...")
+        finally:
+            self._stop.set()
+            for slot in self.slots:
+                slot.close()
+            for thread in threads:
+                thread.join()
+            for screen in self.screens:
+                screen.disconnect()
+
+        for screen in self.screens:
+            print(f"{screen.target or 'Screen'}: ", end="")
+            screen.print_summary()
+
+def run_panel_daemon(aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal", sensor_source:SensorSource=None, window=1, pipeline=False, transport="serial", target=None, screens=None, link_profile=DEFAULT_PROFILE_PATH):
+    """Keeps the screen at target updated, or every one of screens, a list of (target, panel ids or None)."""
+    if screens and (len(screens) > 1 or screens[0][1]):
+        MultiScreenDaemon(aoostar_data_path, sensor_source, screens, window, transport, link_profile).run()
+        return
+    if screens:
+        target = screens[0][0]
+
+    daemon = PanelDaemon(aoostar_data_path, sensor_source, window, transport=transport, target=target, link_profile=link_profile)
+    if pipeline:
+        daemon.run_pipelined()
+    else:
+        daemon.run()
+
+def serve_screen(ser, socket_path=DEFAULT_SOCKET_PATH, window=1):
+    """
+    Shares the screen with other processes: frames and power commands they submit with
+    --transport ipc are sent by a ScreenScheduler, with only what changed on screen going
+    out. Runs until interrupted.
+    """
+    scheduler = ScreenScheduler(lambda frame, cancel: send_image(ser, frame, True, window, cancel=cancel),
+                                {"on": lambda: lcd_on(ser), "off": lambda: lcd_off(ser)})
+    scheduler.start()
     try:
-        image = Image.open(aoostar_data_path + "/sys_img/" + data['diy'][aoostar_screen_id - 1]['img']).convert('RGBA')
-    except FileNotFoundError:
-        print(f"Error loading {aoostar_data_path + '/sys_img/' + data['diy'][aoostar_screen_id - 1]['img']}")
-        #exit(1)
-        image = Image.new("RGBA", (960, 376), color = 'black')
+        serve_ipc(scheduler, socket_path)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        scheduler.stop()
+    print(f"{scheduler.sent} jobs sent, {scheduler.collapsed} superseded, {scheduler.preempted} preempted.")
 
-    draw = ImageDraw.Draw(image)
+def _cli_screens(args):
+    """(target, panel ids or None) of the screens picked with --device, None if there was none"""
+    devices = getattr(args, 'devices', None)
+    if not devices:
+        return None
 
-    for sensor in data['diy'][aoostar_screen_id - 1]['sensor']:
+    screens = []
+    connected = find_screens() if args.transport == "serial" else []
+    for device in devices:
+        selector, separator, panels = device.rpartition('=')
+        if not separator or not panels.replace(',', '').isdigit():
+            selector, panels = device, ""
+        panel_ids = [int(panel_id) for panel_id in panels.split(',')] if panels else None
 
-        if real_sensor_data:
-            sensor['value'] = real_sensor_data.get(sensor['label'])
-            #print(f"{sensor['label']}:{sensor['value']}")
+        if args.transport == "serial":
+            # By id, so a screen is found again after being plugged back in at another port
+            targets = [screen.id for screen in select_screens(connected, [selector])]
+        else:
+            targets = [selector]
+        screens += [(target, panel_ids) for target in targets if target not in [screen[0] for screen in screens]]
+    return screens
 
-        #if isinstance(sensor['value'], float):
-        if sensor['decimalDigits'] == 0:
-            sensor['value'] = round(float(sensor['value']))
-        elif sensor['decimalDigits'] > 0:
-            sensor['value'] = round(float(sensor['value']),int(sensor['decimalDigits']))
-        value = str(sensor['value']) + str(sensor['unit'])
-        position = (sensor['x'], sensor['y']) 
+def print_screens(screens):
+    if not screens:
+        print(f"No screen with VID 0x{TARGET_VID:04X} and PID 0x{TARGET_PID:04X} found.")
+        return
+    print(f"{'ID':<24} | {'PORT':<16} | {'SERIAL NUMBER':<20} | LOCATION")
+    for screen in screens:
+        print(f"{screen.id:<24} | {screen.port:<16} | {screen.serial_number or '-':<20} | {screen.location or '-'}")
 
-        if sensor['mode'] == 1:
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {number}")
+    return number
 
-            try:
-                font = ImageFont.truetype(aoostar_data_path + "/fonts/" + sensor['fontFamily'] + ".ttf", sensor['fontSize'])
-            except IOError:
-                print(f"Error loading {aoostar_data_path + '/fonts/' + sensor['fontFamily'] + '.ttf'}")
-                #exit(1)
-                font = None # Use default font if not available
+def _chunk_sizes(value):
+    chunk_sizes = [int(size) for size in value.split(',')]
+    invalid = [chunk_size for chunk_size in chunk_sizes if not valid_chunk_size(chunk_size)]
+    if invalid:
+        raise argparse.ArgumentTypeError(f"chunk sizes have to divide the {TOTAL_BYTES} byte frame, not {', '.join(map(str, invalid))}")
+    return chunk_sizes
 
-            color = "white"
+def _cli_probe(args, ser):
+    """Probes ser's link, asking whether the test card looks right when it can't be checked, and saves the result."""
+    if hasattr(ser, 'write_frame'):
+        print(f"Nothing to negotiate with --transport {args.transport}.")
+        return
+    chunk_sizes = args.chunk_sizes or PROBE_CHUNK_SIZES
+    baudrates = [int(rate) for rate in args.baudrates.split(',')] if args.baudrates else PROBE_BAUDRATES
+    # The emulator's framebuffer can be compared, a real screen has to be looked at
+    screen = getattr(ser, 'screen', None)
+    verify = (lambda frame: bytes(screen.frame) == bytes(frame)) if screen is not None else None
 
-            anchor = "lm"
-            if sensor['textAlign'] == "center": 
-                anchor = "mm"
-            elif sensor['textAlign'] == "right": 
-                anchor = "rm"
+    best, results = probe_link(ser, chunk_sizes, baudrates, args.window, args.frames, verify)
+    print_probe_results(results)
+    if verify is None and not args.yes:
+        best = DEFAULT_LINK
+        for speed, settings in sorted(((speed, settings) for settings, speed in results if speed is not None), reverse=True):
+            set_link_settings(ser, settings)
+            send_image(ser, _probe_card(settings, 0), window=args.window)
+            if input(f"Does the screen show the test card for chunk size {settings.chunk_size} at {settings.baudrate} baud "
+                     f"intact, with a straight grid? [y/N] ").strip().lower() == 'y':
+                best = settings
+                break
+        set_link_settings(ser, best)
+    print(f"Using chunk size {best.chunk_size} at {best.baudrate} baud.")
 
-            draw.text(position, value, fill=color, anchor=anchor, font=font)
+    key = link_key(ser)
+    if args.link_profile and key is not None:
+        save_link_profile(key, best, args.link_profile)
+        print(f"Saved for {key} in {args.link_profile}.")
 
-        elif sensor['mode'] == 3:
-            try:
-                overlay = Image.open(aoostar_data_path + "/sys_img/" + sensor['pic']).convert('RGBA')
-            except FileNotFoundError:
-                print(f"Error loading {aoostar_data_path + '/sys_img/' + sensor['pic']}")
-                #exit(1)
-                overlay = Image.new("RGBA", (10, 10), color = 'black')
-
-            width, height = overlay.size
-            overlay = overlay.crop((
-                0,
-                0,
-                int( width * float(sensor['value']) / float(sensor['maxValue']) ),
-                height
-                ))
-            image.paste(overlay, position, mask=overlay)
-
-    send_image(ser,image)
-    #image.save(f"mianban{aoostar_screen_id}.png")
+def _open_cli_sensor_source(args):
+    # Subcommand options aren't suppressed, they default to None
+    sensors = getattr(args, 'sensors', None)
+    if getattr(args, 'hwinfo_rules', None):
+        if sensors == "hwinfo":
+            return open_sensor_source(sensors, rules=load_mapping_rules(args.hwinfo_rules))
+        print(f"Warning: --hwinfo-rules only applies to --sensors hwinfo, ignored with {f'--sensors {sensors}' if sensors else 'fictional data'}.")
+    if not sensors:
+        return None
+    return open_sensor_source(sensors)
 
 if __name__ == '__main__':
 
@@ -259,15 +1020,59 @@ if __name__ == '__main__':
                         help="Powers screen off")
     #group.set_defaults(on=True)
 
+    parser.add_argument("--window", type=_positive_int, default=1,
+                        help="Chunks kept waiting for their ACKs at once, at least 1 (default: 1)")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="serial",
+                        help="Where frames go: the USB serial screen (default), a memory mapped "
+                             "RGB565 framebuffer file, a relay over TCP, the screen shared by 'serve', or nowhere")
+    parser.add_argument("--target",
+                        help="Serial port, framebuffer file, relay host:port or 'serve' socket for --transport")
+    parser.add_argument("--priority", choices=("alert", "frame"),
+                        help="Priority of frames sent with --transport ipc: alerts go first, and stop "
+                             "a frame being sent (default: frame)")
+    parser.add_argument("--device", action="append", dest="devices", metavar="DEVICE[=PANELS]",
+                        help="Screen to drive, by id, serial number, USB location or port as listed by 'devices', "
+                             "or 'all'. Can be repeated. With other transports, the target of one more screen. "
+                             "For run, =PANELS sets the comma separated panels that screen rotates through")
+    parser.add_argument("--link-profile", dest="link_profile", default=DEFAULT_PROFILE_PATH,
+                        help=f"Chunk size and baud rate of each screen, as found by 'probe', '' to use the defaults "
+                             f"(default: {DEFAULT_PROFILE_PATH})")
+    parser.add_argument("--frame-cache-dir", dest="frame_cache_dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Where encoded image files are cached (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--frame-cache-mb", dest="frame_cache_mb", type=float, default=DEFAULT_MAX_BYTES / 1024 / 1024,
+                        help=f"Size of the image cache, least recently used images going first, in MiB (default: {DEFAULT_MAX_BYTES // 1024 // 1024})")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print how long each stage of every frame took, with rolling p50/p95/p99")
+    parser.add_argument("--stats-json", dest="stats_json", metavar="PATH",
+                        help="Append the stats of every frame to PATH, as JSON lines")
+
     subparsers = parser.add_subparsers(help='subcommands', dest='subcommand')
     parser_image = subparsers.add_parser("image", aliases=['i'], help="Sends image to be displayed")
     parser_image.add_argument("path", default="",
                         help="Image path")
+    parser_image.add_argument("--no-cache", action="store_true", dest="no_cache",
+                              help="Convert the image even if it is cached, and don't cache it")
+
+    parser_cache = subparsers.add_parser("cache-warm", help="Caches the encoded frames of a directory of images")
+    parser_cache.add_argument("directory",
+                              default="C:/Program Files (x86)/AOOSTAR-X/_internal/sys_img",
+                              nargs="?",
+                              help="Directory of images, such as Aoostar-X's _internal/sys_img")
 
     parser_text = subparsers.add_parser("text", aliases=['t'], help="Sends text to be displayed")
     parser_text.add_argument("content", default="",
                         help="Text to be displayed")
 
+    parser_animate = subparsers.add_parser("animate", aliases=['a'], help="Plays an animation on screen")
+    parser_animate.add_argument("path",
+                                help="Animated GIF, APNG or WebP, or directory of frames")
+    parser_animate.add_argument("--fps", type=float,
+                                help="Frame rate, instead of the file's own frame durations")
+    parser_animate.add_argument("--loops", type=int, default=0,
+                                help="Times to play the animation, 0 to loop until interrupted (default: 0)")
+    parser_animate.add_argument("--cache-mb", dest="cache_mb", type=float, default=64,
+                                help="Memory for encoded frames kept between loops, in MiB (default: 64)")
+
     parser_panel = subparsers.add_parser("panel", aliases=['p'], help="Sends Aoostar-X Panel to be displayed")
     parser_panel.add_argument("panel_id",
                               default="1",
@@ -278,24 +1083,163 @@ if __name__ == '__main__':
                               nargs="?",
                               help="Aoostar-X _internal path")
 
-    parser_panel.add_argument("--hwinfo", action="store_true",
-                              help="Get data from HWiNFO")
+    parser_panel.add_argument("--hwinfo", action="store_const", const="hwinfo", dest="sensors",
+                              help="Get data from HWiNFO, same as --sensors hwinfo")
+    parser_panel.add_argument("--sensors", choices=SENSOR_SOURCES,
+                              help="Where to get data from, fictional data if not set")
+    parser_panel.add_argument("--hwinfo-rules", dest="hwinfo_rules",
+                              help="JSON file with the rules mapping HWiNFO readings to panel values")
+
+    parser_run = subparsers.add_parser("run", aliases=['daemon'], help="Keeps Aoostar-X Panels updated on screen")
+    parser_run.add_argument("aoostar_internal_data_path",
+                            default="C:/Program Files (x86)/AOOSTAR-X/_internal",
+                            nargs="?",
+                            help="Aoostar-X _internal path")
+
+    parser_run.add_argument("--hwinfo", action="store_const", const="hwinfo", dest="sensors",
+                            help="Get data from HWiNFO, same as --sensors hwinfo")
+    parser_run.add_argument("--sensors", choices=SENSOR_SOURCES,
+                            help="Where to get data from, fictional data if not set")
+    parser_run.add_argument("--hwinfo-rules", dest="hwinfo_rules",
+                            help="JSON file with the rules mapping HWiNFO readings to panel values")
+
+    parser_run.add_argument("--pipeline", action="store_true",
+                            help="Render the next frame while the current one is being sent")
+
+    parser_export = subparsers.add_parser("export", aliases=['e'], help="Renders Aoostar-X Panels to PNG and RGB565 files")
+    parser_export.add_argument("aoostar_internal_data_path",
+                               default="C:/Program Files (x86)/AOOSTAR-X/_internal",
+                               nargs="?",
+                               help="Aoostar-X _internal path")
+    parser_export.add_argument("--panels",
+                               help="Comma separated ids of the panels to render (default: all of them)")
+    parser_export.add_argument("--output", default="export",
+                               help="Directory to write panel_<id>.png and panel_<id>.rgb565 to (default: export)")
+    parser_export.add_argument("--format", choices=EXPORT_FORMATS, action="append", dest="formats",
+                               help="Only write this format, can be repeated (default: all)")
+    parser_export.add_argument("--fixture",
+                               help="JSON file with the sensor data to show, as written by hwinfo_data.py")
+    parser_export.add_argument("--hwinfo", action="store_const", const="hwinfo", dest="sensors",
+                               help="Get data from HWiNFO, same as --sensors hwinfo")
+    parser_export.add_argument("--sensors", choices=SENSOR_SOURCES,
+                               help="Where to get data from, Monitor3.json's placeholders if neither this nor --fixture is set")
+    parser_export.add_argument("--hwinfo-rules", dest="hwinfo_rules",
+                               help="JSON file with the rules mapping HWiNFO readings to panel values")
+    parser_export.add_argument("--processes", type=int,
+                               help="Worker processes (default: one per panel, up to the number of cores)")
+
+    parser_devices = subparsers.add_parser("devices", help="Lists the connected screens")
+
+    parser_relay = subparsers.add_parser("relay", help="Lets remote hosts drive the screen with --transport tcp")
+    parser_relay.add_argument("--listen", default="localhost:9624",
+                              help="Address to listen on, [host]:port (default: localhost:9624, 0.0.0.0:9624 for every interface)")
+
+    parser_serve = subparsers.add_parser("serve", help="Shares the screen with other processes, through --transport ipc")
+    parser_serve.add_argument("--socket", default=DEFAULT_SOCKET_PATH,
+                              help=f"Unix socket to accept frames on (default: {DEFAULT_SOCKET_PATH})")
+
+    parser_probe = subparsers.add_parser("probe", help="Finds the fastest chunk size and baud rate the screen handles")
+    parser_probe.add_argument("--chunk-sizes", dest="chunk_sizes", type=_chunk_sizes,
+                              help=f"Comma separated chunk sizes to try, up to 255 and dividing the frame's {TOTAL_BYTES} bytes "
+                                   f"(default: {','.join(map(str, PROBE_CHUNK_SIZES))})")
+    parser_probe.add_argument("--baudrates",
+                              help=f"Comma separated baud rates to try (default: {','.join(map(str, PROBE_BAUDRATES))})")
+    parser_probe.add_argument("--frames", type=int, default=PROBE_FRAMES,
+                              help=f"Test frames each setting must get through without a NACK (default: {PROBE_FRAMES})")
+    parser_probe.add_argument("--yes", action="store_true",
+                              help="Trust the ACKs, without asking whether the test card looks right")
 
     args = parser.parse_args()
 
-    found_port = find_serial_port()
+    if hasattr(args, 'stats') or hasattr(args, 'stats_json'):
+        frame_stats.enable(hasattr(args, 'stats'), getattr(args, 'stats_json', None))
 
-    if found_port:
-        print(f"Device found at port: {found_port}")
-    else:
-        print(f"Device with VID 0x{target_vid:04X} and PID 0x{target_pid:04X} not found.")
-
-    ser = serial.Serial(found_port,
-                        baudrate=1500000,
-                        parity=serial.PARITY_NONE,
-                        stopbits=serial.STOPBITS_ONE,
-                        bytesize=serial.EIGHTBITS,
-                        timeout=2.0)
+    if getattr(args, 'subcommand', None) == 'devices':
+        print_screens(find_screens())
+        exit(0)
+
+    try:
+        screens = _cli_screens(args)
+    except IOError as e:
+        print(e)
+        exit(1)
+    targets = [target for target, panel_ids in screens] if screens else [getattr(args, 'target', None)]
+
+    if getattr(args, 'subcommand', None) in ('run', 'daemon'):
+        sensor_source = _open_cli_sensor_source(args)
+        run_panel_daemon(args.aoostar_internal_data_path, sensor_source, args.window, bool(getattr(args, 'pipeline', False)),
+                         args.transport, getattr(args, 'target', None), screens, args.link_profile)
+        frame_stats.recorder.close()
+        exit(0)
+
+    if getattr(args, 'subcommand', None) in ('export', 'e'):
+        sensor_data = None
+        if args.fixture:
+            with open(args.fixture, 'r', encoding='utf-8') as file:
+                sensor_data = AoostarDataModel.from_dict(json.load(file))
+        elif args.sensors:
+            with _open_cli_sensor_source(args) as sensor_source:
+                sensor_data = sensor_source.read()
+
+        panel_ids = [int(panel_id) for panel_id in args.panels.split(',')] if args.panels else None
+        start = time.perf_counter()
+        results = export_panels(panel_ids, args.aoostar_internal_data_path, args.output, sensor_data,
+                                args.formats or EXPORT_FORMATS, args.processes)
+        print_export_summary(results, time.perf_counter() - start)
+        exit(0)
+
+    frame_cache = FrameCache(args.frame_cache_dir, int(args.frame_cache_mb * 1024 * 1024))
+
+    if getattr(args, 'subcommand', None) == 'cache-warm':
+        start = time.perf_counter()
+        try:
+            encoded, cached, failed = frame_cache.warm(args.directory, _encode_image_file, IMAGE_FILE_SETTINGS)
+        except OSError as e:
+            print(e)
+            exit(1)
+        print(f"{encoded} images encoded, {cached} already cached, {failed} failed in {time.perf_counter() - start:.2f}s.")
+        exit(0)
+
+    if getattr(args, 'subcommand', None) == 'relay':
+        try:
+            relay(lambda: open_transport(args.transport, targets[0]), parse_address(args.listen))
+        except KeyboardInterrupt:
+            print("Stopping...")
+        exit(0)
+
+    sers = []
+    for target in targets:
+        try:
+            sers.append(open_screen(args.transport, target, args.link_profile))
+        except IOError as e:
+            print(e)
+            for ser in sers:
+                ser.close()
+            exit(1)
+
+    if hasattr(args, 'priority'):
+        for ser in sers:
+            if isinstance(ser, IpcTransport):
+                ser.priority = PRIORITIES[args.priority]
+
+    if getattr(args, 'subcommand', None) == 'probe':
+        for ser in sers:
+            try:
+                _cli_probe(args, ser)
+            except IOError as e:
+                print(e)
+            except KeyboardInterrupt:
+                print("Stopping...")
+            ser.close()
+        exit(0)
+
+    if getattr(args, 'subcommand', None) == 'serve':
+        try:
+            serve_screen(sers[0], args.socket, args.window)
+        except IOError as e:
+            print(e)
+        sers[0].close()
+        exit(0)
     
     #lcd_on(ser)
     #send_image(ser, "test_image.png")
@@ -303,21 +1247,34 @@ if __name__ == '__main__':
     # lcd_off(ser)
 
     if hasattr(args, 'on'):
-        if args.on:
-            lcd_on(ser)
-        else:
-            lcd_off(ser)
-
-    match args.subcommand:
-        case 'image':
-            send_image_file(ser, args.path)
-        case 'text':
-            send_text(ser, args.content)
-        case 'panel':
-            if hasattr(args, 'hwinfo'):
-                data = convertHWiNFODataToAoostarCompatible(getHWiNFOData())
+        for ser in sers:
+            if args.on:
+                lcd_on(ser)
             else:
-                data = None
-            send_aoostar_panel_graphics(ser, int(args.panel_id), data, args.aoostar_internal_data_path)
+                lcd_off(ser)
+
+    frame_stats.recorder.start_frame()
+    match getattr(args, 'subcommand', None):
+        case 'image' | 'i':
+            for ser in sers:
+                send_image_file(ser, args.path, args.window, None if args.no_cache else frame_cache)
+        case 'text' | 't':
+            for ser in sers:
+                send_text(ser, args.content, args.window)
+        case 'animate' | 'a':
+            play_animation(sers, args.path, args.fps, args.loops, args.window, args.cache_mb)
+        case 'panel' | 'p':
+            sensor_source = _open_cli_sensor_source(args)
+            sensor_data = None
+            if sensor_source is not None:
+                # Read once, for every screen to show the same values
+                with frame_stats.recorder.time("sensor_read"):
+                    sensor_data = sensor_source.read()
+                sensor_history.record(sensor_data)
+            for ser in sers:
+                send_aoostar_panel_graphics(ser, int(args.panel_id), sensor_data, args.aoostar_internal_data_path, window=args.window)
+    frame_stats.recorder.end_frame()
+    frame_stats.recorder.close()
 
-    ser.close()
+    for ser in sers:
+        ser.close()
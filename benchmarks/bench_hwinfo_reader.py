@@ -0,0 +1,115 @@
+"""
+HWiNFO shared memory read time, decoding everything on every poll versus HWiNFOBufferReader.
+
+Runs on any platform against a snapshot dumped with HWiNFOReader.save_snapshot, or
+against a synthetic one when no path is given.
+
+    python benchmarks/bench_hwinfo_reader.py [snapshot_path] [--polls N]
+"""
+import os
+import sys
+import time
+import ctypes
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from hwinfo_sharedmem import (HWiNFO_SENSORS_SHARED_MEM2, HWiNFO_SENSORS_SENSOR_ELEMENT, HWiNFO_SENSORS_READING_ELEMENT,
+                              HWiNFOBufferReader, READING_TYPE_NAMES)
+
+def build_synthetic_snapshot(num_sensors=40, num_readings=600):
+    """Builds a buffer laid out like HWiNFO's shared memory."""
+    header_size = ctypes.sizeof(HWiNFO_SENSORS_SHARED_MEM2)
+    sensor_size = ctypes.sizeof(HWiNFO_SENSORS_SENSOR_ELEMENT)
+    reading_size = ctypes.sizeof(HWiNFO_SENSORS_READING_ELEMENT)
+    reading_offset = header_size + num_sensors * sensor_size
+
+    buffer = bytearray(reading_offset + num_readings * reading_size)
+
+    header = HWiNFO_SENSORS_SHARED_MEM2.from_buffer(buffer)
+    header.dwSignature = 0x53695748
+    header.dwVersion = 2
+    header.poll_time = 1
+    header.dwOffsetOfSensorSection = header_size
+    header.dwSizeOfSensorElement = sensor_size
+    header.dwNumSensorElements = num_sensors
+    header.dwOffsetOfReadingSection = reading_offset
+    header.dwSizeOfReadingElement = reading_size
+    header.dwNumReadingElements = num_readings
+    del header
+
+    for i in range(num_sensors):
+        sensor = HWiNFO_SENSORS_SENSOR_ELEMENT.from_buffer(buffer, header_size + i * sensor_size)
+        sensor.dwSensorID = i
+        sensor.szSensorNameOrig = sensor.szSensorNameUser = f"Sensor {i}".encode()
+        del sensor
+
+    for i in range(num_readings):
+        reading = HWiNFO_SENSORS_READING_ELEMENT.from_buffer(buffer, reading_offset + i * reading_size)
+        reading.tReading = i % len(READING_TYPE_NAMES)
+        reading.dwSensorIndex = i % num_sensors
+        reading.szLabelOrig = reading.szLabelUser = f"Reading {i}".encode()
+        reading.szUnit = b"%"
+        reading.Value = i * 0.5
+        del reading
+
+    return buffer
+
+def read_everything(buffer):
+    """Decodes the whole buffer as every poll used to."""
+    header = HWiNFO_SENSORS_SHARED_MEM2.from_buffer_copy(buffer)
+    sensors = {}
+    for i in range(header.dwNumSensorElements):
+        sensor = HWiNFO_SENSORS_SENSOR_ELEMENT.from_buffer_copy(buffer, header.dwOffsetOfSensorSection + i * header.dwSizeOfSensorElement)
+        sensors[i] = {"id": sensor.dwSensorID, "inst": sensor.dwSensorInst,
+                      "name_orig": sensor.get_name_orig(), "name": sensor.get_name()}
+    readings = []
+    for i in range(header.dwNumReadingElements):
+        reading = HWiNFO_SENSORS_READING_ELEMENT.from_buffer_copy(buffer, header.dwOffsetOfReadingSection + i * header.dwSizeOfReadingElement)
+        readings.append({
+            "sensor_index": reading.dwSensorIndex,
+            "sensor_name": sensors.get(reading.dwSensorIndex, {}).get("name", "Unknown Sensor"),
+            "label_orig": reading.get_label_orig(),
+            "label": reading.get_label(),
+            "type": READING_TYPE_NAMES.get(reading.tReading, "Unknown"),
+            "value": reading.Value,
+            "unit": reading.get_unit(),
+            "value_min": reading.ValueMin,
+            "value_max": reading.ValueMax,
+            "value_avg": reading.ValueAvg
+        })
+    return readings
+
+def time_polls(poll, polls):
+    start = time.perf_counter()
+    for _ in range(polls):
+        poll()
+    return (time.perf_counter() - start) / polls
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HWiNFO shared memory reader benchmark")
+    parser.add_argument("snapshot_path", nargs="?", help="Snapshot dumped with HWiNFOReader.save_snapshot")
+    parser.add_argument("--polls", type=int, default=200, help="Polls timed per case (default: 200)")
+    args = parser.parse_args()
+
+    if args.snapshot_path:
+        reader = HWiNFOBufferReader.from_file(args.snapshot_path)
+    else:
+        reader = HWiNFOBufferReader(build_synthetic_snapshot())
+    buffer = reader.buffer
+    header = HWiNFO_SENSORS_SHARED_MEM2.from_buffer_copy(buffer)
+    print(f"{header.dwNumSensorElements} sensors, {header.dwNumReadingElements} readings")
+
+    full = time_polls(lambda: read_everything(buffer), args.polls)
+
+    reader.read_data()
+    def new_poll():
+        # Forces the values to be read again, as after every HWiNFO update
+        reader._poll_time = None
+        reader.read_data()
+    changed = time_polls(new_poll, args.polls)
+    unchanged = time_polls(reader.read_data, args.polls)
+
+    print(f"{'decode everything':<28} | {full * 1000:8.3f} ms")
+    print(f"{'incremental, new poll_time':<28} | {changed * 1000:8.3f} ms")
+    print(f"{'incremental, same poll_time':<28} | {unchanged * 1000:8.3f} ms")
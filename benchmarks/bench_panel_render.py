@@ -0,0 +1,91 @@
+"""
+Per-frame render time of every panel in Monitor3.json, before and after panel compilation.
+
+"before" is the uncompiled path: Monitor3.json, the background and every font and
+overlay are loaded again for each frame. "after" renders a CompiledPanel that is reused.
+
+    python benchmarks/bench_panel_render.py [aoostar_internal_data_path] [--frames N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import aoostar_panel
+
+def render_uncompiled(aoostar_screen_id, aoostar_data_path):
+    with open(aoostar_data_path + "/Monitor3.json", 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    try:
+        image = Image.open(aoostar_data_path + "/sys_img/" + data['diy'][aoostar_screen_id - 1]['img']).convert('RGBA')
+    except FileNotFoundError:
+        image = Image.new("RGBA", (960, 376), color = 'black')
+
+    draw = ImageDraw.Draw(image)
+
+    for sensor in data['diy'][aoostar_screen_id - 1]['sensor']:
+        if sensor['decimalDigits'] == 0:
+            sensor['value'] = round(float(sensor['value']))
+        elif sensor['decimalDigits'] > 0:
+            sensor['value'] = round(float(sensor['value']),int(sensor['decimalDigits']))
+        value = str(sensor['value']) + str(sensor['unit'])
+        position = (sensor['x'], sensor['y'])
+
+        if sensor['mode'] == 1:
+            try:
+                font = ImageFont.truetype(aoostar_data_path + "/fonts/" + sensor['fontFamily'] + ".ttf", sensor['fontSize'])
+            except IOError:
+                font = None
+
+            anchor = "lm"
+            if sensor['textAlign'] == "center":
+                anchor = "mm"
+            elif sensor['textAlign'] == "right":
+                anchor = "rm"
+
+            draw.text(position, value, fill="white", anchor=anchor, font=font)
+
+        elif sensor['mode'] == 3:
+            try:
+                overlay = Image.open(aoostar_data_path + "/sys_img/" + sensor['pic']).convert('RGBA')
+            except FileNotFoundError:
+                overlay = Image.new("RGBA", (10, 10), color = 'black')
+
+            width, height = overlay.size
+            overlay = overlay.crop((0, 0, int( width * float(sensor['value']) / float(sensor['maxValue']) ), height))
+            image.paste(overlay, position, mask=overlay)
+
+    return image
+
+def time_frames(render, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        render()
+    return (time.perf_counter() - start) / frames
+
+if __name__ == '__main__':
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aoostar-x-compatible-data")
+
+    parser = argparse.ArgumentParser(description="Panel render benchmark")
+    parser.add_argument("aoostar_internal_data_path", nargs="?", default=default_path,
+                        help="Aoostar-X _internal path")
+    parser.add_argument("--frames", type=int, default=20,
+                        help="Frames rendered per panel (default: 20)")
+    args = parser.parse_args()
+
+    panel_count = len(aoostar_panel.load_config(args.aoostar_internal_data_path)['diy'])
+
+    print(f"{'PANEL':<6} | {'BEFORE (ms)':>11} | {'AFTER (ms)':>10} | {'SPEEDUP':>7}")
+    print("-" * 45)
+    for panel_id in range(1, panel_count + 1):
+        before = time_frames(lambda: render_uncompiled(panel_id, args.aoostar_internal_data_path), args.frames)
+
+        panel = aoostar_panel.get_compiled_panel(panel_id, args.aoostar_internal_data_path)
+        after = time_frames(panel.render, args.frames)
+
+        print(f"{panel_id:<6} | {before * 1000:>11.2f} | {after * 1000:>10.2f} | {before / after:>6.1f}x")
@@ -0,0 +1,125 @@
+"""
+Frames per second, bytes per second and per-frame latency of the image, text and panel
+commands, for every bundled panel, sent to an emulated screen over a simulated link.
+
+    python benchmarks/bench_transmit.py [aoostar_internal_data_path] [--frames N] [--window N]
+                                        [--chunk-size N] [--baud BAUD] [--latency SECONDS]
+                                        [--save RESULTS] [--compare RESULTS] [--threshold FRACTION]
+
+--save writes the results as JSON. --compare checks them against saved ones, and exits
+with status 1 if any case got more than --threshold slower, in frames per second or
+latency.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import aoostar_panel
+import aoostar_screen
+from aoostar_emulator import open_emulated_serial
+from screen_transport import LinkSettings
+
+def run_case(send, frames, baudrate, latency, window, chunk_size=aoostar_screen.CHUNK_SIZE):
+    """Sends frames frames to a fresh emulated screen. Returns the case's results."""
+    ser = open_emulated_serial(baudrate=baudrate, latency=latency)
+    aoostar_screen.set_link_settings(ser, LinkSettings(chunk_size, ser.baudrate))
+    latencies = []
+    try:
+        # The sender's progress messages would swamp the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(frames):
+                frame_start = time.perf_counter()
+                send(ser, window)
+                latencies.append(time.perf_counter() - frame_start)
+            elapsed = time.perf_counter() - start
+
+        sent_frame = aoostar_screen._last_frames[ser][0]
+        if bytes(ser.screen.frame) != bytes(sent_frame) or ser.screen.errors:
+            raise IOError(f"Emulated screen didn't get the frame sent: {ser.screen.errors}")
+
+        return {
+            "fps": frames / elapsed,
+            "bytes_per_second": ser.screen.bytes_received / elapsed,
+            "latency_ms": sum(latencies) / len(latencies) * 1000,
+            "max_latency_ms": max(latencies) * 1000,
+        }
+    finally:
+        ser.close()
+
+def build_cases(aoostar_data_path):
+    image_path = aoostar_data_path + "/sys_img/" + aoostar_panel.load_config(aoostar_data_path)['diy'][0]['img']
+    cases = {
+        "image": lambda ser, window: aoostar_screen.send_image_file(ser, image_path, window),
+        "text": lambda ser, window: aoostar_screen.send_text(ser, "Benchmark", window),
+    }
+    panel_count = len(aoostar_panel.load_config(aoostar_data_path)['diy'])
+    for panel_id in range(1, panel_count + 1):
+        cases[f"panel {panel_id}"] = lambda ser, window, panel_id=panel_id: aoostar_screen.send_aoostar_panel_graphics(
+            ser, panel_id, None, aoostar_data_path, window=window)
+    return cases
+
+def regressions(results, baseline, threshold):
+    """Cases slower than the baseline by more than threshold, as messages"""
+    found = []
+    for case, result in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        if result["fps"] < base["fps"] * (1 - threshold):
+            found.append(f"{case}: {result['fps']:.3f} fps, was {base['fps']:.3f}")
+        if result["latency_ms"] > base["latency_ms"] * (1 + threshold):
+            found.append(f"{case}: {result['latency_ms']:.1f} ms latency, was {base['latency_ms']:.1f}")
+    return found
+
+if __name__ == '__main__':
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aoostar-x-compatible-data")
+
+    parser = argparse.ArgumentParser(description="Transmission benchmark against an emulated screen")
+    parser.add_argument("aoostar_internal_data_path", nargs="?", default=default_path,
+                        help="Aoostar-X _internal path")
+    parser.add_argument("--frames", type=int, default=2,
+                        help="Frames sent per case (default: 2)")
+    parser.add_argument("--window", type=int, default=1,
+                        help="Chunks written before waiting for their ACKs (default: 1)")
+    parser.add_argument("--chunk-size", dest="chunk_size", type=int, default=aoostar_screen.CHUNK_SIZE,
+                        help=f"Bytes of image per chunk (default: {aoostar_screen.CHUNK_SIZE})")
+    parser.add_argument("--baud", type=int, default=1500000,
+                        help="Link speed to simulate, 0 for none (default: 1500000)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Extra seconds before every reply from the screen (default: 0)")
+    parser.add_argument("--save", metavar="RESULTS",
+                        help="Write the results to this JSON file")
+    parser.add_argument("--compare", metavar="RESULTS",
+                        help="Fail if results regressed from this JSON file's")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Slowdown tolerated by --compare, as a fraction (default: 0.10)")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'CASE':<10} | {'FPS':>7} | {'KIB/S':>8} | {'LATENCY (ms)':>12} | {'MAX (ms)':>9}")
+    print("-" * 58)
+    for case, send in build_cases(args.aoostar_internal_data_path).items():
+        result = results[case] = run_case(send, args.frames, args.baud, args.latency, args.window, args.chunk_size)
+        print(f"{case:<10} | {result['fps']:>7.3f} | {result['bytes_per_second'] / 1024:>8.1f} | "
+              f"{result['latency_ms']:>12.1f} | {result['max_latency_ms']:>9.1f}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        found = regressions(results, baseline, args.threshold)
+        for message in found:
+            print(f"REGRESSION {message}")
+        if found:
+            exit(1)
+        print(f"No regression past {args.threshold:.0%}.")
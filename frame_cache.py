@@ -0,0 +1,137 @@
+import os
+import mmap
+import hashlib
+
+from screen_protocol import TOTAL_BYTES
+
+# What warm() and animation directories pick up
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+                                 or os.path.join(os.path.expanduser("~"), ".cache"), "aoostar-screen")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class FrameCache:
+    """
+    Packed frames of image files, kept on disk between runs so an image that didn't
+    change is never decoded, resized and encoded again.
+
+    Entries are keyed by the image's path, modification time and size, and by the
+    settings it was encoded with, and are read back memory mapped. Once the cache
+    holds more than max_bytes, the least recently used entries are deleted.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, image_path, settings):
+        stat = os.stat(image_path)
+        key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{settings}"
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".rgb565")
+
+    def load(self, image_path, settings=""):
+        """
+        Returns the cached frame of image_path as a read only mmap, or None if it isn't
+        cached. An entry that isn't a whole frame, left by a full disk or another tool,
+        is deleted and treated as missing.
+        """
+        entry_path = self._entry_path(image_path, settings)
+        try:
+            with open(entry_path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size != TOTAL_BYTES:
+                    raise ValueError(f"{entry_path} isn't a frame")
+                frame = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Dropping cached frame of {image_path}: {e}")
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            return None
+
+        try:
+            # Its modification time is when it was last used
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return frame
+
+    def store(self, image_path, frame, settings=""):
+        entry_path = self._entry_path(image_path, settings)
+        os.makedirs(self.directory, exist_ok=True)
+        # Written aside first, so a reader never maps half a frame
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(frame)
+        os.replace(temp_path, entry_path)
+        self.evict()
+
+    def get(self, image_path, encode, settings=""):
+        """
+        Returns the frame of image_path, from the cache or else encode(image_path), which
+        is stored for next time. Cached frames are mmaps, to close once sent.
+        """
+        frame = self.load(image_path, settings)
+        if frame is not None:
+            self.hits += 1
+            return frame
+
+        self.misses += 1
+        frame = encode(image_path)
+        try:
+            self.store(image_path, frame, settings)
+        except OSError as e:
+            print(f"Could not cache {image_path}: {e}")
+        return frame
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits in max_bytes."""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".rgb565"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                # Still mapped by another process on Windows, it goes next time
+                pass
+
+    def warm(self, directory, encode, settings=""):
+        """
+        Caches the frame of every image in directory that isn't cached yet.
+        Returns how many were encoded, already cached, and couldn't be read.
+        """
+        encoded = cached = failed = 0
+        for name in sorted(os.listdir(directory)):
+            image_path = os.path.join(directory, name)
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(image_path):
+                continue
+
+            frame = self.load(image_path, settings)
+            if frame is not None:
+                frame.close()
+                cached += 1
+                continue
+            try:
+                self.store(image_path, encode(image_path), settings)
+                encoded += 1
+            except (OSError, ValueError) as e:
+                print(f"Skipping {name}: {e}")
+                failed += 1
+        # In case max_bytes went down since they were cached
+        self.evict()
+        return encoded, cached, failed
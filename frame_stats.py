@@ -0,0 +1,187 @@
+import json
+import math
+import threading
+import time
+from collections import deque
+
+# Stages of a frame, in the order they happen
+STAGES = ("sensor_read", "convert", "render", "encode", "transmit", "ack_wait")
+COUNTERS = ("bytes_sent", "chunks_sent", "chunks_retried", "frames_skipped")
+PERCENTILES = (50, 95, 99)
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+_null_timer = _NullTimer()
+
+class NullStats:
+    """Records nothing, at next to no cost. What recorder is until stats are enabled."""
+    enabled = False
+
+    def start_frame(self):
+        return None
+
+    def resume_frame(self, frame):
+        pass
+
+    def time(self, stage):
+        return _null_timer
+
+    def count(self, counter, n=1):
+        pass
+
+    def end_frame(self, frame=None):
+        pass
+
+    def close(self):
+        pass
+
+class _FrameRecord:
+    __slots__ = ("number", "started", "stages", "counters")
+
+    def __init__(self, number):
+        self.number = number
+        self.started = time.perf_counter()
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+class _StageTimer:
+    """Times a stage, leaving out the time of any stage timed inside it."""
+    __slots__ = ("stats", "stage", "start", "nested")
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.nested = 0.0
+        self.stats._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self.start
+        stack = self.stats._stack()
+        stack.pop()
+        if stack:
+            stack[-1].nested += elapsed
+        self.stats.add(self.stage, elapsed - self.nested)
+        return False
+
+class FrameStats:
+    """
+    Wall time spent in each of STAGES per frame, plus COUNTERS.
+
+    A frame is started with start_frame() on the thread that renders it, and can move to
+    another thread with resume_frame(), as it does when rendering and sending are
+    pipelined. Stages and counters go to the current thread's frame. end_frame() prints
+    the frame, when print_frames, writes it as one JSON line to json_path, when given, and
+    prints rolling p50/p95/p99 over the last window frames every summary_interval frames.
+    """
+    enabled = True
+
+    def __init__(self, print_frames=True, json_path=None, window=100, summary_interval=10):
+        self.print_frames = print_frames
+        self.summary_interval = summary_interval
+        self.json_file = open(json_path, 'a', encoding='utf-8') if json_path else None
+
+        self.frames = 0
+        self.history = {name: deque(maxlen=window) for name in STAGES + ("total",)}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def start_frame(self):
+        with self._lock:
+            self.frames += 1
+            frame = _FrameRecord(self.frames)
+        self._local.frame = frame
+        return frame
+
+    def resume_frame(self, frame):
+        self._local.frame = frame
+
+    def time(self, stage):
+        return _StageTimer(self, stage)
+
+    def add(self, stage, seconds):
+        frame = getattr(self._local, 'frame', None)
+        if frame is not None:
+            frame.stages[stage] += seconds
+
+    def count(self, counter, n=1):
+        frame = getattr(self._local, 'frame', None)
+        if frame is not None:
+            frame.counters[counter] += n
+
+    def end_frame(self, frame=None):
+        frame = frame or getattr(self._local, 'frame', None)
+        if frame is None:
+            return
+        self._local.frame = None
+        total = time.perf_counter() - frame.started
+
+        with self._lock:
+            for stage, seconds in frame.stages.items():
+                self.history[stage].append(seconds)
+            self.history["total"].append(total)
+
+            if self.print_frames:
+                stages = " ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in frame.stages.items())
+                skipped = ", skipped as unchanged" if frame.counters['frames_skipped'] else ""
+                print(f"Frame {frame.number}: {stages}, total {total * 1000:.1f}ms, "
+                      f"{frame.counters['bytes_sent']} bytes, {frame.counters['chunks_retried']} chunks retried{skipped}")
+
+            if self.json_file:
+                record = {"frame": frame.number, "time": time.time(), "total_ms": total * 1000}
+                record.update((f"{stage}_ms", seconds * 1000) for stage, seconds in frame.stages.items())
+                record.update(frame.counters)
+                self.json_file.write(json.dumps(record) + "\n")
+                self.json_file.flush()
+
+            if self.print_frames and self.summary_interval and frame.number % self.summary_interval == 0:
+                self.print_summary()
+
+    def summary(self) -> dict:
+        """{stage: {50: ms, 95: ms, 99: ms}} over the last window frames"""
+        return {name: {p: _percentile(sorted(values), p) * 1000 for p in PERCENTILES}
+                for name, values in self.history.items() if values}
+
+    def print_summary(self):
+        frames = len(self.history["total"])
+        if not frames:
+            return
+        print(f"Last {frames} frames, p50/p95/p99:")
+        for name, percentiles in self.summary().items():
+            print(f"  {name:<12} " + " / ".join(f"{percentiles[p]:.1f}" for p in PERCENTILES) + " ms")
+
+    def close(self):
+        if self.print_frames:
+            self.print_summary()
+        if self.json_file:
+            self.json_file.close()
+            self.json_file = None
+
+def _percentile(sorted_values, p):
+    """Nearest-rank percentile"""
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+# What everything records to. Use it as frame_stats.recorder, it changes with enable().
+recorder = NullStats()
+
+def enable(print_frames=True, json_path=None, **options) -> FrameStats:
+    """Starts recording frame stats, printing them and/or writing them to json_path."""
+    global recorder
+    recorder = FrameStats(print_frames, json_path, **options)
+    return recorder
@@ -0,0 +1,118 @@
+import math
+import string
+from PIL import Image, ImageDraw, ImageFont
+
+# What sensor values and their units are written with
+GLYPH_CHARSET = string.digits + " .,:-+%/()℃°" + "BKMGTbkps"
+
+# Vertical anchors that only depend on the font, not on the text
+_VERTICAL_ANCHORS = "asmd"
+
+# Only used to measure text
+_measure_draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+
+def textbbox(xy, text, font, anchor="la"):
+    """ImageDraw.textbbox, without an image to draw on"""
+    return _measure_draw.textbbox(xy, text, anchor=anchor, font=font)
+
+def _round(value):
+    return math.floor(value + 0.5)
+
+class GlyphAtlas:
+    """
+    The glyphs of GLYPH_CHARSET rasterized once for a font and color, to draw short
+    strings by blitting their masks instead of laying out and rasterizing the whole
+    string through FreeType every time.
+
+    Text with any other character, or anchors the atlas doesn't support, is handed
+    to FreeType like before.
+    """
+    def __init__(self, font:ImageFont.FreeTypeFont, color, charset=GLYPH_CHARSET):
+        self.font = font
+        self.color = color
+
+        # char: (advance, left, top, mask), the mask's box relative to the pen on the baseline
+        self._glyphs = {}
+        for char in charset:
+            left, top, right, bottom = font.getbbox(char, anchor="ls")
+            mask = None
+            if right > left and bottom > top:
+                mask = Image.new("L", (right - left, bottom - top))
+                ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=font, anchor="ls")
+                if mask.getbbox() is None:
+                    mask = None
+            self._glyphs[char] = (font.getlength(char), left, top, mask)
+        # (char, next char): kerning between them, filled in as pairs are met
+        self._kerning = {}
+
+        # Baseline offset for each vertical anchor
+        baseline_top = font.getbbox("0", anchor="ls")[1]
+        self._baselines = {vertical: font.getbbox("0", anchor="l" + vertical)[1] - baseline_top
+                           for vertical in _VERTICAL_ANCHORS}
+
+    def _layout(self, xy, text, anchor):
+        """
+        The glyphs of text as (x, y, glyph), the pen's start on the baseline and the
+        text's width, or None if the atlas can't draw it
+        """
+        if len(anchor) != 2 or anchor[1] not in self._baselines:
+            return None
+        glyphs = [self._glyphs.get(char) for char in text]
+        if None in glyphs:
+            return None
+
+        advances = [glyph[0] for glyph in glyphs]
+        for i in range(1, len(text)):
+            pair = text[i - 1 : i + 1]
+            kerning = self._kerning.get(pair)
+            if kerning is None:
+                kerning = self._kerning[pair] = self.font.getlength(pair) - advances[i - 1] - advances[i]
+            advances[i - 1] += kerning
+
+        width = sum(advances)
+        if anchor[0] == "l":
+            offset = 0
+        elif anchor[0] == "m":
+            offset = _round(width / 2)
+        elif anchor[0] == "r":
+            offset = _round(width)
+        else:
+            return None
+        # FreeType places every glyph at the pen rounded to the nearest pixel
+        x = int(xy[0]) - offset
+        y = int(xy[1]) + self._baselines[anchor[1]]
+
+        placed = []
+        pen = 0
+        for glyph, advance in zip(glyphs, advances):
+            placed.append((x + _round(pen), y, glyph))
+            pen += advance
+        return placed, x, y, _round(width)
+
+    def textbbox(self, xy, text, anchor="la"):
+        """Like ImageDraw.textbbox, the box covered by the text"""
+        layout = self._layout(xy, text, anchor)
+        if layout is None:
+            return textbbox(xy, text, self.font, anchor)
+        placed, x, y, width = layout
+        if not placed:
+            return (int(xy[0]), int(xy[1])) * 2
+
+        # Like Pillow's, the box spans the whole advance, trailing spaces included
+        left, top, right, bottom = x, y, x + width, y
+        boxes = [(pen_x + mask_left, pen_y + mask_top, pen_x + mask_left + mask.width, pen_y + mask_top + mask.height)
+                 for pen_x, pen_y, (advance, mask_left, mask_top, mask) in placed if mask is not None]
+        if boxes:
+            top, bottom = min(box[1] for box in boxes), max(box[3] for box in boxes)
+            left, right = min(left, min(box[0] for box in boxes)), max(right, max(box[2] for box in boxes))
+        return (left, top, right, bottom)
+
+    def text(self, draw:ImageDraw.ImageDraw, xy, text, anchor="la"):
+        """Like draw.text with the atlas' font and color"""
+        layout = self._layout(xy, text, anchor)
+        if layout is None:
+            draw.text(xy, text, fill=self.color, anchor=anchor, font=self.font)
+            return
+        for x, y, (advance, left, top, mask) in layout[0]:
+            if mask is not None:
+                draw.bitmap((x + left, y + top), mask, fill=self.color)
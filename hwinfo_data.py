@@ -1,10 +1,12 @@
 import json
 
 from datetime import datetime
-from requests import get
  
-from aoostar_data_model import AoostarDataModel
-from hwinfo_sharedmem import HWiNFOReader
+import frame_stats
+from aoostar_data_model import AoostarDataModel, compile_accessor
+from ip_address import external_ip_address
+from hwinfo_sharedmem import HWiNFOReader, HWiNFOBufferReader, readings_with_values
+from sensor_source import SensorSource
 
 def getHWiNFOData() -> dict:
     try:
@@ -19,6 +21,8 @@ def getHWiNFOData() -> dict:
                 print(f"HWiNFO Version: {snapshot['version']}")
                 print(f"Total Sensors: {len(snapshot['sensors'])}")
                 print(f"Total Readings: {len(snapshot['readings'])}")
+                # Each reading with its values, for the JSON dump
+                snapshot = dict(snapshot, readings=readings_with_values(snapshot))
 
                 #print("-" * 60)
                 #print(f"{'SENSOR':<30} | {'LABEL':<20} | {'VALUE':<10} | {'UNIT'}")
@@ -38,60 +42,162 @@ def getHWiNFOData() -> dict:
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
-def convertHWiNFODataToAoostarCompatible(snapshot) -> AoostarDataModel:
-
-    aoostar_data = AoostarDataModel()
-
-    ssd_count_smart = 0
-    ssd_count_drive = 0
+# Which HWiNFO readings feed which AoostarDataModel field, checked in order: a reading
+# only goes to the first rule it matches.
+#
+# Match keys, all of the given ones must match:
+#   sensor_name / sensor_contains : the sensor's name, equal to / containing
+#   label_orig / label_contains   : the reading's original label, equal to / containing
+# Rule keys:
+#   field     : Aoostar label to set, "{slot}" is replaced by 0, 1, 2... for each match in order
+#   aggregate : how several matches combine, "last" (default), "first", "max", "min" or "sum"
+#   unit_field: Aoostar label that gets the reading's unit
+DEFAULT_MAPPING_RULES = [
+    {"label_orig": "CPU Core", "field": "cpu_temperature"},
+    {"label_orig": "Total CPU Utility", "field": "cpu_percent"},
+    {"label_orig": "Physical Memory Load", "field": "memory_usage"},
+    {"label_orig": "SPD Hub Temperature", "field": "memory_Temperature", "aggregate": "max"},
+    {"label_orig": "GPU Core Load", "field": "gpu_core", "aggregate": "max"}, #any gpu?
+    {"label_orig": "GPU Temperature", "field": "gpu_temperature", "aggregate": "max"}, #any gpu?
+    {"label_orig": "Current UP rate", "field": "net_upload_speed", "unit_field": "net_upload_speed_unit"},
+    {"label_orig": "Current DL rate", "field": "net_download_speed", "unit_field": "net_download_speed_unit"},
+    {"label_contains": "Temperature ", "field": "motherboard_temperature", "aggregate": "max"},
+    #can the order from Drive and Smart be different?
+    {"sensor_contains": "S.M.A.R.T.: ", "label_orig": "Drive Temperature", "field": "storage_ssd[{slot}]['temperature']"},
+    {"sensor_contains": "Drive: ", "label_orig": "Total Activity", "field": "storage_ssd[{slot}]['used']"},
+]
+
+_AGGREGATES = {
+    "last": lambda current, values: values[-1],
+    "first": lambda current, values: values[0],
+    "max": lambda current, values: max(current, *values),
+    "min": lambda current, values: min(current, *values),
+    "sum": lambda current, values: sum(values),
+}
+
+def _rule_matches(rule, reading):
+    return (("sensor_name" not in rule or reading['sensor_name'] == rule["sensor_name"])
+            and ("sensor_contains" not in rule or rule["sensor_contains"] in reading['sensor_name'])
+            and ("label_orig" not in rule or reading['label_orig'] == rule["label_orig"])
+            and ("label_contains" not in rule or rule["label_contains"] in reading['label_orig']))
+
+def load_mapping_rules(path) -> list:
+    """Reads mapping rules, in the DEFAULT_MAPPING_RULES format, from a JSON file."""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+class ReadingMapping:
+    """
+    Mapping rules resolved against one reading layout into (field, aggregate, reading
+    positions) entries, so each poll is only a gather over the readings' values.
+    The index is resolved again whenever the snapshot's reading list changes.
+    """
+    def __init__(self, rules=None):
+        self.rules = DEFAULT_MAPPING_RULES if rules is None else rules
+        self._readings = None
+        self._length = 0
+        self._index = []
+
+    def _resolve(self, readings):
+        fields = {}
+        slots = [0] * len(self.rules)
+
+        for position, reading in enumerate(readings):
+            for rule_number, rule in enumerate(self.rules):
+                if not _rule_matches(rule, reading):
+                    continue
+
+                field = rule["field"].replace("{slot}", str(slots[rule_number]))
+                slots[rule_number] += 1
+                try:
+                    accessor = compile_accessor(field)
+                except (IndexError, KeyError, ValueError):
+                    break # No room in the model for one more drive
+
+                entry = fields.setdefault(field, [accessor, _AGGREGATES[rule.get("aggregate", "last")], [], rule.get("unit_field")])
+                entry[2].append(position)
+                break
+
+        self._index = [(get_value, set_value, aggregate, positions,
+                        compile_accessor(unit_field)[1] if unit_field else None,
+                        readings[positions[-1]]['unit'] if unit_field else None)
+                       for (get_value, set_value), aggregate, positions, unit_field in fields.values()]
+        self._readings = readings
+        self._length = len(readings)
+
+    def apply(self, snapshot, aoostar_data:AoostarDataModel):
+        readings = snapshot['readings']
+        if readings is not self._readings or len(readings) != self._length:
+            self._resolve(readings)
+
+        values = snapshot.get('values') or [r['value'] for r in readings]
+        for get_value, set_value, aggregate, positions, set_unit, unit in self._index:
+            set_value(aoostar_data, aggregate(get_value(aoostar_data), [values[p] for p in positions]))
+            if set_unit:
+                set_unit(aoostar_data, unit)
+
+        return aoostar_data
+
+_default_mapping = ReadingMapping()
+
+def convertHWiNFODataToAoostarCompatible(snapshot, mapping:ReadingMapping=None, aoostar_data:AoostarDataModel=None) -> AoostarDataModel:
+    """Fills aoostar_data in place when given, starting over from its defaults, or a new model."""
+    if aoostar_data is None:
+        aoostar_data = AoostarDataModel()
+    else:
+        aoostar_data.reset()
 
     #Find better way to adjust this non sourced data
     aoostar_data.DATE_m_d_h_m_2 = datetime.now().strftime("%b %d %H:%M") #Time differs from snapshot
-    try:
-        aoostar_data.net_ip_address = get('https://api.ipify.org').content.decode('utf8')
-    except:
-        print("Error getting external ip")
-
-    for r in snapshot['readings']:
-
-        if r['label_orig'] == "CPU Core" :
-            aoostar_data.cpu_temperature = r['value']
-
-        elif r['label_orig'] == "Total CPU Utility" :
-            aoostar_data.cpu_percent = r['value']
-
-        elif r['label_orig'] == "Physical Memory Load" :
-            aoostar_data.memory_usage = r['value']
-
-        elif r['label_orig'] == "SPD Hub Temperature" :
-            aoostar_data.memory_Temperature = max(aoostar_data.memory_Temperature,r['value'])
-
-        elif r['label_orig'] == "GPU Core Load" :
-            aoostar_data.gpu_core = max(aoostar_data.gpu_core,r['value']) #any gpu?
-
-        elif r['label_orig'] == "GPU Temperature" :
-            aoostar_data.gpu_temperature = max(aoostar_data.gpu_temperature,r['value']) #any gpu?
-
-        elif r['label_orig'] == "Current UP rate" :
-            aoostar_data.net_upload_speed = r['value']
-            aoostar_data.net_upload_speed_unit = r['unit']
-
-        elif r['label_orig'] == "Current DL rate" :
-            aoostar_data.net_download_speed = r['value']
-            aoostar_data.net_download_speed_unit = r['unit']
+    aoostar_data.net_ip_address = external_ip_address.get()
+
+    return (mapping or _default_mapping).apply(snapshot, aoostar_data)
+
+class HWiNFOSensorSource(SensorSource):
+    """
+    Panel values from HWiNFO's shared memory, on Windows, or from a snapshot
+    dumped with HWiNFOReader.save_snapshot on any platform.
+
+    The shared memory stays mapped between polls, so only changed values are read again.
+    """
+    def __init__(self, snapshot_path=None, rules=None):
+        self.snapshot_path = snapshot_path
+        self.reader = None
+        self.mapping = ReadingMapping(rules)
+        self.model = AoostarDataModel()
+
+    def _open(self):
+        if self.snapshot_path:
+            self.reader = HWiNFOBufferReader.from_file(self.snapshot_path)
+        else:
+            try:
+                reader = HWiNFOReader()
+            except AttributeError:
+                # ctypes.windll only exists on Windows
+                raise FileNotFoundError("HWiNFO Shared Memory is only available on Windows, use a snapshot or --sensors linux") from None
+            self.reader = reader.__enter__()
+            print("Connected to HWiNFO Shared Memory...")
 
-        elif "Temperature " in r['label_orig'] :
-            aoostar_data.motherboard_temperature = max(aoostar_data.motherboard_temperature, r['value'])
+    def read(self) -> AoostarDataModel:
+        if self.reader is None:
+            try:
+                self._open()
+            except (OSError, MemoryError) as e:
+                print(f"Connection Failed: {e}")
+                return AoostarDataModel()
 
-        elif "S.M.A.R.T.: " in r['sensor_name'] and r['label_orig'] == "Drive Temperature" :
-            aoostar_data.storage_ssd[ssd_count_smart]["temperature"] = r['value']
-            ssd_count_smart += 1 #can the order from Drive and Smart be different?
+        snapshot = self.reader.read_data()
+        if "error" in snapshot:
+            print(f"Error: {snapshot['error']}")
+            return AoostarDataModel()
 
-        elif "Drive: " in r['sensor_name'] and r['label_orig'] == "Total Activity" :
-            aoostar_data.storage_ssd[ssd_count_drive]["used"] = r['value']
-            ssd_count_drive += 1 #can the order from Drive and Smart be different?
+        with frame_stats.recorder.time("convert"):
+            return convertHWiNFODataToAoostarCompatible(snapshot, self.mapping, self.model)
 
-    return aoostar_data
+    def close(self):
+        if isinstance(self.reader, HWiNFOReader):
+            self.reader.__exit__(None, None, None)
+        self.reader = None
 
 if __name__ == "__main__":
     snapshot = getHWiNFOData()
@@ -101,4 +207,4 @@ if __name__ == "__main__":
         json.dump(snapshot, f, ensure_ascii=False, indent=4)
 
     with open('aoostar_compatible_data.json', 'w', encoding='utf-8') as f:
-        json.dump(aoostar_data.__dict__, f, ensure_ascii=False, indent=4)
+        json.dump(aoostar_data.to_dict(), f, ensure_ascii=False, indent=4)
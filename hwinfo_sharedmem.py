@@ -1,7 +1,15 @@
 import ctypes
 from ctypes import wintypes
+import mmap
+import struct
+import sys
 import time
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # ==============================================================================
 # CONSTANTS & CONFIGURATION
 # ==============================================================================
@@ -16,6 +24,9 @@ HWiNFO_UNIT_STRING_LEN     = 16
 # Windows API Constants
 FILE_MAP_READ = 0x0004
 
+# HWiNFO writes the non UTF-8 strings in the system's ANSI code page
+STRING_ENCODING = 'mbcs' if sys.platform == 'win32' else 'cp1252'
+
 # Sensor Reading Types (Enum)
 SENSOR_TYPE_NONE    = 0
 SENSOR_TYPE_TEMP    = 1
@@ -34,7 +45,7 @@ READING_TYPE_NAMES = {
 }
 
 def c_char_array_to_string(data):
-    return data.decode('mbcs', errors='replace')
+    return data.split(b'\0', 1)[0].decode(STRING_ENCODING, errors='replace')
 
 def c_ubyte_array_to_string(data):
     return bytearray(data).split(b'\0', 1)[0].decode('utf-8', errors='replace')
@@ -142,6 +153,8 @@ class HWiNFOReader:
         self.h_map_file = None
         self.p_shared_mem = None
         self.base_address = 0
+        self._view = None
+        self._buffer_reader = None
 
         self.kernel32.OpenFileMappingW.restype = wintypes.HANDLE
         self.kernel32.OpenFileMappingW.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.LPCWSTR]
@@ -184,15 +197,166 @@ class HWiNFOReader:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self._view = None
+        self._buffer_reader = None
         if self.base_address:
             self.kernel32.UnmapViewOfFile(self.base_address)
         if self.h_map_file:
             self.kernel32.CloseHandle(self.h_map_file)
 
-    def read_data(self, include_raw_data = False) -> dict:
-        # Cast the base address to the Header Struct
+    def _section_size(self):
         header = HWiNFO_SENSORS_SHARED_MEM2.from_address(self.base_address)
-        
+        return max(
+            ctypes.sizeof(HWiNFO_SENSORS_SHARED_MEM2),
+            header.dwOffsetOfSensorSection + header.dwSizeOfSensorElement * header.dwNumSensorElements,
+            header.dwOffsetOfReadingSection + header.dwSizeOfReadingElement * header.dwNumReadingElements,
+        )
+
+    def buffer(self):
+        """The mapped shared memory as a buffer, without copying it."""
+        size = self._section_size()
+        if self._view is None or len(self._view) != size:
+            self._view = (ctypes.c_char * size).from_address(self.base_address)
+            self._buffer_reader = HWiNFOBufferReader(self._view)
+        return self._view
+
+    def read_data(self, include_raw_data = False) -> dict:
+        self.buffer()
+        return self._buffer_reader.read_data(include_raw_data)
+
+    def save_snapshot(self, path):
+        """Dumps the shared memory to a file, that HWiNFOBufferReader.from_file can read back."""
+        with open(path, 'wb') as file:
+            file.write(bytes(self.buffer()))
+
+class HWiNFOBufferReader:
+    """
+    Reads HWiNFO's shared memory layout from any buffer: the mapped view, or a dump file.
+
+    Sensor names, labels and units are decoded only when the layout changes, into
+    per-reading dicts that stay the same between polls. The values are read as columns,
+    from a structured view over the buffer, and nothing is read at all while HWiNFO's
+    poll_time stays the same.
+
+    The returned dict is reused between calls and must be treated as read-only. Next to
+    the per-reading dicts, "values", "values_min", "values_max" and "values_avg" hold the
+    readings' current Value, ValueMin, ValueMax and ValueAvg, in order; see
+    readings_with_values for both in one dict per reading.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self._layout = None
+        self._poll_time = None
+        self._data = None
+        self._values_view = None
+        self._values_struct = None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _decode_layout(self, header):
+        """Decodes everything that only changes with the layout: sensors, labels and units."""
+        buffer = memoryview(self.buffer)
+        has_utf8 = header.dwSizeOfReadingElement >= ctypes.sizeof(HWiNFO_SENSORS_READING_ELEMENT)
+
+        #is_utf8_capable = (header.dwVersion >= 2)
+        is_utf8_capable = False
+
+        sensors = {}
+        for i in range(header.dwNumSensorElements):
+            offset = header.dwOffsetOfSensorSection + i * header.dwSizeOfSensorElement
+            sensor_id, sensor_inst = struct.unpack_from('<II', buffer, offset)
+
+            name_orig = c_char_array_to_string(bytes(buffer[offset + HWiNFO_SENSORS_SENSOR_ELEMENT.szSensorNameOrig.offset :][:HWiNFO_SENSORS_STRING_LEN2]))
+            if is_utf8_capable and has_utf8:
+                name = c_ubyte_array_to_string(buffer[offset + HWiNFO_SENSORS_SENSOR_ELEMENT.utfSensorNameUser.offset :][:HWiNFO_SENSORS_STRING_LEN2])
+            else:
+                name = c_char_array_to_string(bytes(buffer[offset + HWiNFO_SENSORS_SENSOR_ELEMENT.szSensorNameUser.offset :][:HWiNFO_SENSORS_STRING_LEN2]))
+
+            sensors[i] = {
+                "id": sensor_id,
+                "inst": sensor_inst,
+                "name_orig": name_orig,
+                "name": name
+            }
+
+        readings = []
+        for i in range(header.dwNumReadingElements):
+            offset = header.dwOffsetOfReadingSection + i * header.dwSizeOfReadingElement
+            reading_type, sensor_index = struct.unpack_from('<iI', buffer, offset)
+
+            def text(field, length):
+                return c_char_array_to_string(bytes(buffer[offset + field.offset :][:length]))
+
+            if is_utf8_capable and has_utf8:
+                label = c_ubyte_array_to_string(buffer[offset + HWiNFO_SENSORS_READING_ELEMENT.utfLabelUser.offset :][:HWiNFO_SENSORS_STRING_LEN2])
+                unit = c_ubyte_array_to_string(buffer[offset + HWiNFO_SENSORS_READING_ELEMENT.utfUnit.offset :][:HWiNFO_UNIT_STRING_LEN])
+            else:
+                label = text(HWiNFO_SENSORS_READING_ELEMENT.szLabelUser, HWiNFO_SENSORS_STRING_LEN2)
+                unit = text(HWiNFO_SENSORS_READING_ELEMENT.szUnit, HWiNFO_UNIT_STRING_LEN)
+
+            readings.append({
+                "sensor_index": sensor_index,
+                "sensor_name": sensors.get(sensor_index, {}).get("name", "Unknown Sensor"),
+                "label_orig": text(HWiNFO_SENSORS_READING_ELEMENT.szLabelOrig, HWiNFO_SENSORS_STRING_LEN2),
+                "label": label,
+                "type": READING_TYPE_NAMES.get(reading_type, "Unknown"),
+                "unit": unit
+            })
+
+        self._values_view = self._values_struct = None
+        if numpy is not None:
+            # Value, ValueMin, ValueMax and ValueAvg are consecutive doubles in every reading
+            dtype = numpy.dtype({
+                'names': ['values'],
+                'formats': [('<f8', 4)],
+                'offsets': [HWiNFO_SENSORS_READING_ELEMENT.Value.offset],
+                'itemsize': header.dwSizeOfReadingElement,
+            })
+            self._values_view = numpy.frombuffer(self.buffer, dtype=dtype, count=header.dwNumReadingElements,
+                                                 offset=header.dwOffsetOfReadingSection)['values']
+        elif header.dwNumReadingElements:
+            # One unpack for every reading, skipping what lies between their values
+            gap = header.dwSizeOfReadingElement - 4 * ctypes.sizeof(ctypes.c_double)
+            self._values_struct = struct.Struct('<' + f'4d{gap}x' * (header.dwNumReadingElements - 1) + '4d')
+
+        return {
+            "version": header.dwVersion,
+            "revision": header.dwRevision,
+            "poll_time": header.poll_time,
+            "sensors": sensors,
+            "readings": readings,
+            "values": [],
+            "values_min": [],
+            "values_max": [],
+            "values_avg": []
+        }
+
+    def _read_values(self, header):
+        """Value, ValueMin, ValueMax and ValueAvg of every reading, as four lists."""
+        if self._values_view is not None:
+            return self._values_view.T.tolist()
+        if self._values_struct is None:
+            return [], [], [], []
+
+        values = self._values_struct.unpack_from(self.buffer, header.dwOffsetOfReadingSection + HWiNFO_SENSORS_READING_ELEMENT.Value.offset)
+        return [list(values[column::4]) for column in range(4)]
+
+    def _read_raw_data(self, header, data):
+        data["sensors_raw"] = {}
+        data["readings_raw"] = []
+        for i in range(header.dwNumSensorElements):
+            offset = header.dwOffsetOfSensorSection + i * header.dwSizeOfSensorElement
+            data["sensors_raw"][i] = HWiNFO_SENSORS_SENSOR_ELEMENT.from_buffer_copy(self.buffer, offset).get_python_dict()
+        for i in range(header.dwNumReadingElements):
+            offset = header.dwOffsetOfReadingSection + i * header.dwSizeOfReadingElement
+            data["readings_raw"].append(HWiNFO_SENSORS_READING_ELEMENT.from_buffer_copy(self.buffer, offset).get_python_dict())
+
+    def read_data(self, include_raw_data = False) -> dict:
+        header = HWiNFO_SENSORS_SHARED_MEM2.from_buffer_copy(self.buffer)
+
         # Verify Signature "HWiS"
         # H = 0x48, W = 0x57, i = 0x69, S = 0x53
         # Little Endian: 0x53695748
@@ -200,77 +364,34 @@ class HWiNFOReader:
              # Depending on endianness and packing, sometimes checking bytes is safer:
              sig_bytes = header.dwSignature.to_bytes(4, byteorder='little')
              if sig_bytes != b'HWiS':
+                 self._layout = None
                  return {"error": "Invalid HWiNFO Signature"} #OR DEAD
 
-        #is_utf8_capable = (header.dwVersion >= 2)
-        is_utf8_capable = False
-        
-        if include_raw_data:
-            data = {
-                "version": header.dwVersion,
-                "revision": header.dwRevision,
-                "poll_time": header.poll_time,
-                "sensors_raw": {},
-                "readings_raw": [],
-                "sensors": {},
-                "readings": []
-            }
-        else:
-            data = {
-                "version": header.dwVersion,
-                "revision": header.dwRevision,
-                "poll_time": header.poll_time,
-                "sensors": {},
-                "readings": []
-            }
-
-        # Calculate start address for Sensors
-        sensor_section_addr = self.base_address + header.dwOffsetOfSensorSection
-        
-        for i in range(header.dwNumSensorElements):
-            # Calculate address of current sensor
-            current_sensor_addr = sensor_section_addr + (i * header.dwSizeOfSensorElement)
-            sensor = HWiNFO_SENSORS_SENSOR_ELEMENT.from_address(current_sensor_addr)
-
-            # Store sensor info map (Index -> Name)
-            data["sensors"][i] = {
-                "id": sensor.dwSensorID,
-                "inst": sensor.dwSensorInst,
-                "name_orig": sensor.get_name_orig(),
-                "name": sensor.get_name(is_utf8_capable)
-            }
+        layout = (header.dwVersion, header.dwRevision,
+                  header.dwOffsetOfSensorSection, header.dwSizeOfSensorElement, header.dwNumSensorElements,
+                  header.dwOffsetOfReadingSection, header.dwSizeOfReadingElement, header.dwNumReadingElements)
 
-            if include_raw_data:
-                data["sensors_raw"][i] = sensor.get_python_dict()
+        if layout != self._layout:
+            self._data = self._decode_layout(header)
+            self._layout = layout
+            self._poll_time = None
+        elif header.poll_time == self._poll_time and not include_raw_data:
+            return self._data
 
-        # Calculate start address for Readings
-        reading_section_addr = self.base_address + header.dwOffsetOfReadingSection
+        data = self._data
+        data["values"], data["values_min"], data["values_max"], data["values_avg"] = self._read_values(header)
+        data["poll_time"] = self._poll_time = header.poll_time
 
-        for i in range(header.dwNumReadingElements):
-            current_reading_addr = reading_section_addr + (i * header.dwSizeOfReadingElement)
-            reading = HWiNFO_SENSORS_READING_ELEMENT.from_address(current_reading_addr)
-            
-            sensor_index = reading.dwSensorIndex
-            sensor_name = data["sensors"].get(sensor_index, {}).get("name", "Unknown Sensor")
-
-            reading_data = {
-                "sensor_index": sensor_index,
-                "sensor_name": sensor_name,
-                "label_orig": reading.get_label_orig(),
-                "label": reading.get_label(is_utf8_capable),
-                "type": READING_TYPE_NAMES.get(reading.tReading, "Unknown"),
-                "value": reading.Value,
-                "unit": reading.get_unit(is_utf8_capable),
-                "value_min": reading.ValueMin,
-                "value_max": reading.ValueMax,
-                "value_avg": reading.ValueAvg
-            }
-            data["readings"].append(reading_data)
+        if include_raw_data:
+            self._read_raw_data(header, self._data)
 
-            if include_raw_data:
-                data["readings_raw"].append(reading.get_python_dict())
+        return self._data
 
-        return data
+def readings_with_values(data) -> list:
+    """The readings of a read_data() result as new dicts, each with its value, value_min, value_max and value_avg."""
+    return [dict(reading, value=value, value_min=value_min, value_max=value_max, value_avg=value_avg)
+            for reading, value, value_min, value_max, value_avg
+            in zip(data["readings"], data["values"], data["values_min"], data["values_max"], data["values_avg"])]
 
 # ==============================================================================
 # EXAMPLE USAGE
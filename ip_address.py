@@ -0,0 +1,77 @@
+import socket
+import threading
+import time
+
+import requests
+
+EXTERNAL_IP_URL = "https://api.ipify.org"
+
+def local_ip_address() -> str:
+    """Address of the interface used to reach the internet, without sending anything."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            # Connecting a UDP socket only picks a route, no packet goes out
+            probe.connect(("192.0.2.1", 80))
+            return probe.getsockname()[0]
+    except OSError:
+        pass
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return ""
+
+class ExternalIPProvider:
+    """
+    The external IP address, as last known.
+
+    get() never waits on the network: it returns the cached address at once and, when it
+    is older than ttl seconds, starts refreshing it on a background thread. Until the
+    first lookup succeeds, or while there is no connectivity, the local interface
+    address stands in for it.
+    """
+    def __init__(self, url=EXTERNAL_IP_URL, ttl=300.0, timeout=3.0, retry_interval=30.0, session=None):
+        self.url = url
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.session = session or requests.Session()
+
+        self.address = ""
+        self.is_external = False
+        self._expires = 0.0
+        self._refreshing = threading.Lock()
+
+    def refresh(self):
+        """Looks the address up now, blocking for at most timeout seconds."""
+        try:
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            self.address = response.content.decode('utf8').strip()
+            self.is_external = True
+            self._expires = time.monotonic() + self.ttl
+        except requests.RequestException as e:
+            print(f"Error getting external ip: {e}")
+            if not self.is_external:
+                self.address = local_ip_address()
+            self._expires = time.monotonic() + self.retry_interval
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing.release()
+
+    def get(self) -> str:
+        if time.monotonic() >= self._expires and self._refreshing.acquire(blocking=False):
+            if not self.address:
+                self.address = local_ip_address()
+            threading.Thread(target=self._refresh_in_background, name="aoostar-ip-lookup", daemon=True).start()
+        return self.address
+
+    __call__ = get
+
+    def close(self):
+        self.session.close()
+
+# Shared by every sensor source
+external_ip_address = ExternalIPProvider()
@@ -0,0 +1,231 @@
+import os
+import time
+from datetime import datetime
+
+from aoostar_data_model import AoostarDataModel
+from ip_address import external_ip_address
+from sensor_source import SensorSource
+
+# hwmon chip names, by what they measure
+CPU_HWMON_NAMES = ("k10temp", "coretemp", "zenpower", "cpu_thermal")
+GPU_HWMON_NAMES = ("amdgpu", "radeon", "nouveau", "i915", "xe")
+MEMORY_HWMON_NAMES = ("spd5118", "jc42")
+DRIVE_HWMON_NAMES = ("nvme", "drivetemp")
+MOTHERBOARD_HWMON_PREFIXES = ("acpitz", "nct", "it87", "it86", "asus", "f71", "w83")
+
+# /sys/block entries that aren't physical drives
+IGNORED_BLOCK_PREFIXES = ("loop", "ram", "zram", "dm-", "md", "sr", "fd", "nbd")
+
+class _OpenFile:
+    """A file kept open and read again from the start on every poll."""
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self):
+        return os.pread(self.fd, 65536, 0).decode('ascii', errors='replace')
+
+    def close(self):
+        os.close(self.fd)
+
+def _read_text(path):
+    try:
+        with open(path, 'r', encoding='ascii', errors='replace') as file:
+            return file.read().strip()
+    except OSError:
+        return ""
+
+def _device_name(path):
+    """Name of the device a sysfs entry belongs to, the same for a drive and its hwmon"""
+    return os.path.basename(os.path.realpath(os.path.join(path, "device")))
+
+def _format_rate(bytes_per_second):
+    if bytes_per_second >= 1024 * 1024:
+        return bytes_per_second / (1024 * 1024), "MB/s"
+    return bytes_per_second / 1024, "KB/s"
+
+class LinuxSensorSource(SensorSource):
+    """
+    Reads panel values straight from procfs and sysfs.
+
+    Every file is found and opened once, polls only read them again, and values that
+    are counters (CPU time, network bytes, disk busy time) are turned into rates from
+    the difference with the previous poll. root lets the whole tree be a fake one.
+    ip_address_provider is any callable returning the address to show, or None.
+    """
+    def __init__(self, root="/", ip_address_provider=external_ip_address):
+        self.root = root
+        self.ip_address_provider = ip_address_provider
+        self._files = []
+
+        self._stat = self._open("proc/stat")
+        self._meminfo = self._open("proc/meminfo")
+        self._net_dev = self._open("proc/net/dev")
+
+        self._cpu_temps = []
+        self._gpu_temps = []
+        self._memory_temps = []
+        self._motherboard_temps = []
+        drive_temps = {}
+
+        hwmon_dir = self._path("sys/class/hwmon")
+        for hwmon in sorted(os.listdir(hwmon_dir)) if os.path.isdir(hwmon_dir) else []:
+            hwmon_path = os.path.join(hwmon_dir, hwmon)
+            name = _read_text(os.path.join(hwmon_path, "name"))
+            temps = [self._open_path(os.path.join(hwmon_path, entry))
+                     for entry in sorted(os.listdir(hwmon_path))
+                     if entry.startswith("temp") and entry.endswith("_input")]
+
+            if name in CPU_HWMON_NAMES:
+                self._cpu_temps += temps
+            elif name in GPU_HWMON_NAMES:
+                self._gpu_temps += temps
+            elif name in MEMORY_HWMON_NAMES:
+                self._memory_temps += temps
+            elif name in DRIVE_HWMON_NAMES:
+                drive_temps[_device_name(hwmon_path)] = temps
+            elif name.startswith(MOTHERBOARD_HWMON_PREFIXES):
+                self._motherboard_temps += temps
+
+        self._gpu_busy = []
+        drm_dir = self._path("sys/class/drm")
+        for card in sorted(os.listdir(drm_dir)) if os.path.isdir(drm_dir) else []:
+            busy_path = os.path.join(drm_dir, card, "device", "gpu_busy_percent")
+            if "-" not in card and os.path.exists(busy_path):
+                self._gpu_busy.append(self._open_path(busy_path))
+
+        # (stat file, temperature files) per drive, in the panel's slot order
+        self._ssds = []
+        self._hdds = []
+        block_dir = self._path("sys/block")
+        for block in sorted(os.listdir(block_dir)) if os.path.isdir(block_dir) else []:
+            block_path = os.path.join(block_dir, block)
+            if block.startswith(IGNORED_BLOCK_PREFIXES) or not os.path.exists(os.path.join(block_path, "stat")):
+                continue
+            drive = (self._open_path(os.path.join(block_path, "stat")), drive_temps.get(_device_name(block_path), []))
+            if _read_text(os.path.join(block_path, "queue", "rotational")) == "1":
+                self._hdds.append(drive)
+            else:
+                self._ssds.append(drive)
+
+        self._last_poll = None
+        self._last_cpu = None
+        self._last_net = None
+        self._last_io_ticks = {}
+
+        self.model = AoostarDataModel()
+
+    def _path(self, relative_path):
+        return os.path.join(self.root, relative_path)
+
+    def _open_path(self, path):
+        opened = _OpenFile(path)
+        self._files.append(opened)
+        return opened
+
+    def _open(self, relative_path):
+        return self._open_path(self._path(relative_path))
+
+    def close(self):
+        for opened in self._files:
+            opened.close()
+        self._files.clear()
+
+    @staticmethod
+    def _max_temperature(temp_files):
+        temperature = 0.0
+        for temp_file in temp_files:
+            try:
+                temperature = max(temperature, int(temp_file.read()) / 1000)
+            except (OSError, ValueError):
+                pass # Sensor not ready, or gone
+        return temperature
+
+    def _read_cpu_percent(self):
+        fields = self._stat.read().split('\n', 1)[0].split()[1:]
+        times = [int(field) for field in fields]
+        total = sum(times[:8]) # guest time is already part of user time
+        idle = times[3] + times[4] # idle + iowait
+
+        percent = self.model.cpu_percent
+        if self._last_cpu is not None:
+            total_delta = total - self._last_cpu[0]
+            if total_delta > 0:
+                percent = 100.0 * (total_delta - (idle - self._last_cpu[1])) / total_delta
+        self._last_cpu = (total, idle)
+        return percent
+
+    def _read_memory_usage(self):
+        meminfo = {}
+        for line in self._meminfo.read().splitlines():
+            key, _, value = line.partition(':')
+            meminfo[key] = value.split()
+        total = int(meminfo["MemTotal"][0])
+        available = int(meminfo["MemAvailable"][0])
+        return 100.0 * (total - available) / total
+
+    def _read_net_bytes(self):
+        received = sent = 0
+        for line in self._net_dev.read().splitlines()[2:]:
+            interface, _, counters = line.partition(':')
+            if interface.strip() == "lo":
+                continue
+            counters = counters.split()
+            received += int(counters[0])
+            sent += int(counters[8])
+        return received, sent
+
+    def _read_drives(self, drives, storage, elapsed):
+        for slot, (stat_file, temp_files) in zip(storage, drives):
+            slot["temperature"] = self._max_temperature(temp_files)
+
+            # Field 10 of the block stat is the time spent doing I/O, in ms
+            io_ticks = int(stat_file.read().split()[9])
+            last_io_ticks = self._last_io_ticks.get(stat_file.path)
+            if last_io_ticks is not None and elapsed > 0:
+                slot["used"] = min(100.0, (io_ticks - last_io_ticks) / (elapsed * 10))
+            self._last_io_ticks[stat_file.path] = io_ticks
+
+    def read(self) -> AoostarDataModel:
+        now = time.monotonic()
+        elapsed = now - self._last_poll if self._last_poll is not None else 0.0
+        self._last_poll = now
+
+        model = self.model
+        model.DATE_m_d_h_m_2 = datetime.now().strftime("%b %d %H:%M")
+        if self.ip_address_provider:
+            model.net_ip_address = self.ip_address_provider()
+
+        model.cpu_percent = self._read_cpu_percent()
+        model.cpu_temperature = self._max_temperature(self._cpu_temps)
+        model.memory_usage = self._read_memory_usage()
+        model.memory_Temperature = self._max_temperature(self._memory_temps)
+        model.gpu_temperature = self._max_temperature(self._gpu_temps)
+        model.motherboard_temperature = self._max_temperature(self._motherboard_temps)
+
+        gpu_core = 0.0
+        for busy_file in self._gpu_busy:
+            try:
+                gpu_core = max(gpu_core, float(busy_file.read()))
+            except (OSError, ValueError):
+                pass
+        model.gpu_core = gpu_core
+
+        received, sent = self._read_net_bytes()
+        if self._last_net is not None and elapsed > 0:
+            model.net_download_speed, model.net_download_speed_unit = _format_rate((received - self._last_net[0]) / elapsed)
+            model.net_upload_speed, model.net_upload_speed_unit = _format_rate((sent - self._last_net[1]) / elapsed)
+        self._last_net = (received, sent)
+
+        self._read_drives(self._ssds, model.storage_ssd, elapsed)
+        self._read_drives(self._hdds, model.storage_hdd, elapsed)
+
+        return model
+
+if __name__ == "__main__":
+    with LinuxSensorSource() as source:
+        source.read()
+        time.sleep(1)
+        model = source.read()
+        for key, value in model.to_dict().items():
+            print(f"{key:<25} | {value}")
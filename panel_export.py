@@ -0,0 +1,73 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aoostar_data_model import AoostarDataModel
+from aoostar_panel import get_compiled_panel, load_config
+from rgb565 import pack_rgb565
+from sensor_history import sensor_history
+
+EXPORT_FORMATS = ("png", "rgb565")
+
+def export_panel(aoostar_screen_id, aoostar_data_path, output_dir, sensor_data:AoostarDataModel=None, formats=EXPORT_FORMATS):
+    """
+    Renders one panel to panel_<id>.png and/or panel_<id>.rgb565, the packed frame the
+    screen would get. Returns the panel id, the files written and the time each step took.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    panel = get_compiled_panel(aoostar_screen_id, aoostar_data_path)
+    # Graphs get the one sample there is
+    sensor_history.record(sensor_data)
+    timings["compile"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    image = panel.render(sensor_data)
+    timings["render"] = time.perf_counter() - start
+
+    paths = []
+    base_path = os.path.join(output_dir, f"panel_{aoostar_screen_id}")
+    start = time.perf_counter()
+    if "png" in formats:
+        image.save(base_path + ".png")
+        paths.append(base_path + ".png")
+    timings["png"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if "rgb565" in formats:
+        with open(base_path + ".rgb565", 'wb') as file:
+            file.write(pack_rgb565(image))
+        paths.append(base_path + ".rgb565")
+    timings["rgb565"] = time.perf_counter() - start
+
+    return aoostar_screen_id, paths, timings
+
+def export_panels(panel_ids=None, aoostar_data_path="C:/Program Files (x86)/AOOSTAR-X/_internal", output_dir=".",
+                  sensor_data:AoostarDataModel=None, formats=EXPORT_FORMATS, processes=None):
+    """
+    Renders the panels, every 'diy' entry of Monitor3.json by default, over a pool of
+    processes, one panel per task. Each worker keeps its decoded fonts and images cached
+    for the next panel it gets. Returns export_panel's results, in panel order.
+    """
+    if not panel_ids:
+        panel_ids = range(1, len(load_config(aoostar_data_path)['diy']) + 1)
+    panel_ids = list(panel_ids)
+    os.makedirs(output_dir, exist_ok=True)
+
+    processes = processes or min(len(panel_ids), os.cpu_count() or 1)
+    if processes <= 1:
+        return [export_panel(panel_id, aoostar_data_path, output_dir, sensor_data, formats) for panel_id in panel_ids]
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(export_panel, panel_id, aoostar_data_path, output_dir, sensor_data, formats)
+                   for panel_id in panel_ids]
+        return [future.result() for future in futures]
+
+def print_export_summary(results, elapsed):
+    steps = ("compile", "render", "png", "rgb565")
+    print(f"{'PANEL':<6} | " + " | ".join(f"{step.upper() + ' (ms)':>13}" for step in steps))
+    print("-" * (9 + 16 * len(steps)))
+    for panel_id, paths, timings in results:
+        print(f"{panel_id:<6} | " + " | ".join(f"{timings[step] * 1000:>13.1f}" for step in steps))
+    print(f"{len(results)} panels exported in {elapsed:.2f}s.")
@@ -0,0 +1,78 @@
+from PIL import Image, ImageChops
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Lookup tables for the Pillow fallback.
+# RGB565 Little Endian splits every pixel into two bytes:
+#   low byte  = G[4:2] << 5 | B[7:3]
+#   high byte = R[7:3] << 3 | G[7:5]
+# The channel contributions never share bits, so they can be summed per byte.
+_LUT_LOW_G  = [((v >> 2) & 0x07) << 5 for v in range(256)]
+_LUT_LOW_B  = [v >> 3 for v in range(256)]
+_LUT_HIGH_R = [(v >> 3) << 3 for v in range(256)]
+_LUT_HIGH_G = [v >> 5 for v in range(256)]
+
+def _pack_numpy(img, out):
+    pixels = numpy.asarray(img)
+    frame = numpy.frombuffer(out, dtype='<u2').reshape(pixels.shape[0], pixels.shape[1])
+
+    # R(5bits) G(6bits) B(5bits), built in place on the output buffer
+    numpy.right_shift(pixels[..., 0], 3, out=frame, casting='unsafe')
+    frame <<= 6
+    frame |= pixels[..., 1] >> 2
+    frame <<= 5
+    frame |= pixels[..., 2] >> 3
+
+def _pack_pillow(img, out):
+    r, g, b = img.split()
+    low = ImageChops.add(g.point(_LUT_LOW_G), b.point(_LUT_LOW_B))
+    high = ImageChops.add(r.point(_LUT_HIGH_R), g.point(_LUT_HIGH_G))
+
+    # "LA" interleaves both bands, which gives low byte first for every pixel
+    out[:] = Image.merge('LA', (low, high)).tobytes()
+
+def pack_rgb565(img, out=None):
+    """
+    Packs an RGB image into RGB565 Little Endian bytes, in a single pass over the frame.
+
+    When out is given it must be a writable buffer of exactly width * height * 2 bytes,
+    it is filled in place and returned, so callers can reuse it from frame to frame.
+    """
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    size = img.width * img.height * 2
+    if out is None:
+        out = bytearray(size)
+    elif len(out) != size:
+        raise ValueError(f"Output buffer size mismatch. Expected {size}, got {len(out)}")
+
+    if numpy is not None:
+        _pack_numpy(img, out)
+    else:
+        _pack_pillow(img, out)
+
+    return out
+
+def blit_rgb565(frame, frame_width, region, box):
+    """
+    Copies a packed RGB565 region into a packed frame, box being the region's
+    (left, top, right, bottom) position within the frame.
+    """
+    left, top, right, bottom = box
+    row_bytes = (right - left) * 2
+
+    if numpy is not None:
+        target = numpy.frombuffer(frame, dtype='<u2').reshape(-1, frame_width)
+        source = numpy.frombuffer(region, dtype='<u2').reshape(bottom - top, right - left)
+        target[top:bottom, left:right] = source
+        return
+
+    frame = memoryview(frame)
+    region = memoryview(region)
+    for row in range(bottom - top):
+        offset = ((top + row) * frame_width + left) * 2
+        frame[offset : offset + row_bytes] = region[row * row_bytes : (row + 1) * row_bytes]
@@ -0,0 +1,34 @@
+# --- Protocol Constants ---
+# Header Preamble: AA 55 AA 55
+PREAMBLE = b'\xAA\x55\xAA\x55'
+
+# LCD ON: Header + 0x0B + 0x00*3
+# Bytes: AA 55 AA 55 0B 00 00 00
+CMD_LCD_ON = PREAMBLE + b'\x0B\x00\x00\x00'
+
+# LCD OFF: Header + 0x0A + 0x00*3
+# Bytes: AA 55 AA 55 0A 00 00 00
+CMD_LCD_OFF = PREAMBLE + b'\x0A\x00\x00\x00'
+
+# IMG START: 
+# Matches the sequence in 'img_cmd_start' image exactly:
+# AA 55 AA 55 05 00 00 00 04 00 0F 2F 00 04 0B 00
+# Note: The last 4 bytes (00 04 0B 00) correspond to the total size 721,920 (0xB0400) in Little Endian.
+CMD_IMG_START = PREAMBLE + b'\x05\x00\x00\x00\x04\x00\x0F\x2F\x00\x04\x0B\x00'
+# Byte 11 (0x2F) is the chunk size, 47
+CHUNK_SIZE_OFFSET = 11
+
+# CHUNK HEADER: Header + 0x08 + 0x00*3
+# Bytes: AA 55 AA 55 08 00 00 00
+CMD_CHUNK_HEADER = PREAMBLE + b'\x08\x00\x00\x00'
+
+# IMG END: Header + 0x06 + 0x00*3
+# Bytes: AA 55 AA 55 06 00 00 00
+CMD_IMG_END = PREAMBLE + b'\x06\x00\x00\x00'
+
+# --- Display Config ---
+WIDTH = 960
+HEIGHT = 376
+TOTAL_BYTES = WIDTH * HEIGHT * 2  # 721,920 bytes
+CHUNK_SIZE = 47
+CHUNK_COUNT = TOTAL_BYTES // CHUNK_SIZE #15,360 bytes
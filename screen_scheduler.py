@@ -0,0 +1,303 @@
+import heapq
+import json
+import os
+import socket
+import tempfile
+import threading
+from concurrent.futures import CancelledError, Future, InvalidStateError
+
+from screen_protocol import CMD_LCD_ON, CMD_LCD_OFF, TOTAL_BYTES
+
+# Lower goes first. A job preempts a frame of a lower priority being sent.
+PRIORITY_CONTROL = 0
+PRIORITY_ALERT = 1
+PRIORITY_FRAME = 2
+PRIORITIES = {"control": PRIORITY_CONTROL, "alert": PRIORITY_ALERT, "frame": PRIORITY_FRAME}
+
+# What frames are collapsed by when no key is given, and power commands always are
+DEFAULT_KEY = "frame"
+POWER_KEY = "power"
+
+DEFAULT_SOCKET_PATH = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(), "aoostar-screen.sock")
+
+# The power commands IpcTransport recognizes in what it is written
+_POWER_PACKETS = {CMD_LCD_ON: "on", CMD_LCD_OFF: "off"}
+
+class _Job:
+    def __init__(self, priority, order, key, frame=None, command=None):
+        self.priority = priority
+        self.order = order
+        self.key = key
+        self.frame = frame
+        self.command = command
+        self.superseded = False
+        self.future = Future()
+
+    def __lt__(self, other):
+        return (self.priority, self.order) < (other.priority, other.order)
+
+def _resolve(future, result=None, error=None):
+    # The caller may have cancelled it meanwhile
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+class ScreenScheduler:
+    """
+    The only owner of a screen's link, sending what several callers submit one job at a
+    time, so their commands never interleave with each other's chunks.
+
+    send_frame(frame, cancel) sends a frame, stopping at the next chunk boundary once the
+    threading.Event cancel is set, and commands maps command names to functions running
+    them, such as "on" and "off". Jobs go in priority order, then in submission order.
+
+    Only the newest pending frame of each key is sent: a frame submitted while another
+    with the same key is still waiting replaces it. Power commands share one key, so the
+    last one wins. A job with a higher priority than the frame being sent stops it at the
+    next chunk boundary, and the frame is sent again afterwards unless a newer one with
+    its key came in meanwhile.
+
+    submit_frame and submit_command return a concurrent.futures.Future of the job's result,
+    which is cancelled if the job is superseded.
+    """
+    def __init__(self, send_frame, commands):
+        self.send_frame = send_frame
+        self.commands = commands
+
+        self.sent = 0
+        self.collapsed = 0
+        self.preempted = 0
+
+        self._condition = threading.Condition()
+        self._queue = []
+        # key: its pending job
+        self._pending = {}
+        self._order = 0
+        self._current = None
+        self._cancel = None
+        self._stopped = False
+        self._thread = None
+
+    def _submit(self, job):
+        with self._condition:
+            if self._stopped:
+                raise IOError("The scheduler is stopped.")
+            previous = self._pending.pop(job.key, None)
+            if previous is not None:
+                previous.superseded = True
+                previous.future.cancel()
+                self.collapsed += 1
+            self._pending[job.key] = job
+            heapq.heappush(self._queue, job)
+
+            current = self._current
+            if current is not None and current.frame is not None and job.priority < current.priority:
+                self._cancel.set()
+            self._condition.notify()
+        return job.future
+
+    def submit_frame(self, frame, key=DEFAULT_KEY, priority=PRIORITY_FRAME):
+        """Queues a frame for send_frame. It must not be modified until it has been sent."""
+        with self._condition:
+            self._order += 1
+            order = self._order
+        return self._submit(_Job(priority, order, key, frame=frame))
+
+    def submit_command(self, command, priority=PRIORITY_CONTROL):
+        """Queues one of commands. Raises ValueError if it isn't one."""
+        if command not in self.commands:
+            raise ValueError(f"Unknown command: {command}")
+        with self._condition:
+            self._order += 1
+            order = self._order
+        return self._submit(_Job(priority, order, POWER_KEY, command=command))
+
+    def _next_job(self):
+        with self._condition:
+            while True:
+                self._condition.wait_for(lambda: self._queue or self._stopped)
+                if self._stopped:
+                    return None
+                job = heapq.heappop(self._queue)
+                if job.superseded:
+                    continue
+                del self._pending[job.key]
+                if job.future.cancelled():
+                    continue
+                self._current = job
+                self._cancel = threading.Event()
+                return job
+
+    def _requeue(self, job):
+        with self._condition:
+            if job.key in self._pending or self._stopped:
+                job.future.cancel()
+                self.collapsed += 1
+                return
+            self._pending[job.key] = job
+            heapq.heappush(self._queue, job)
+
+    def _run_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            cancel = self._cancel
+            try:
+                if job.frame is not None:
+                    result = self.send_frame(job.frame, cancel)
+                else:
+                    result = self.commands[job.command]()
+            except Exception as e:
+                if job.frame is not None and cancel.is_set():
+                    # Preempted rather than failed
+                    self.preempted += 1
+                    self._requeue(job)
+                else:
+                    print(f"Send failed: {e}")
+                    _resolve(job.future, error=e)
+            else:
+                self.sent += 1
+                _resolve(job.future, result)
+            finally:
+                with self._condition:
+                    self._current = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run_loop, name="aoostar-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the frame being sent at the next chunk boundary and cancels every pending job."""
+        with self._condition:
+            self._stopped = True
+            if self._cancel is not None:
+                self._cancel.set()
+            for job in self._queue:
+                job.future.cancel()
+            self._queue.clear()
+            self._pending.clear()
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+def _serve_client(scheduler, client):
+    with client, client.makefile('rb') as reader:
+        for line in reader:
+            try:
+                request = json.loads(line)
+                if request.get("command") == "frame":
+                    size = int(request.get("size", 0))
+                    if size != TOTAL_BYTES:
+                        # Its payload can't be told apart from the next request
+                        client.sendall(json.dumps({"ok": False, "error": f"Frames are {TOTAL_BYTES} bytes, not {size}."}).encode() + b"\n")
+                        return
+                    frame = reader.read(size)
+                    if len(frame) != size:
+                        return
+                    future = scheduler.submit_frame(frame, str(request.get("key", DEFAULT_KEY)),
+                                                    int(request.get("priority", PRIORITY_FRAME)))
+                else:
+                    future = scheduler.submit_command(request.get("command"))
+                reply = {"ok": True, "result": future.result()}
+            except CancelledError:
+                reply = {"ok": True, "superseded": True}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            try:
+                client.sendall(json.dumps(reply).encode() + b"\n")
+            except OSError:
+                return
+
+def serve_ipc(scheduler, path=DEFAULT_SOCKET_PATH):
+    """
+    Lets local processes submit frames and power commands to scheduler through a Unix
+    socket at path, with IpcTransport. Every request is a JSON line, followed by the
+    packed frame for frames, and is answered with a JSON line once its job is done.
+    Runs until interrupted.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        raise IOError("Unix sockets aren't available on this system.")
+    try:
+        # Left behind by a server that didn't exit cleanly
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen()
+        print(f"Accepting frames on {path}...")
+        try:
+            while True:
+                client, _ = server.accept()
+                threading.Thread(target=_serve_client, args=(scheduler, client), name="aoostar-ipc", daemon=True).start()
+        finally:
+            os.remove(path)
+
+class IpcTransport:
+    """
+    A screen shared through serve_ipc, as a transport: send_image's frames are submitted
+    through write_frame with key and priority, and lcd_on and lcd_off's commands are
+    recognized in what is written and submitted as power commands. Both wait for the
+    scheduler to be done with them.
+
+    Other clients change the screen too, so frames aren't compared with the previous one
+    on this side: the scheduler knows what is on screen and sends only what differs.
+    """
+    shared = True
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, key=DEFAULT_KEY, priority=PRIORITY_FRAME):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise IOError("Unix sockets aren't available on this system.")
+        self.key = key
+        self.priority = priority
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except OSError as e:
+            self.sock.close()
+            raise IOError(f"No scheduler at {path}: {e}")
+        self._reader = self.sock.makefile('rb')
+        self._replies = bytearray()
+
+    def _request(self, request, payload=None):
+        self.sock.sendall(json.dumps(request).encode() + b"\n")
+        if payload is not None:
+            self.sock.sendall(payload)
+        line = self._reader.readline()
+        if not line:
+            raise IOError("The scheduler closed the connection.")
+        return json.loads(line)
+
+    def write_frame(self, frame, chunk_indices):
+        """Submits the whole frame, the scheduler working out what changed on the screen itself."""
+        reply = self._request({"command": "frame", "key": self.key, "priority": self.priority, "size": len(frame)}, frame)
+        if not reply["ok"]:
+            raise IOError(reply["error"])
+
+    def write(self, data):
+        command = _POWER_PACKETS.get(bytes(data))
+        if command is None:
+            raise IOError("Only frames and power commands can be sent through the scheduler.")
+        reply = self._request({"command": command})
+        self._replies += b'A' if reply["ok"] else b'N'
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return len(self._replies)
+
+    def read(self, size=1):
+        data = bytes(self._replies[:size])
+        del self._replies[:size]
+        return data
+
+    def close(self):
+        self._reader.close()
+        self.sock.close()
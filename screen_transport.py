@@ -0,0 +1,305 @@
+import json
+import mmap
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+
+import serial
+import serial.tools.list_ports
+
+from screen_protocol import TOTAL_BYTES, CHUNK_SIZE
+from screen_scheduler import IpcTransport, DEFAULT_SOCKET_PATH
+
+TRANSPORTS = ("serial", "file", "tcp", "ipc", "none")
+
+TARGET_VID = 0x0416
+TARGET_PID = 0x90A1
+
+DEFAULT_FRAMEBUFFER_PATH = "aoostar_framebuffer.rgb565"
+RELAY_PORT = 9624
+
+DEFAULT_BAUDRATE = 1500000
+
+# How frames cross the link: bytes of image per chunk packet, and the serial port's speed
+LinkSettings = namedtuple('LinkSettings', ['chunk_size', 'baudrate'])
+DEFAULT_LINK = LinkSettings(CHUNK_SIZE, DEFAULT_BAUDRATE)
+
+def valid_chunk_size(chunk_size):
+    """
+    Whether frames can be sent in chunks of chunk_size: it is a single byte of the image
+    start command, and has to divide the frame, as a shorter last chunk can't be told apart.
+    """
+    return 0 < chunk_size <= 255 and TOTAL_BYTES % chunk_size == 0
+
+# The settings probed for each screen
+DEFAULT_PROFILE_PATH = os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.environ.get("APPDATA")
+                                    or os.path.join(os.path.expanduser("~"), ".config"), "aoostar-screen", "link_profiles.json")
+
+# A connected screen. id is its USB serial number, or its USB location (the hub port it is
+# plugged into) if it has none: unlike the port name, both stay the same across reboots.
+ScreenDevice = namedtuple('ScreenDevice', ['id', 'port', 'serial_number', 'location'])
+
+def find_screens():
+    """Returns every connected screen, found by the device's USB Vendor ID and Product ID, as ScreenDevices in id order."""
+    screens = []
+    for port in serial.tools.list_ports.comports():
+        if port.vid == TARGET_VID and port.pid == TARGET_PID:
+            screens.append(ScreenDevice(port.serial_number or port.location or port.device,
+                                        port.device, port.serial_number, port.location))
+    return sorted(screens)
+
+def select_screens(screens, selectors):
+    """
+    Returns the screens matching any of selectors by id, serial number, location or port,
+    "all" matching every screen. Raises IOError if a selector matches none.
+    """
+    selected = []
+    for selector in selectors:
+        matches = [screen for screen in screens if selector == "all" or selector in screen]
+        if not matches:
+            raise IOError(f"No screen matches {selector}.")
+        selected += [screen for screen in matches if screen not in selected]
+    return selected
+
+def find_serial_port():
+    """
+    Finds the serial port name for the device's USB Vendor ID and Product ID.
+
+    Returns:
+        str or None: The name of the serial port (e.g., 'COM3' or '/dev/ttyUSB0'),
+                     or None if not found. The first screen's when there are several.
+    """
+    screens = find_screens()
+    return screens[0].port if screens else None
+
+def open_serial_port(port, baudrate=DEFAULT_BAUDRATE):
+    """Opens the screen's serial port with the settings the device expects."""
+    return serial.Serial(port,
+                         baudrate=baudrate,
+                         parity=serial.PARITY_NONE,
+                         stopbits=serial.STOPBITS_ONE,
+                         bytesize=serial.EIGHTBITS,
+                         timeout=2.0)
+
+def link_key(ser):
+    """
+    What a screen's link settings are saved under: its id if it is a connected screen,
+    else its port, None for transports without one.
+    """
+    port = getattr(ser, 'port', None)
+    if not isinstance(port, str):
+        return None
+    return next((screen.id for screen in find_screens() if screen.port == port), port)
+
+def load_link_profiles(path=DEFAULT_PROFILE_PATH):
+    """Returns the saved LinkSettings of every screen, by link_key, empty if there are none."""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            profiles = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring link profiles in {path}: {e}")
+        return {}
+    settings = {}
+    for key, entry in profiles.items():
+        link = LinkSettings(int(entry['chunk_size']), int(entry['baudrate']))
+        if not valid_chunk_size(link.chunk_size):
+            # Saved by an older version that padded the last chunk
+            print(f"Ignoring the link profile of {key}: chunk size {link.chunk_size} doesn't divide a frame.")
+            continue
+        settings[key] = link
+    return settings
+
+def save_link_profile(key, settings:LinkSettings, path=DEFAULT_PROFILE_PATH):
+    """Saves the LinkSettings of the screen at key, or forgets them if settings is None."""
+    profiles = load_link_profiles(path)
+    if settings is None:
+        profiles.pop(key, None)
+    else:
+        profiles[key] = settings
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({key: settings._asdict() for key, settings in profiles.items()}, file, indent=2)
+    os.replace(temp_path, path)
+
+class SocketSerial:
+    """A socket with the parts of serial.Serial the sender uses, as the host end of a link."""
+    def __init__(self, sock, timeout=2.0):
+        self.sock = sock
+        self.timeout = timeout
+        self.sock.settimeout(timeout)
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+    def read(self, size=1):
+        """Reads size bytes, or fewer if the timeout runs out first, like serial.Serial."""
+        data = bytearray()
+        deadline = time.monotonic() + self.timeout
+        while len(data) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.sock.settimeout(remaining)
+            try:
+                received = self.sock.recv(size - len(data))
+            except socket.timeout:
+                break
+            if not received:
+                break
+            data += received
+        return bytes(data)
+
+    def close(self):
+        self.sock.close()
+
+class FramebufferTransport:
+    """
+    The screen as a 960x376 little endian RGB565 framebuffer, row after row, in a memory
+    mapped file when path is given, for other tools to map and read as it changes, or
+    just in memory.
+
+    Protocol bytes written to it are decoded like the device would, and send_image
+    skips the protocol altogether through write_frame.
+    """
+    def __init__(self, path=None, timeout=2.0):
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+        if path:
+            self._file = open(path, 'a+b')
+            if os.fstat(self._file.fileno()).st_size != TOTAL_BYTES:
+                self._file.truncate(TOTAL_BYTES)
+            self.frame = mmap.mmap(self._file.fileno(), TOTAL_BYTES)
+        else:
+            self.frame = bytearray(TOTAL_BYTES)
+
+        # Imported here, as the emulator's serial stand-in is SocketSerial
+        from aoostar_emulator import EmulatedScreen
+        self.screen = EmulatedScreen(frame=self.frame)
+        self._replies = bytearray()
+        self._replied = threading.Condition()
+
+    def write_frame(self, frame, chunk_indices):
+        """Copies the given chunks of a packed frame straight to the framebuffer."""
+        if len(chunk_indices) == TOTAL_BYTES // CHUNK_SIZE:
+            self.frame[:] = frame
+            return
+        for i in chunk_indices:
+            offset = i * CHUNK_SIZE
+            self.frame[offset : offset + CHUNK_SIZE] = frame[offset : offset + CHUNK_SIZE]
+
+    def write(self, data):
+        replies = self.screen.feed(data)
+        with self._replied:
+            self._replies += replies
+            self._replied.notify_all()
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return len(self._replies)
+
+    def read(self, size=1):
+        with self._replied:
+            self._replied.wait_for(lambda: len(self._replies) >= size, self.timeout)
+            data = bytes(self._replies[:size])
+            del self._replies[:size]
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self.frame.close()
+            self._file.close()
+            self._file = None
+
+def parse_address(address, default_host="localhost"):
+    """(host, port) from "host:port", "host" or ":port" """
+    host, separator, port = (address or "").rpartition(':')
+    if not separator or port.endswith(']'):
+        host, port = address or "", ""
+    # IPv6 addresses are given in brackets, like [::]:9624
+    return (host.strip('[]') or default_host, int(port) if port else RELAY_PORT)
+
+def open_transport(name="serial", target=None):
+    """
+    Opens one of TRANSPORTS to send frames through. target is the serial port, or a
+    screen's id, found by USB ids if not given, the framebuffer file, the relay's
+    host:port, or the scheduler's socket. Raises IOError if it can't be opened.
+    """
+    match name:
+        case "serial":
+            port = target or find_serial_port()
+            if not port:
+                raise IOError(f"Device with VID 0x{TARGET_VID:04X} and PID 0x{TARGET_PID:04X} not found.")
+            # A screen's id, serial number or location, rather than its port
+            port = next((screen.port for screen in find_screens() if port in screen), port)
+            ser = open_serial_port(port)
+            print(f"Device found at port: {port}")
+            return ser
+        case "file":
+            return FramebufferTransport(target or DEFAULT_FRAMEBUFFER_PATH)
+        case "tcp":
+            return SocketSerial(socket.create_connection(parse_address(target), timeout=10.0))
+        case "ipc":
+            return IpcTransport(target or DEFAULT_SOCKET_PATH)
+        case "none":
+            return FramebufferTransport()
+    raise ValueError(f"Unknown transport: {name}")
+
+def _forward_replies(device, client, stop):
+    try:
+        while not stop.is_set():
+            data = device.read(getattr(device, 'in_waiting', 0) or 1)
+            if data:
+                client.sendall(data)
+    except OSError as e:
+        print(f"Relay stopped: {e}")
+        try:
+            # Unblocks the other direction too
+            client.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+def relay(open_device, address=("localhost", RELAY_PORT)):
+    """
+    Lets a remote host drive the screen: every TCP client's bytes are written to the
+    device opened with open_device(), and its replies sent back. One client at a time,
+    the device being opened for each one. Only local clients can connect unless address
+    names another interface, such as ("0.0.0.0", RELAY_PORT). Runs until interrupted.
+    """
+    with socket.create_server(address) as server:
+        print(f"Relaying to the screen on port {server.getsockname()[1]}...")
+        while True:
+            client, peer = server.accept()
+            print(f"Client connected from {peer[0]}:{peer[1]}")
+            stop = threading.Event()
+            try:
+                device = open_device()
+            except IOError as e:
+                print(f"Could not open the screen: {e}")
+                client.close()
+                time.sleep(1)
+                continue
+
+            replies = threading.Thread(target=_forward_replies, args=(device, client, stop), name="aoostar-relay", daemon=True)
+            replies.start()
+            try:
+                while True:
+                    data = client.recv(65536)
+                    if not data:
+                        break
+                    device.write(data)
+            except OSError as e:
+                print(f"Relay stopped: {e}")
+            finally:
+                stop.set()
+                replies.join()
+                device.close()
+                client.close()
+                print("Client disconnected.")
@@ -0,0 +1,73 @@
+from array import array
+
+from aoostar_data_model import AoostarDataModel, TEXT_FIELDS, compile_accessor
+
+# One sample per pixel column across the whole screen, the widest a graph can be
+HISTORY_CAPACITY = 960
+
+# Network rates are kept in KB/s, whatever unit the source reported them in
+_RATE_SCALES = {"B/s": 1 / 1024, "KB/s": 1, "MB/s": 1024, "GB/s": 1024 * 1024}
+
+class RingBuffer:
+    """The last capacity values appended, in a fixed size array('d')."""
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.count = 0 # Values appended so far, including the overwritten ones
+        self._values = array('d', bytes(8 * capacity))
+
+    def append(self, value):
+        self._values[self.count % self.capacity] = value
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def last(self, n):
+        """The n newest values, oldest first, or all of them if there are fewer."""
+        n = min(n, len(self))
+        end = self.count % self.capacity
+        start = end - n
+        if start >= 0:
+            return self._values[start:end]
+        return self._values[start:] + self._values[:end]
+
+def _rate_getter(label):
+    get_rate = compile_accessor(label)[0]
+    get_unit = compile_accessor(label + "_unit")[0]
+    return lambda model: get_rate(model) * _RATE_SCALES.get(get_unit(model), 1)
+
+class SensorHistory:
+    """
+    A RingBuffer per tracked label, fed one sample per poll. Only labels something
+    asked for with track() are recorded, and memory stays the same however long it runs.
+    """
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        self.capacity = capacity
+        self._buffers = {}
+        self._recorders = []
+
+    def track(self, label) -> RingBuffer:
+        """Returns the label's history, recording it from the next poll on if it wasn't yet."""
+        buffer = self._buffers.get(label)
+        if buffer is not None:
+            return buffer
+
+        buffer = self._buffers[label] = RingBuffer(self.capacity)
+        if label in ("net_upload_speed", "net_download_speed"):
+            self._recorders.append((_rate_getter(label), buffer))
+        elif label not in TEXT_FIELDS:
+            try:
+                self._recorders.append((compile_accessor(label)[0], buffer))
+            except (IndexError, KeyError, ValueError):
+                print(f"No history for unknown label {label}")
+        return buffer
+
+    def record(self, model:AoostarDataModel):
+        """Appends the current value of every tracked label."""
+        if model is None:
+            return
+        for get_value, buffer in self._recorders:
+            buffer.append(get_value(model))
+
+# Shared by every panel, so history carries over panel switches and Monitor3.json reloads
+sensor_history = SensorHistory()
@@ -0,0 +1,31 @@
+from aoostar_data_model import AoostarDataModel
+
+SENSOR_SOURCES = ("hwinfo", "linux")
+
+class SensorSource:
+    """
+    Where panel values come from. Sources stay open between polls, so anything
+    expensive to set up is only done once.
+    """
+    def read(self) -> AoostarDataModel:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def open_sensor_source(name:str, **options) -> SensorSource:
+    """Opens one of SENSOR_SOURCES by name, options going to its constructor."""
+    match name:
+        case "hwinfo":
+            from hwinfo_data import HWiNFOSensorSource
+            return HWiNFOSensorSource(**options)
+        case "linux":
+            from linux_sensors import LinuxSensorSource
+            return LinuxSensorSource(**options)
+    raise ValueError(f"Unknown sensor source: {name}")
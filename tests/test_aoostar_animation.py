@@ -0,0 +1,37 @@
+import pytest
+from PIL import Image
+
+from aoostar_animation import AnimationPlayer
+
+class FakeSource:
+    """count frames of duration seconds, frame broken raising OSError."""
+    def __init__(self, count, duration=0.05, broken=None):
+        self.count = count
+        self.duration = duration
+        self.broken = broken
+
+    def frame(self, index):
+        if index == self.broken:
+            raise OSError(f"Frame {index} is broken")
+        return Image.new("RGB", (4, 4), (index, 0, 0)), self.duration
+
+def _encode(image):
+    return bytes(image.getpixel((0, 0)))
+
+def test_plays_every_frame_of_every_loop():
+    sent = []
+    player = AnimationPlayer(FakeSource(3), _encode, sent.append)
+    player.play(2)
+
+    assert [frame[0] for frame in sent] == [0, 1, 2, 0, 1, 2]
+    # The second loop comes from the cache
+    assert player.encoded == 3
+    assert player.cache_hits == 3
+
+def test_decode_error_is_raised_by_play():
+    sent = []
+    player = AnimationPlayer(FakeSource(3, broken=2), _encode, sent.append)
+    with pytest.raises(OSError, match="Frame 2 is broken"):
+        player.play(0)
+
+    assert [frame[0] for frame in sent] == [0, 1]
@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+import pytest
+
+import aoostar_screen
+from aoostar_async import AsyncScreen
+from aoostar_data_model import AoostarDataModel
+from aoostar_emulator import open_emulated_serial
+from aoostar_screen import CHUNK_COUNT, TOTAL_BYTES, FrameCancelled
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aoostar-x-compatible-data")
+
+def _frame(value):
+    return bytes([value]) * TOTAL_BYTES
+
+def test_cancel_ends_the_frame_and_the_next_goes_out_full():
+    async def run():
+        ser = open_emulated_serial()
+        async with AsyncScreen(ser) as screen:
+            await screen.send_image(_frame(1))
+
+            events = []
+            def progress(event):
+                events.append(event)
+                if event.stage == "chunks":
+                    screen.cancel()
+            with pytest.raises(FrameCancelled):
+                await screen.send_image(_frame(2), delta=True, progress=progress)
+
+            # Ended with the image end command, nothing left half received
+            assert not ser.screen.receiving
+            assert ser.screen.errors == []
+            assert events[-1].stage == "cancelled"
+            assert 0 < events[-1].chunks_sent < CHUNK_COUNT
+
+            # What the screen shows isn't frame 1 anymore, even if delta would say so
+            assert await screen.send_image(_frame(1), delta=True) == CHUNK_COUNT
+            assert ser.screen.frame == _frame(1)
+            assert ser.screen.errors == []
+    asyncio.run(run())
+
+def test_cancelling_the_task_cancels_the_frame():
+    async def run():
+        ser = open_emulated_serial()
+        async with AsyncScreen(ser) as screen:
+            started = asyncio.Event()
+            def progress(event):
+                if event.stage == "chunks":
+                    started.set()
+            task = asyncio.ensure_future(screen.send_image(_frame(3), progress=progress))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            assert not ser.screen.receiving
+            assert ser.screen.errors == []
+            assert await screen.send_image(_frame(3), delta=True) == CHUNK_COUNT
+            assert ser.screen.frame == _frame(3)
+    asyncio.run(run())
+
+def test_progress_events_come_in_order():
+    async def run():
+        ser = open_emulated_serial()
+        async with AsyncScreen(ser, window=4) as screen:
+            events = [event async for event in screen.stream_image(_frame(4))]
+        return events
+    events = asyncio.run(run())
+
+    stages = [event.stage for event in events]
+    assert stages[0] == "start" and stages[-1] == "done"
+    assert set(stages[1:-1]) == {"chunks"}
+    sent = [event.chunks_sent for event in events]
+    assert sent == sorted(sent)
+    assert sent[0] == 0 and sent[-1] == CHUNK_COUNT
+    assert {event.chunks_total for event in events} == {CHUNK_COUNT}
+
+def test_screens_sending_the_same_panel_get_their_own_frames():
+    low, high = AoostarDataModel(), AoostarDataModel()
+    low.cpu_percent, low.cpu_temperature = 1.0, 20.0
+    high.cpu_percent, high.cpu_temperature = 99.0, 95.0
+
+    async def run():
+        sers = [open_emulated_serial(), open_emulated_serial()]
+        screens = [AsyncScreen(ser) for ser in sers]
+        try:
+            for _ in range(3):
+                await asyncio.gather(screens[0].send_panel(1, low, DATA_PATH, delta=False),
+                                     screens[1].send_panel(1, high, DATA_PATH, delta=False))
+        finally:
+            for screen in screens:
+                await screen.close()
+        return [ser.screen.frame for ser in sers]
+    frames = asyncio.run(run())
+
+    expected = [bytes(aoostar_screen.render_aoostar_panel(1, data, DATA_PATH)[0]) for data in (low, high)]
+    assert frames[0] != frames[1]
+    assert frames == expected
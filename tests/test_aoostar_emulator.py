@@ -0,0 +1,87 @@
+import struct
+
+from aoostar_emulator import EmulatedScreen
+from screen_protocol import (PREAMBLE, CMD_LCD_OFF, CMD_IMG_START, CHUNK_SIZE_OFFSET, CMD_CHUNK_HEADER, CMD_IMG_END,
+                             TOTAL_BYTES, CHUNK_SIZE)
+
+def _start(chunk_size=CHUNK_SIZE):
+    return CMD_IMG_START[:CHUNK_SIZE_OFFSET] + bytes((chunk_size,)) + CMD_IMG_START[CHUNK_SIZE_OFFSET + 1:]
+
+def _chunk(image, index, chunk_size=CHUNK_SIZE):
+    offset = index * chunk_size
+    return CMD_CHUNK_HEADER + struct.pack('<I', offset) + image[offset : offset + chunk_size]
+
+def _image(seed):
+    return bytes((seed + i) % 251 for i in range(TOTAL_BYTES))
+
+def test_garbage_before_a_preamble_is_nacked_once():
+    screen = EmulatedScreen()
+    assert screen.feed(b'\x00' * 20 + CMD_LCD_OFF) == b'NA'
+    assert not screen.lcd_on
+    assert len(screen.errors) == 1
+
+def test_packet_split_across_writes():
+    screen = EmulatedScreen()
+    assert screen.feed(CMD_LCD_OFF[:3]) == b''
+    assert screen.feed(CMD_LCD_OFF[3:]) == b'A'
+    assert screen.errors == []
+
+def test_frame_is_rebuilt_from_chunks_in_any_order():
+    image = _image(1)
+    count = TOTAL_BYTES // 240
+    screen = EmulatedScreen()
+
+    packets = b''.join(_chunk(image, i, 240) for i in reversed(range(count)))
+    assert screen.feed(_start(240) + packets + CMD_IMG_END) == b'A' * (count + 2)
+    assert screen.frame == image
+    assert screen.frames_completed == 1
+    assert screen.errors == []
+
+def test_delta_chunks_update_the_previous_frame():
+    first, second = _image(1), _image(2)
+    count = TOTAL_BYTES // CHUNK_SIZE
+    screen = EmulatedScreen()
+    screen.feed(_start() + b''.join(_chunk(first, i) for i in range(count)) + CMD_IMG_END)
+
+    changed = (3, 500, count - 1)
+    assert screen.feed(_start() + b''.join(_chunk(second, i) for i in changed) + CMD_IMG_END) == b'A' * 5
+    expected = bytearray(first)
+    for i in changed:
+        expected[i * CHUNK_SIZE : (i + 1) * CHUNK_SIZE] = second[i * CHUNK_SIZE : (i + 1) * CHUNK_SIZE]
+    assert screen.frame == expected
+
+def test_nacked_chunks_are_not_applied():
+    image = _image(1)
+    screen = EmulatedScreen(nack_chunks={1})
+    assert screen.feed(_start() + _chunk(image, 0) + _chunk(image, 1) + _chunk(image, 2)) == b'AANA'
+    assert screen.frame[:CHUNK_SIZE] == image[:CHUNK_SIZE]
+    assert screen.frame[CHUNK_SIZE : 2 * CHUNK_SIZE] == bytes(CHUNK_SIZE)
+    assert screen.nacks_sent == 1
+    # A NACK the screen was told to send isn't a protocol error
+    assert screen.errors == []
+
+def test_nack_rate_is_reproducible_with_a_seed():
+    image = _image(1)
+    packets = _start() + b''.join(_chunk(image, i) for i in range(200))
+    replies = [EmulatedScreen(nack_rate=0.5, seed=7).feed(packets) for _ in range(2)]
+    assert replies[0] == replies[1]
+    assert 0 < replies[0].count(b'N') < 200
+
+def test_bad_chunks_are_errors():
+    image = _image(1)
+    screen = EmulatedScreen()
+    # Outside of an image
+    assert screen.feed(_chunk(image, 0)) == b'N'
+
+    screen.feed(_start())
+    misaligned = CMD_CHUNK_HEADER + struct.pack('<I', 10) + image[:CHUNK_SIZE]
+    past_the_end = CMD_CHUNK_HEADER + struct.pack('<I', TOTAL_BYTES) + image[:CHUNK_SIZE]
+    assert screen.feed(misaligned + past_the_end) == b'NN'
+    assert len(screen.errors) == 3
+    assert screen.frame == bytes(TOTAL_BYTES)
+
+def test_unsupported_chunk_size_is_rejected():
+    screen = EmulatedScreen(max_chunk_size=188)
+    assert screen.feed(_start(240)) == b'N'
+    assert not screen.receiving
+    assert screen.feed(PREAMBLE + b'\x06\x00\x00\x00') == b'N'
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+import aoostar_screen
+import frame_stats
+from aoostar_pipeline import FramePipeline
+from aoostar_emulator import EmulatedScreen, open_emulated_serial
+from screen_protocol import TOTAL_BYTES
+from screen_transport import FramebufferTransport, LinkSettings, DEFAULT_LINK, load_link_profiles, save_link_profile
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aoostar-x-compatible-data")
+
+class RecordingTransport(FramebufferTransport):
+    """A framebuffer that records the first byte of every frame written, held back while hold is clear."""
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+        self.hold = threading.Event()
+        self.hold.set()
+        self.writing = threading.Event()
+
+    def write_frame(self, frame, chunk_indices):
+        self.writing.set()
+        self.hold.wait(10)
+        self.frames.append(frame[0])
+        super().write_frame(frame, chunk_indices)
+
+@pytest.fixture
+def stats():
+    recorder = frame_stats.enable(print_frames=False)
+    yield recorder
+    frame_stats.recorder = frame_stats.NullStats()
+
+def _animation(tmp_path, count):
+    for i in range(count):
+        # Each frame's first pixel packs to a different first byte
+        Image.new("RGB", (aoostar_screen.WIDTH, aoostar_screen.HEIGHT), (0, (i + 1) * 8, 0)).save(tmp_path / f"{i}.png")
+    return str(tmp_path)
+
+def test_slow_screen_does_not_hold_back_the_others(tmp_path):
+    fast, slow = RecordingTransport(), RecordingTransport()
+    slow.hold.clear()
+
+    def release_slow_when_done():
+        # Once the fast screen has every frame, the slow one is still on its first
+        while len(fast.frames) < 5 and not stopped.is_set():
+            stopped.wait(0.01)
+        slow.hold.set()
+    stopped = threading.Event()
+    releaser = threading.Thread(target=release_slow_when_done)
+    releaser.start()
+    try:
+        aoostar_screen.play_animation([fast, slow], _animation(tmp_path, 5), fps=20, loops=1)
+    finally:
+        stopped.set()
+        releaser.join()
+
+    assert len(fast.frames) == 5
+    # Its first frame, then only the newest one once it was free again
+    assert len(slow.frames) == 2
+    assert slow.frames[-1] == fast.frames[-1]
+    assert slow.frame == fast.frame
+
+def test_multi_screen_sends_are_timed_in_the_render_record(stats):
+    daemon = aoostar_screen.MultiScreenDaemon(DATA_PATH, None, [("a", [1]), ("b", [2])], transport="none")
+    daemon.render_frames()
+    # Nothing sent yet: the record waits for both screens
+    assert stats.frames == 1
+    assert not stats.history["total"]
+
+    for screen, slot in zip(daemon.screens, daemon.slots):
+        screen.send_frame(slot.get(timeout=1), daemon._release_record)
+
+    assert stats.frames == 1
+    assert len(stats.history["total"]) == 1
+    assert daemon._record_users == {}
+
+def test_dropped_frames_release_their_record(stats):
+    daemon = aoostar_screen.MultiScreenDaemon(DATA_PATH, None, [("a", [1]), ("b", [2])], transport="none")
+    daemon.render_frames()
+    # Neither screen sent its frame yet, so the next render replaces both
+    daemon.render_frames()
+
+    for screen, slot in zip(daemon.screens, daemon.slots):
+        screen.send_frame(slot.get(timeout=1), daemon._release_record)
+
+    assert stats.frames == 2
+    assert len(stats.history["total"]) == 2
+    assert daemon._record_users == {}
+
+def test_pipelined_frames_dropped_unsent_end_their_record(stats):
+    daemon = aoostar_screen.PanelDaemon(DATA_PATH, None, transport="none")
+    release = threading.Event()
+
+    def send_frame(rendered):
+        release.wait(10)
+        daemon.send_frame(rendered)
+    pipeline = FramePipeline(daemon.render_frame, send_frame, interval=0.01, drop_frame=daemon.drop_frame)
+    pipeline.start()
+    try:
+        # Renders go on while the first frame is held back, replacing each other in the slot
+        while pipeline.slot.dropped < 2:
+            release.wait(0.01)
+    finally:
+        release.set()
+        pipeline.stop()
+
+    assert len(stats.history["total"]) == stats.frames
+
+def _probe(ser, **options):
+    return aoostar_screen.probe_link(ser, verify=lambda frame: bytes(ser.screen.frame) == bytes(frame), **options)
+
+def test_windowed_send_recovers_from_a_nack():
+    ser = open_emulated_serial(EmulatedScreen(nack_chunks={100}), baudrate=100_000_000)
+    with pytest.raises(IOError):
+        aoostar_screen.send_image(ser, bytes([3]) * TOTAL_BYTES, window=16)
+
+    # The ACKs of the chunks that were in flight with the NACKed one don't spill into this frame
+    aoostar_screen.send_image(ser, bytes([5]) * TOTAL_BYTES, delta=True, window=16)
+    assert ser.screen.frame == bytes([5]) * TOTAL_BYTES
+    assert ser.screen.errors == []
+
+def test_panel_is_sent_again_when_its_background_changes(tmp_path):
+    (tmp_path / "sys_img").mkdir()
+    (tmp_path / "Monitor3.json").write_text(json.dumps({"diy": [{"img": "background.png", "sensor": []}]}))
+    background = tmp_path / "sys_img" / "background.png"
+    ser = open_emulated_serial(baudrate=100_000_000)
+
+    Image.new("RGB", (aoostar_screen.WIDTH, aoostar_screen.HEIGHT), (255, 0, 0)).save(background)
+    assert aoostar_screen.send_aoostar_panel_graphics(ser, 1, None, str(tmp_path), delta=True) > 0
+    red = bytes(ser.screen.frame)
+
+    # Same (empty) sensor values, but the panel is compiled again with the new background
+    Image.new("RGB", (aoostar_screen.WIDTH, aoostar_screen.HEIGHT), (0, 0, 255)).save(background)
+    mtime = os.stat(background).st_mtime + 10
+    os.utime(background, (mtime, mtime))
+    assert aoostar_screen.send_aoostar_panel_graphics(ser, 1, None, str(tmp_path), delta=True) > 0
+    assert ser.screen.frame != red
+
+def test_probe_keeps_the_fastest_settings_the_screen_handles():
+    # Baud rates high enough that the emulated link doesn't slow the test down
+    screen = EmulatedScreen(max_chunk_size=188, max_baudrate=200_000_000)
+    ser = open_emulated_serial(screen, baudrate=100_000_000)
+    best, results = _probe(ser, chunk_sizes=(47, 188, 240), baudrates=(100_000_000, 400_000_000), frames=1)
+
+    passed = {settings for settings, speed in results if speed is not None}
+    assert passed == {LinkSettings(47, 100_000_000), LinkSettings(188, 100_000_000)}
+    assert best in passed
+    assert ser.baudrate == best.baudrate
+
+    # The screen isn't left half way through a frame, and takes the next one whole
+    aoostar_screen.send_image(ser, bytes([9]) * TOTAL_BYTES, delta=True)
+    assert ser.screen.chunk_size == best.chunk_size
+    assert ser.screen.frame == bytes([9]) * TOTAL_BYTES
+
+def test_probe_falls_back_to_the_default_link():
+    ser = open_emulated_serial(EmulatedScreen(nack_rate=1.0), baudrate=100_000_000)
+    best, results = _probe(ser, chunk_sizes=(47, 240), baudrates=(100_000_000,), frames=1)
+
+    assert best == DEFAULT_LINK
+    assert all(speed is None for _, speed in results)
+
+def test_probe_rejects_chunk_sizes_that_do_not_divide_a_frame():
+    ser = open_emulated_serial()
+    with pytest.raises(ValueError):
+        aoostar_screen.probe_link(ser, chunk_sizes=(47, 255))
+    with pytest.raises(ValueError):
+        aoostar_screen.set_link_settings(ser, LinkSettings(100, DEFAULT_LINK.baudrate))
+
+def test_failing_settings_go_back_to_the_default_link(tmp_path):
+    profile_path = str(tmp_path / "link_profiles.json")
+    settings = LinkSettings(240, DEFAULT_LINK.baudrate)
+    save_link_profile("screen", settings, profile_path)
+    save_link_profile("other", LinkSettings(94, DEFAULT_LINK.baudrate), profile_path)
+
+    # Probed on another screen: this one only takes the default chunks
+    ser = open_emulated_serial(EmulatedScreen(max_chunk_size=47))
+    aoostar_screen.set_link_settings(ser, settings, profile_path, "screen")
+    for _ in range(aoostar_screen.LINK_FALLBACK_FAILURES):
+        with pytest.raises(IOError):
+            aoostar_screen.send_image(ser, bytes(TOTAL_BYTES))
+
+    assert load_link_profiles(profile_path) == {"other": LinkSettings(94, DEFAULT_LINK.baudrate)}
+    aoostar_screen.send_image(ser, bytes([3]) * TOTAL_BYTES)
+    assert ser.screen.chunk_size == DEFAULT_LINK.chunk_size
+    assert ser.screen.frame == bytes([3]) * TOTAL_BYTES
+
+def test_link_profiles_round_trip(tmp_path):
+    profile_path = str(tmp_path / "config" / "link_profiles.json")
+    assert load_link_profiles(profile_path) == {}
+
+    save_link_profile("a", LinkSettings(240, 3000000), profile_path)
+    save_link_profile("b", LinkSettings(94, 1500000), profile_path)
+    save_link_profile("a", None, profile_path)
+    assert load_link_profiles(profile_path) == {"b": LinkSettings(94, 1500000)}
+
+def test_link_profiles_skip_what_they_cannot_use(tmp_path):
+    profile_path = tmp_path / "link_profiles.json"
+    profile_path.write_text('{"a": {"chunk_size": 255, "baudrate": 1500000}, "b": {"chunk_size": 188, "baudrate": 2000000}}')
+    assert load_link_profiles(str(profile_path)) == {"b": LinkSettings(188, 2000000)}
+
+    profile_path.write_text("not json")
+    assert load_link_profiles(str(profile_path)) == {}
+
+def test_hwinfo_rules_without_hwinfo_are_reported(capsys):
+    args = argparse.Namespace(sensors="linux", hwinfo_rules="rules.json")
+    source = aoostar_screen._open_cli_sensor_source(args)
+    source.close()
+    assert "--hwinfo-rules only applies to --sensors hwinfo" in capsys.readouterr().out
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from frame_cache import FrameCache
+from screen_protocol import TOTAL_BYTES
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"not decoded by these tests")
+    return str(path)
+
+@pytest.fixture
+def cache(tmp_path):
+    return FrameCache(str(tmp_path / "cache"))
+
+def _encode(value):
+    def encode(image_path):
+        encode.calls += 1
+        return bytes([value]) * TOTAL_BYTES
+    encode.calls = 0
+    return encode
+
+def test_encodes_once(cache, image_path):
+    encode = _encode(1)
+    first = cache.get(image_path, encode)
+    second = cache.get(image_path, encode)
+
+    assert encode.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second[:] == first
+    second.close()
+
+def test_settings_are_part_of_the_key(cache, image_path):
+    cache.store(image_path, bytes(TOTAL_BYTES), "fit")
+    assert cache.load(image_path, "fill") is None
+
+def test_short_entry_is_evicted_as_a_miss(cache, image_path):
+    cache.store(image_path, bytes(TOTAL_BYTES))
+    entry_path = cache._entry_path(image_path, "")
+    # Cut short, like a write that ran out of disk space
+    with open(entry_path, 'r+b') as file:
+        file.truncate(TOTAL_BYTES // 2)
+
+    assert cache.load(image_path) is None
+    assert not os.path.exists(entry_path)
+
+    encode = _encode(2)
+    frame = cache.get(image_path, encode)
+    assert encode.calls == 1
+    assert len(frame) == TOTAL_BYTES
+
+def test_empty_entry_is_evicted_as_a_miss(cache, image_path):
+    cache.store(image_path, b"")
+    assert cache.load(image_path) is None
+    assert not os.path.exists(cache._entry_path(image_path, ""))
+
+def test_least_recently_used_entries_go_first(tmp_path):
+    cache = FrameCache(str(tmp_path / "cache"), max_bytes=2 * TOTAL_BYTES)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(bytes([i]))
+        paths.append(str(path))
+        cache.store(str(path), bytes(TOTAL_BYTES))
+        entry_path = cache._entry_path(str(path), "")
+        os.utime(entry_path, (i, i))
+    cache.evict()
+
+    assert cache.load(paths[0]) is None
+    for path in paths[1:]:
+        cache.load(path).close()
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from glyph_atlas import GlyphAtlas, textbbox
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fonts", "Mx437_IBM_PS-55_re.ttf")
+
+TEXTS = ["0", "45.3℃", "1,024.5 KB/s", "-12 %", "(3/4)", "99°"]
+ANCHORS = ["la", "ls", "lt", "mm", "ms", "rs", "rd"]
+
+def _fonts():
+    fonts = {"ps55-24": ImageFont.truetype(FONT_PATH, 24), "ps55-37": ImageFont.truetype(FONT_PATH, 37)}
+    default = ImageFont.load_default(size=21)
+    if isinstance(default, ImageFont.FreeTypeFont):
+        # Proportional, with kerning
+        fonts["default-21"] = default
+    return fonts
+
+@pytest.fixture(params=list(_fonts().items()), ids=lambda item: item[0])
+def font(request):
+    return request.param[1]
+
+@pytest.mark.parametrize("anchor", ANCHORS)
+def test_text_is_identical_to_freetype(font, anchor):
+    atlas = GlyphAtlas(font, "white")
+    for text in TEXTS:
+        xy = (120, 40)
+        expected = Image.new("RGB", (240, 80))
+        ImageDraw.Draw(expected).text(xy, text, fill="white", anchor=anchor, font=font)
+        actual = Image.new("RGB", (240, 80))
+        atlas.text(ImageDraw.Draw(actual), xy, text, anchor=anchor)
+
+        assert actual.tobytes() == expected.tobytes(), text
+        assert atlas.textbbox(xy, text, anchor=anchor) == textbbox(xy, text, font, anchor), text
+
+def test_other_text_falls_back_to_freetype(font):
+    atlas = GlyphAtlas(font, "white")
+    expected = Image.new("RGB", (240, 80))
+    ImageDraw.Draw(expected).text((10, 10), "CPU", fill="white", font=font)
+    actual = Image.new("RGB", (240, 80))
+    atlas.text(ImageDraw.Draw(actual), (10, 10), "CPU")
+
+    assert actual.tobytes() == expected.tobytes()
@@ -0,0 +1,121 @@
+import ctypes
+
+import pytest
+
+from aoostar_data_model import AoostarDataModel
+from hwinfo_data import HWiNFOSensorSource
+import hwinfo_sharedmem
+from hwinfo_sharedmem import (HWiNFO_SENSORS_SHARED_MEM2, HWiNFO_SENSORS_SENSOR_ELEMENT, HWiNFO_SENSORS_READING_ELEMENT,
+                              HWiNFOBufferReader, SENSOR_TYPE_TEMP, SENSOR_TYPE_USAGE, readings_with_values)
+
+HEADER_SIZE = ctypes.sizeof(HWiNFO_SENSORS_SHARED_MEM2)
+SENSOR_SIZE = ctypes.sizeof(HWiNFO_SENSORS_SENSOR_ELEMENT)
+READING_SIZE = ctypes.sizeof(HWiNFO_SENSORS_READING_ELEMENT)
+
+# (sensor index, type, label, unit, value)
+READINGS = [
+    (0, SENSOR_TYPE_TEMP, "CPU (Tctl/Tdie)", "°C", 54.25),
+    (0, SENSOR_TYPE_USAGE, "Total CPU Usage", "%", 12.5),
+    (1, SENSOR_TYPE_TEMP, "GPU Temperature", "°C", 61.0),
+]
+
+def _build_snapshot(poll_time=1, values=None):
+    """A dump of HWiNFO's shared memory, as HWiNFOReader.save_snapshot writes it."""
+    sensor_names = ["CPU [#0]: AMD Ryzen", "GPU [#0]: AMD Radeon"]
+    reading_offset = HEADER_SIZE + len(sensor_names) * SENSOR_SIZE
+    buffer = bytearray(reading_offset + len(READINGS) * READING_SIZE)
+
+    header = HWiNFO_SENSORS_SHARED_MEM2.from_buffer(buffer)
+    header.dwSignature = 0x53695748
+    header.dwVersion = 2
+    header.poll_time = poll_time
+    header.dwOffsetOfSensorSection = HEADER_SIZE
+    header.dwSizeOfSensorElement = SENSOR_SIZE
+    header.dwNumSensorElements = len(sensor_names)
+    header.dwOffsetOfReadingSection = reading_offset
+    header.dwSizeOfReadingElement = READING_SIZE
+    header.dwNumReadingElements = len(READINGS)
+    del header
+
+    for i, name in enumerate(sensor_names):
+        sensor = HWiNFO_SENSORS_SENSOR_ELEMENT.from_buffer(buffer, HEADER_SIZE + i * SENSOR_SIZE)
+        sensor.dwSensorID = 0xF0000000 + i
+        sensor.szSensorNameOrig = sensor.szSensorNameUser = name.encode('cp1252')
+        del sensor
+
+    values = values or [value for *_, value in READINGS]
+    for i, ((sensor_index, reading_type, label, unit, _), value) in enumerate(zip(READINGS, values)):
+        reading = HWiNFO_SENSORS_READING_ELEMENT.from_buffer(buffer, reading_offset + i * READING_SIZE)
+        reading.tReading = reading_type
+        reading.dwSensorIndex = sensor_index
+        reading.szLabelOrig = reading.szLabelUser = label.encode('cp1252')
+        reading.szUnit = unit.encode('cp1252')
+        reading.Value = reading.ValueMin = reading.ValueMax = reading.ValueAvg = value
+        del reading
+
+    return bytes(buffer)
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = tmp_path / "hwinfo.bin"
+    path.write_bytes(_build_snapshot())
+    return path
+
+def test_reads_a_snapshot_file(snapshot_path):
+    data = HWiNFOBufferReader.from_file(str(snapshot_path)).read_data()
+
+    assert data["version"] == 2
+    assert [sensor["name"] for sensor in data["sensors"].values()] == ["CPU [#0]: AMD Ryzen", "GPU [#0]: AMD Radeon"]
+    assert [(reading["sensor_name"], reading["label"], reading["type"], reading["unit"]) for reading in data["readings"]] == [
+        ("CPU [#0]: AMD Ryzen", "CPU (Tctl/Tdie)", "Temp", "°C"),
+        ("CPU [#0]: AMD Ryzen", "Total CPU Usage", "Usage", "%"),
+        ("GPU [#0]: AMD Radeon", "GPU Temperature", "Temp", "°C"),
+    ]
+    assert data["values"] == data["values_min"] == data["values_max"] == data["values_avg"] == [54.25, 12.5, 61.0]
+    assert [(reading["label"], reading["value"], reading["value_avg"]) for reading in readings_with_values(data)] == [
+        ("CPU (Tctl/Tdie)", 54.25, 54.25), ("Total CPU Usage", 12.5, 12.5), ("GPU Temperature", 61.0, 61.0),
+    ]
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_values_are_read_with_or_without_numpy(snapshot_path, monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(hwinfo_sharedmem, "numpy", None)
+    elif hwinfo_sharedmem.numpy is None:
+        pytest.skip("numpy is not installed")
+    data = HWiNFOBufferReader.from_file(str(snapshot_path)).read_data()
+    assert data["values"] == [54.25, 12.5, 61.0]
+    assert data["values_max"] == [54.25, 12.5, 61.0]
+
+def test_raw_data_matches_the_structures(snapshot_path):
+    data = HWiNFOBufferReader.from_file(str(snapshot_path)).read_data(include_raw_data=True)
+
+    assert data["sensors_raw"][1]["dwSensorID"] == 0xF0000001
+    assert [reading["szLabelUser"] for reading in data["readings_raw"]] == [label for _, _, label, _, _ in READINGS]
+
+def test_values_refresh_only_on_a_new_poll():
+    buffer = bytearray(_build_snapshot(poll_time=1))
+    reader = HWiNFOBufferReader(buffer)
+    assert reader.read_data()["values"] == [54.25, 12.5, 61.0]
+
+    # Same poll_time: the buffer isn't read again
+    buffer[:] = _build_snapshot(poll_time=1, values=[1.0, 2.0, 3.0])
+    assert reader.read_data()["values"] == [54.25, 12.5, 61.0]
+
+    buffer[:] = _build_snapshot(poll_time=2, values=[1.0, 2.0, 3.0])
+    assert reader.read_data()["values"] == [1.0, 2.0, 3.0]
+
+def test_rejects_a_bad_signature(tmp_path):
+    path = tmp_path / "garbage.bin"
+    path.write_bytes(bytes(HEADER_SIZE))
+    assert HWiNFOBufferReader.from_file(str(path)).read_data() == {"error": "Invalid HWiNFO Signature"}
+
+def test_sensor_source_reads_a_snapshot_with_rules(snapshot_path):
+    source = HWiNFOSensorSource(str(snapshot_path), rules=[{"label_orig": "CPU (Tctl/Tdie)", "field": "cpu_temperature"}])
+    assert source.read().cpu_temperature == 54.25
+
+def test_sensor_source_without_hwinfo_reads_defaults(tmp_path, monkeypatch):
+    # No ctypes.windll, as on anything but Windows
+    monkeypatch.delattr(ctypes, "windll", raising=False)
+    defaults = AoostarDataModel()
+    assert HWiNFOSensorSource().read().cpu_temperature == defaults.cpu_temperature
+    assert HWiNFOSensorSource(str(tmp_path / "missing.bin")).read().cpu_temperature == defaults.cpu_temperature
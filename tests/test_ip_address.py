@@ -0,0 +1,115 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ip_address
+from ip_address import ExternalIPProvider
+
+class IPServer(ThreadingHTTPServer):
+    """Answers every GET with address, after delay seconds, and counts the requests."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), IPHandler)
+        self.address = "203.0.113.7"
+        self.status = 200
+        self.delay = 0.0
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+class IPHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        body = f"{self.server.address}\n".encode('utf8')
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = IPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def local(monkeypatch):
+    monkeypatch.setattr(ip_address, "local_ip_address", lambda: "192.168.1.20")
+    return "192.168.1.20"
+
+def _wait_for_refresh(provider):
+    # get() holds the lock until the background lookup is done
+    assert provider._refreshing.acquire(timeout=5)
+    provider._refreshing.release()
+
+def test_get_returns_at_once_and_refreshes_in_the_background(server, local):
+    server.delay = 0.3
+    provider = ExternalIPProvider(server.url, ttl=60)
+
+    started = time.monotonic()
+    assert provider.get() == local
+    assert time.monotonic() - started < 0.2
+    _wait_for_refresh(provider)
+
+    assert provider.get() == "203.0.113.7"
+    assert provider.is_external
+
+def test_address_is_cached_for_ttl(server, local):
+    provider = ExternalIPProvider(server.url, ttl=0.3)
+    provider.get()
+    _wait_for_refresh(provider)
+
+    server.address = "203.0.113.8"
+    for _ in range(5):
+        assert provider.get() == "203.0.113.7"
+    assert server.requests == 1
+
+    time.sleep(0.3)
+    provider.get()
+    _wait_for_refresh(provider)
+    assert provider.get() == "203.0.113.8"
+    assert server.requests == 2
+
+def test_timeout_falls_back_to_the_local_address(server, local):
+    server.delay = 1.0
+    provider = ExternalIPProvider(server.url, timeout=0.2, retry_interval=60)
+
+    started = time.monotonic()
+    provider.refresh()
+    assert time.monotonic() - started < 0.9
+    assert provider.get() == local
+    assert not provider.is_external
+    # Not retried before retry_interval
+    assert server.requests == 1
+
+def test_failed_refresh_keeps_the_last_external_address(server, local):
+    provider = ExternalIPProvider(server.url, ttl=0, retry_interval=60)
+    provider.refresh()
+    assert provider.get() == "203.0.113.7"
+
+    server.status = 503
+    provider.refresh()
+    assert provider.get() == "203.0.113.7"
+    assert provider.is_external
+
+def test_unreachable_service_falls_back_to_the_local_address(server, local):
+    url = server.url
+    server.shutdown()
+    server.server_close()
+    provider = ExternalIPProvider(url, timeout=0.5)
+
+    provider.refresh()
+    assert provider.get() == local
+    assert not provider.is_external
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+import linux_sensors
+from linux_sensors import LinuxSensorSource
+
+NET_DEV_HEADER = ("Inter-|   Receive                                                |  Transmit\n"
+                  " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n")
+
+def _write(root, relative_path, text):
+    path = root / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+def _poll(root, cpu, received, sent, io_ticks):
+    """Writes the counters of one poll: cpu as (busy, idle) jiffies, io_ticks in ms."""
+    _write(root, "proc/stat", f"cpu  {cpu[0]} 0 0 {cpu[1]} 0 0 0 0 0 0\ncpu0 0 0 0 0 0 0 0 0 0 0\n")
+    _write(root, "proc/net/dev", NET_DEV_HEADER +
+           f"    lo: 999999 0 0 0 0 0 0 0 999999 0 0 0 0 0 0 0\n"
+           f"  eth0: {received} 0 0 0 0 0 0 0 {sent} 0 0 0 0 0 0 0\n")
+    _write(root, "sys/block/nvme0n1/stat", f"0 0 0 0 0 0 0 0 0 {io_ticks} 0\n")
+
+@pytest.fixture
+def fake_root(tmp_path):
+    _write(tmp_path, "proc/meminfo", "MemTotal:       16000000 kB\nMemFree:         1000000 kB\nMemAvailable:    4000000 kB\n")
+
+    _write(tmp_path, "sys/class/hwmon/hwmon0/name", "k10temp\n")
+    _write(tmp_path, "sys/class/hwmon/hwmon0/temp1_input", "45000\n")
+    _write(tmp_path, "sys/class/hwmon/hwmon0/temp2_input", "52500\n")
+    _write(tmp_path, "sys/class/hwmon/hwmon1/name", "amdgpu\n")
+    _write(tmp_path, "sys/class/hwmon/hwmon1/temp1_input", "60000\n")
+
+    # The drive's hwmon and block entries point at the same device
+    (tmp_path / "devices/nvme0").mkdir(parents=True)
+    _write(tmp_path, "sys/class/hwmon/hwmon2/name", "nvme\n")
+    _write(tmp_path, "sys/class/hwmon/hwmon2/temp1_input", "38000\n")
+    os.symlink(tmp_path / "devices/nvme0", tmp_path / "sys/class/hwmon/hwmon2/device")
+    _write(tmp_path, "sys/block/nvme0n1/queue/rotational", "0\n")
+    os.symlink(tmp_path / "devices/nvme0", tmp_path / "sys/block/nvme0n1/device")
+    _write(tmp_path, "sys/block/loop0/stat", "0 0 0 0 0 0 0 0 0 0 0\n")
+
+    _write(tmp_path, "sys/class/drm/card0/device/gpu_busy_percent", "30\n")
+
+    _poll(tmp_path, cpu=(100, 900), received=0, sent=0, io_ticks=0)
+    return tmp_path
+
+def test_reads_the_fake_tree(fake_root):
+    with LinuxSensorSource(root=str(fake_root), ip_address_provider=lambda: "192.0.2.1") as source:
+        model = source.read()
+
+        assert model.cpu_temperature == 52.5
+        assert model.gpu_temperature == 60.0
+        assert model.gpu_core == 30.0
+        assert model.memory_usage == 75.0
+        assert model.net_ip_address == "192.0.2.1"
+        assert model.storage_ssd[0]["temperature"] == 38.0
+        # loop devices aren't drives
+        assert model.storage_ssd[1]["temperature"] == 0.0
+
+def test_counters_become_rates(fake_root, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(linux_sensors.time, "monotonic", lambda: now[0])
+
+    with LinuxSensorSource(root=str(fake_root), ip_address_provider=None) as source:
+        source.read()
+
+        now[0] += 2.0
+        _poll(fake_root, cpu=(400, 1000), received=4 * 1024 * 1024, sent=2048, io_ticks=500)
+        model = source.read()
+
+        # 300 of 400 jiffies busy
+        assert model.cpu_percent == 75.0
+        assert (model.net_download_speed, model.net_download_speed_unit) == (2.0, "MB/s")
+        assert (model.net_upload_speed, model.net_upload_speed_unit) == (1.0, "KB/s")
+        # 500 ms of I/O in 2 s
+        assert model.storage_ssd[0]["used"] == 25.0
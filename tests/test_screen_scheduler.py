@@ -0,0 +1,142 @@
+import socket
+import threading
+
+import pytest
+
+import aoostar_screen
+from screen_protocol import TOTAL_BYTES
+from screen_scheduler import ScreenScheduler, IpcTransport, PRIORITY_ALERT, serve_ipc
+
+def _frame(value):
+    return bytes([value]) * TOTAL_BYTES
+
+class FakeScreen:
+    """send_frame and commands for a ScreenScheduler, recording what went out in order."""
+    def __init__(self):
+        self.log = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.lock = threading.Lock()
+
+    def send_frame(self, frame, cancel):
+        with self.lock:
+            self.log.append(("start", frame[0]))
+        self.started.set()
+        # Holds the frame "on the wire" until released or preempted
+        while True:
+            released = self.release.wait(0.01)
+            if cancel.is_set():
+                with self.lock:
+                    self.log.append(("cancelled", frame[0]))
+                raise aoostar_screen.FrameCancelled("Frame cancelled", 0)
+            if released:
+                break
+        with self.lock:
+            self.log.append(("sent", frame[0]))
+        return frame[0]
+
+    def command(self, name):
+        def run():
+            with self.lock:
+                self.log.append((name,))
+        return run
+
+@pytest.fixture
+def screen():
+    return FakeScreen()
+
+@pytest.fixture
+def scheduler(screen):
+    scheduler = ScreenScheduler(screen.send_frame, {"on": screen.command("on"), "off": screen.command("off")})
+    scheduler.start()
+    yield scheduler
+    screen.release.set()
+    scheduler.stop()
+
+def test_pending_frames_collapse_to_the_newest(screen, scheduler):
+    screen.release.clear()
+    first = scheduler.submit_frame(_frame(1))
+    assert screen.started.wait(2)
+
+    second = scheduler.submit_frame(_frame(2))
+    third = scheduler.submit_frame(_frame(3))
+    # Another key isn't collapsed with them
+    other = scheduler.submit_frame(_frame(4), key="other")
+    screen.release.set()
+
+    assert first.result(2) == 1
+    assert third.result(2) == 3
+    assert other.result(2) == 4
+    assert second.cancelled()
+    assert scheduler.collapsed == 1
+    assert [entry for entry in screen.log if entry[0] == "sent"] == [("sent", 1), ("sent", 3), ("sent", 4)]
+
+def test_power_commands_collapse_to_the_last(screen, scheduler):
+    screen.release.clear()
+    scheduler.submit_frame(_frame(1))
+    assert screen.started.wait(2)
+
+    # Held back by the frame, which a control job preempts, so both are queued at once
+    with scheduler._condition:
+        on = scheduler.submit_command("on")
+        off = scheduler.submit_command("off")
+    screen.release.set()
+
+    off.result(2)
+    assert on.cancelled()
+    assert ("on",) not in screen.log
+
+def test_higher_priority_preempts_and_the_frame_is_sent_again(screen, scheduler):
+    screen.release.clear()
+    frame = scheduler.submit_frame(_frame(1))
+    assert screen.started.wait(2)
+
+    command = scheduler.submit_command("on")
+    command.result(2)
+    screen.release.set()
+    assert frame.result(2) == 1
+
+    assert screen.log == [("start", 1), ("cancelled", 1), ("on",), ("start", 1), ("sent", 1)]
+    assert scheduler.preempted == 1
+    assert scheduler.sent == 2
+
+def test_preempted_frame_is_dropped_for_a_newer_one(screen, scheduler):
+    screen.release.clear()
+    old = scheduler.submit_frame(_frame(1))
+    assert screen.started.wait(2)
+
+    with scheduler._condition:
+        alert = scheduler.submit_frame(_frame(2), key="alert", priority=PRIORITY_ALERT)
+        new = scheduler.submit_frame(_frame(3))
+    screen.release.set()
+
+    assert alert.result(2) == 2
+    assert new.result(2) == 3
+    assert old.cancelled()
+    assert [entry for entry in screen.log if entry[0] == "sent"] == [("sent", 2), ("sent", 3)]
+
+def test_unknown_command_is_rejected(scheduler):
+    with pytest.raises(ValueError):
+        scheduler.submit_command("reboot")
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="Unix sockets only")
+def test_ipc_clients_always_send_whole_frames(screen, scheduler, tmp_path):
+    path = str(tmp_path / "screen.sock")
+    threading.Thread(target=serve_ipc, args=(scheduler, path), daemon=True).start()
+    for _ in range(200):
+        if (tmp_path / "screen.sock").exists():
+            break
+        threading.Event().wait(0.01)
+
+    transport = IpcTransport(path)
+    try:
+        aoostar_screen.send_image(transport, _frame(5), delta=True)
+        # Unchanged for this client, but another may have drawn over it meanwhile
+        aoostar_screen.send_image(transport, _frame(5), delta=True)
+        aoostar_screen.lcd_on(transport)
+    finally:
+        transport.close()
+
+    assert [entry for entry in screen.log if entry[0] == "sent"] == [("sent", 5), ("sent", 5)]
+    assert screen.log[-1] == ("on",)